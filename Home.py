@@ -1,8 +1,8 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from data_loader import load_transacoes, load_empresas
-from utils import features_cashflow, clusterizar_empresas_kmeans
+from pipeline import obter_artefatos
+from segmentos import TODOS_OS_SETORES
 
 st.set_page_config(page_title="Análise de Perfil das Empresas", layout="wide")
 
@@ -29,44 +29,27 @@ col1, col2, col3 = st.columns([1, 2, 1])
 with col1:
     st.image("assets/logo.png")
 
-# --- Função de Cache para Carregar e Processar todos os Dados ---
-@st.cache_data
-def carregar_e_processar_dados_home():
-    """
-    Função centralizada para carregar, processar e preparar todas as
-    bases de dados necessárias para as análises da Home.
-    """
-    trans = load_transacoes()
-    empresas = load_empresas()
-    base = features_cashflow(trans)
-    perfil = clusterizar_empresas_kmeans(base, empresas.copy())
-    return base, perfil, empresas, trans
-
-base, perfil, empresas, trans = carregar_e_processar_dados_home()
+# --- Dados partilhados do pipeline (calculados uma vez por versão da base) ---
+artefatos = obter_artefatos()
+perfil, cubo_cnae, indices = artefatos["perfil"], artefatos["cubo_cnae"], artefatos["indices"]
 
 # --- Título ---
 st.title("Dashboard de Inteligência de Ecossistema")
 
 # --- FILTRO DE SEGMENTAÇÃO POR CNAE ---
 st.subheader("Filtro de Segmentação")
-lista_cnae = sorted(perfil['ds_cnae'].unique())
-opcoes_cnae = ["Todos os Setores"] + lista_cnae
+lista_cnae = sorted((cnae for cnae in cubo_cnae if cnae != TODOS_OS_SETORES), key=str)
+opcoes_cnae = [TODOS_OS_SETORES] + lista_cnae
 cnae_selecionado = st.selectbox("Selecione um Setor (CNAE) para focar a análise:", opcoes_cnae)
 
-# --- LÓGICA DE FILTRAGEM DOS DADOS ---
-# Com base na seleção, filtramos os dataframes que serão usados nas análises
-if cnae_selecionado == "Todos os Setores":
+# --- SEGMENTO SELECIONADO ---
+# Os agregados de cada setor vêm prontos do cubo; só o gráfico de dispersão
+# precisa das linhas do perfil, buscadas pelo índice por CNAE.
+segmento = cubo_cnae.get(cnae_selecionado)
+if cnae_selecionado == TODOS_OS_SETORES or not indices:
     perfil_filtrado_cnae = perfil
-    trans_filtrado = trans
-    empresas_filtrado = empresas
 else:
-    perfil_filtrado_cnae = perfil[perfil['ds_cnae'] == cnae_selecionado]
-    ids_no_cnae = perfil_filtrado_cnae['id'].unique()
-    trans_filtrado = trans[
-        (trans['id_pgto'].isin(ids_no_cnae)) |
-        (trans['id_rcbe'].isin(ids_no_cnae))
-    ]
-    empresas_filtrado = empresas[empresas['id'].isin(ids_no_cnae)]
+    perfil_filtrado_cnae = indices["perfil_cnae"].linhas(cnae_selecionado)
 
 st.markdown("---")
 
@@ -75,17 +58,16 @@ st.markdown("---")
 st.header(f"Indicadores-Chave: {cnae_selecionado}")
 col1, col2, col3 = st.columns(3)
 with col1:
-    st.metric("Total de empresas analisadas", f"{perfil_filtrado_cnae['id'].nunique():,}")
+    st.metric("Total de empresas analisadas", f"{segmento['kpis']['total_empresas'] if segmento else 0:,}")
 with col2:
-    if not perfil_filtrado_cnae.empty:
-        maior_momento = perfil_filtrado_cnae['momento'].mode()[0]
-        share = perfil_filtrado_cnae['momento'].value_counts(normalize=True).max()
-        st.metric("Momento predominante (via ML)", maior_momento, f"{(share*100):.0f}% do total")
+    if segmento and segmento['kpis']['momento_predominante'] is not None:
+        share = segmento['kpis']['share_momento']
+        st.metric("Momento predominante (via ML)", segmento['kpis']['momento_predominante'], f"{(share*100):.0f}% do total")
     else:
         st.metric("Momento predominante (via ML)", "N/A", "0%")
 with col3:
-    if not empresas_filtrado.empty:
-        saldo_medio = empresas_filtrado.groupby("id")["vl_sldo"].last().mean()
+    if segmento and segmento['kpis']['saldo_medio'] is not None:
+        saldo_medio = segmento['kpis']['saldo_medio']
         st.metric("Saldo médio por empresa", f"R$ {saldo_medio:,.0f}")
     else:
         st.metric("Saldo médio por empresa", "R$ 0")
@@ -98,7 +80,7 @@ c1, c2 = st.columns(2)
 with c1:
     st.subheader("Distribuição por Momento (ML)")
     
-    dist_momento = perfil_filtrado_cnae['momento'].value_counts().reset_index()
+    dist_momento = segmento['momentos'] if segmento else pd.DataFrame(columns=['momento', 'count'])
     
     # --- AQUI ESTÁ A MUDANÇA ---
     # Trocamos para um gráfico de barras HORIZONTAIS para melhor alinhamento e leitura
@@ -161,15 +143,9 @@ col_agg1, col_agg2 = st.columns(2)
 
 with col_agg1:
     st.subheader("Análise por Maturidade da Empresa")
-    # AJUSTE: Usa o dataframe filtrado pelo CNAE
-    if not perfil_filtrado_cnae.empty:
-        bins = [0, 2, 5, 10, 100]
-        labels = ['Startup (<2 anos)', 'Em Crescimento (2-5 anos)', 'Madura (5-10 anos)', 'Estabelecida (>10 anos)']
-        perfil_filtrado_cnae['faixa_maturidade'] = pd.cut(perfil_filtrado_cnae['idade'], bins=bins, labels=labels, right=False)
-        
-        analise_maturidade = perfil_filtrado_cnae.groupby('faixa_maturidade', observed=True).agg(
-            receita_media=('receita_media_6m', 'mean')
-        ).reset_index()
+    # A receita média por faixa de maturidade vem pronta do cubo do setor
+    if segmento and not segmento['maturidade'].empty:
+        analise_maturidade = segmento['maturidade']
 
         fig_maturidade = px.bar(
             analise_maturidade, x='faixa_maturidade', y='receita_media',
@@ -184,9 +160,9 @@ with col_agg1:
 
 with col_agg2:
     st.subheader("Análise por Tipo de Transação")
-    # AJUSTE: Usa o dataframe de transações filtrado
-    if not trans_filtrado.empty:
-        analise_transacoes = trans_filtrado.groupby('ds_tran')['vl'].sum().reset_index().sort_values('vl', ascending=False)
+    # O valor por tipo de transação do setor vem pronto do cubo
+    if segmento and not segmento['tipos_transacao'].empty:
+        analise_transacoes = segmento['tipos_transacao']
         
         fig_transacoes = px.pie(
             analise_transacoes.head(10), names='ds_tran', values='vl',
@@ -202,10 +178,7 @@ st.markdown("---")
 # Esta secção continua a usar o dataframe 'perfil' original para permitir a comparação
 st.header("Análise Comparativa Entre Setores (CNAE)")
 st.caption("Esta análise mostra sempre a visão completa para permitir a comparação entre os setores.")
-analise_cnae = perfil.groupby('ds_cnae').agg(
-    receita_total=('receita_media_6m', 'sum'),
-    numero_empresas=('id', 'count')
-).reset_index().sort_values('receita_total', ascending=False)
+analise_cnae = artefatos["comparativo_cnae"]
 fig_cnae = px.bar(
     analise_cnae.head(15), x='receita_total', y='ds_cnae', orientation='h',
     title='Top 15 Setores por Receita Agregada',
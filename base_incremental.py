@@ -0,0 +1,156 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from utils import _agregar_mensal, _completar_perfil, _montar_base, _perfil_financeiro
+
+# Colunas da base mensal, na mesma ordem devolvida por features_cashflow
+COLUNAS_BASE = ['id', 'ano_mes', 'receita', 'despesa', 'fluxo_liq', 'margem']
+# Colunas das transações que entram na assinatura do estado gravado
+COLUNAS_ASSINATURA = ['id_pgto', 'id_rcbe', 'vl', 'mes']
+
+
+def _hashes_linhas(trans):
+    """
+    Hash do conteúdo de cada transação (ids, valor e mês). Nas colunas
+    categóricas o hash é o dos valores, não o dos códigos, por isso não muda
+    quando o dicionário de empresas ganha ids novos.
+    """
+    return pd.util.hash_pandas_object(trans[COLUNAS_ASSINATURA], index=False).to_numpy()
+
+
+def _assinatura(hashes):
+    """Assinatura de um conjunto de transações: soma (módulo 2**64) dos hashes das linhas."""
+    return str(int(hashes.sum(dtype=np.uint64)))
+
+
+class BaseIncremental:
+    """
+    Mantém materializadas a base mensal de fluxo de caixa e o perfil financeiro
+    de cada empresa, e atualiza apenas o que muda quando chegam transações novas.
+
+    Uso típico:
+        motor = BaseIncremental.de_transacoes(trans)
+        motor.adicionar_transacoes(trans_do_mes)
+        base = motor.base
+        perfil = motor.perfil_completo(empresas)
+
+    O pipeline usa BaseIncremental.sincronizar, que guarda o motor em disco
+    entre uma versão do workbook e a seguinte.
+    """
+
+    def __init__(self, base, perfil_financeiro=None):
+        self._base = base.set_index(['id', 'ano_mes'])[['receita', 'despesa', 'fluxo_liq', 'margem']].sort_index()
+        if perfil_financeiro is None:
+            perfil_financeiro = _perfil_financeiro(base)
+        self._perfil = perfil_financeiro.set_index('id').sort_index()
+
+    @classmethod
+    def de_transacoes(cls, trans):
+        """Constrói o motor a partir da base completa de transações."""
+        receita, despesa = _agregar_mensal(trans)
+        return cls(_montar_base(receita, despesa))
+
+    @property
+    def base(self):
+        """Base mensal no mesmo formato de features_cashflow."""
+        return self._base.reset_index()[COLUNAS_BASE]
+
+    @property
+    def perfil_financeiro(self):
+        """Métricas financeiras por empresa, no formato de _perfil_financeiro."""
+        return self._perfil.reset_index()
+
+    def perfil_completo(self, empresas):
+        """Perfil pronto para a clusterização (com idade e CNAE)."""
+        return _completar_perfil(self.perfil_financeiro, empresas)
+
+    def adicionar_transacoes(self, novas):
+        """
+        Soma um lote de transações novas à base. Só as células (id, ano_mes)
+        tocadas pelo lote são recalculadas, e só as empresas afetadas têm as
+        métricas de 6 meses refeitas. Devolve os ids afetados.
+        """
+        if novas.empty:
+            return self._base.index.levels[0][:0].to_numpy()
+
+        receita, despesa = _agregar_mensal(novas)
+        delta = pd.concat([receita, despesa], axis=1).fillna(0)
+
+        existentes = delta.index.isin(self._base.index)
+        chaves_existentes = delta.index[existentes]
+        if len(chaves_existentes):
+            atual = self._base.loc[chaves_existentes, ['receita', 'despesa']]
+            self._base.loc[chaves_existentes, ['receita', 'despesa']] = atual.values + delta.loc[chaves_existentes].values
+
+        if not existentes.all():
+            novas_linhas = delta[~existentes].assign(fluxo_liq=0.0, margem=0.0)
+            self._base = pd.concat([self._base, novas_linhas]).sort_index()
+
+        # Recalcula fluxo líquido e margem só nas células tocadas
+        celulas = self._base.loc[delta.index]
+        fluxo_liq = celulas['receita'] - celulas['despesa']
+        margem = (fluxo_liq / celulas['receita'].replace(0, np.nan)).fillna(0)
+        self._base.loc[delta.index, 'fluxo_liq'] = fluxo_liq.values
+        self._base.loc[delta.index, 'margem'] = margem.values
+
+        # Refaz as métricas de 6 meses apenas para as empresas afetadas
+        ids_afetados = delta.index.get_level_values('id').unique()
+        historico = self._base.loc[ids_afetados].reset_index()
+        perfil_afetado = _perfil_financeiro(historico).set_index('id')
+        self._perfil = pd.concat([self._perfil.drop(ids_afetados, errors='ignore'), perfil_afetado]).sort_index()
+
+        return ids_afetados.to_numpy()
+
+    def salvar(self, pasta, estado=None):
+        """Grava a base e o perfil materializados em Parquet (e `estado`, se houver, em estado.json)."""
+        os.makedirs(pasta, exist_ok=True)
+        self.base.to_parquet(os.path.join(pasta, "base.parquet"), index=False)
+        self.perfil_financeiro.to_parquet(os.path.join(pasta, "perfil_financeiro.parquet"), index=False)
+        if estado is not None:
+            with open(os.path.join(pasta, "estado.json"), "w", encoding="utf-8") as f:
+                json.dump(estado, f)
+
+    @classmethod
+    def carregar(cls, pasta):
+        """Reabre um motor gravado com salvar()."""
+        base = pd.read_parquet(os.path.join(pasta, "base.parquet"))
+        perfil = pd.read_parquet(os.path.join(pasta, "perfil_financeiro.parquet"))
+        return cls(base, perfil)
+
+    @classmethod
+    def sincronizar(cls, trans, pasta):
+        """
+        Motor em dia com `trans`, reaproveitando o estado gravado em `pasta`:
+        se as primeiras linhas de `trans` são as mesmas transações da última
+        sincronização, só as linhas seguintes são somadas; senão (linhas
+        alteradas ou apagadas) a base é refeita do zero. O novo estado
+        substitui a pasta de uma vez, como os artefatos do pipeline.
+        """
+        hashes = _hashes_linhas(trans)
+        motor = None
+        try:
+            with open(os.path.join(pasta, "estado.json"), "r", encoding="utf-8") as f:
+                estado = json.load(f)
+            linhas = estado.get("linhas", -1)
+            if 0 <= linhas <= len(trans) and _assinatura(hashes[:linhas]) == estado.get("assinatura"):
+                motor = cls.carregar(pasta)
+                motor.adicionar_transacoes(trans.iloc[linhas:])
+        except (OSError, ValueError):
+            # Sem estado gravado (ou a meio de ser substituído por outro processo)
+            motor = None
+        if motor is None:
+            motor = cls.de_transacoes(trans)
+
+        temporario = f"{pasta}.{os.getpid()}.tmp"
+        motor.salvar(temporario, {"linhas": len(trans), "assinatura": _assinatura(hashes)})
+        shutil.rmtree(pasta, ignore_errors=True)
+        try:
+            os.rename(temporario, pasta)
+        except OSError:
+            # Outro processo gravou o seu estado primeiro; fica o dele
+            shutil.rmtree(temporario, ignore_errors=True)
+        return motor
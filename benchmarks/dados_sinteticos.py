@@ -0,0 +1,120 @@
+"""
+Gerador determinístico de bases sintéticas (empresas + transações) com o
+mesmo formato e tipos das planilhas do workbook.
+
+A rede de pagamentos segue uma lei de potência: cada empresa recebe um peso
+de atividade tirado de uma distribuição de Pareto, e pagadores e recebedores
+são sorteados proporcionalmente a esses pesos. Poucas empresas concentram a
+maior parte das relações, como numa cadeia de fornecimento real.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.dados_sinteticos --empresas 10000 --saida data/sintetico
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from faker import Faker
+
+from data_loader import _tipar_empresas, _tipar_transacoes
+
+# --- PARÂMETROS DA BASE SINTÉTICA ---
+MESES = 12
+TRANSACOES_POR_EMPRESA = 20
+# Expoente da cauda de Pareto dos pesos de atividade (menor = rede mais concentrada)
+EXPOENTE_PARETO = 1.5
+N_CNAES = 300
+TIPOS_TRANSACAO = ['PIX', 'TED', 'BOLETO', 'SISTEMICO', 'ESTORNO']
+PROBABILIDADES_TIPO = [0.45, 0.2, 0.25, 0.07, 0.03]
+INICIO = pd.Timestamp('2023-01-01')
+# -----------------------------
+
+
+def gerar_ids(n_empresas, seed=42):
+    """CNPJs fictícios únicos (Faker pt_BR com semente fixa)."""
+    fake = Faker('pt_BR')
+    fake.seed_instance(seed)
+    return [fake.unique.cnpj() for _ in range(n_empresas)]
+
+
+def gerar_empresas(ids, meses=MESES, seed=42):
+    """Uma linha por empresa e mês de referência, como a 'Base 1 - ID'."""
+    rng = np.random.default_rng(seed)
+    n = len(ids)
+    cnaes = np.array([f"{a:02d}.{b:02d}-{c}" for a, b, c in zip(
+        rng.integers(1, 99, N_CNAES), rng.integers(10, 99, N_CNAES), rng.integers(0, 9, N_CNAES))])
+    # Setores também com tamanhos desiguais
+    pesos_cnae = rng.pareto(1.0, N_CNAES) + 1
+
+    abertura = INICIO - pd.to_timedelta(rng.integers(30, 30 * 365, n), unit='D')
+    faturamento = rng.lognormal(13, 1.2, n)
+    saldo = faturamento * rng.uniform(-0.2, 0.8, n)
+    cnae = rng.choice(cnaes, n, p=pesos_cnae / pesos_cnae.sum())
+
+    empresas = pd.DataFrame({
+        'id': np.repeat(np.asarray(ids, dtype=object), meses),
+        'dt_abrt': np.repeat(abertura.to_numpy(), meses),
+        'dt_refe': np.tile(pd.date_range(INICIO, periods=meses, freq='MS').to_numpy(), n),
+        'vl_fatu': np.repeat(faturamento, meses) * rng.lognormal(0, 0.15, n * meses),
+        'vl_sldo': np.repeat(saldo, meses),
+        'ds_cnae': np.repeat(cnae, meses),
+    })
+    return _tipar_empresas(empresas)
+
+
+def gerar_transacoes(ids, transacoes_por_empresa=TRANSACOES_POR_EMPRESA, meses=MESES,
+                     expoente=EXPOENTE_PARETO, seed=42):
+    """Transações pagador → recebedor sobre uma rede com graus em lei de potência."""
+    rng = np.random.default_rng(seed + 1)
+    n = len(ids)
+    m = n * transacoes_por_empresa
+
+    peso_pagador = rng.pareto(expoente, n) + 1
+    peso_recebedor = rng.pareto(expoente, n) + 1
+    pagador = rng.choice(n, m, p=peso_pagador / peso_pagador.sum())
+    recebedor = rng.choice(n, m, p=peso_recebedor / peso_recebedor.sum())
+    # Sem autopagamentos
+    iguais = pagador == recebedor
+    recebedor[iguais] = (recebedor[iguais] + 1 + rng.integers(0, n - 1, iguais.sum())) % n
+
+    # Empresas com mais atividade pagam valores maiores
+    valor = rng.lognormal(8, 1.0, m) * peso_pagador[pagador] ** 0.3
+    dias = rng.integers(0, (pd.Timestamp(INICIO) + pd.DateOffset(months=meses) - INICIO).days, m)
+
+    ids = np.asarray(ids, dtype=object)
+    transacoes = pd.DataFrame({
+        'id_pgto': ids[pagador],
+        'id_rcbe': ids[recebedor],
+        'vl': valor.round(2),
+        'dt_refe': INICIO + pd.to_timedelta(dias, unit='D'),
+        'ds_tran': rng.choice(TIPOS_TRANSACAO, m, p=PROBABILIDADES_TIPO),
+    })
+    return _tipar_transacoes(transacoes)
+
+
+def gerar_bases(n_empresas, transacoes_por_empresa=TRANSACOES_POR_EMPRESA, meses=MESES, seed=42):
+    """(empresas, transacoes) reprodutíveis para uma dada semente."""
+    ids = gerar_ids(n_empresas, seed)
+    return gerar_empresas(ids, meses, seed), gerar_transacoes(ids, transacoes_por_empresa, meses, seed=seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--empresas", type=int, default=10_000)
+    parser.add_argument("--transacoes-por-empresa", type=int, default=TRANSACOES_POR_EMPRESA)
+    parser.add_argument("--meses", type=int, default=MESES)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--saida", default=os.path.join("data", "sintetico"), help="pasta dos Parquet gerados")
+    args = parser.parse_args()
+
+    empresas, transacoes = gerar_bases(args.empresas, args.transacoes_por_empresa, args.meses, args.seed)
+    os.makedirs(args.saida, exist_ok=True)
+    empresas.to_parquet(os.path.join(args.saida, "empresas.parquet"), index=False)
+    # Pode ser lido em blocos por data_loader.iterar_transacoes
+    transacoes.to_parquet(os.path.join(args.saida, "transacoes.parquet"), index=False)
+    print(f"{empresas['id'].nunique()} empresas e {len(transacoes)} transações gravadas em '{args.saida}'.")
+
+
+if __name__ == "__main__":
+    main()
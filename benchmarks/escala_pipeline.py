@@ -0,0 +1,276 @@
+"""
+Benchmark de escala do pipeline inteiro sobre bases sintéticas.
+
+Para cada tamanho de portfólio gera uma base reprodutível (ver
+benchmarks/dados_sinteticos.py) e mede, etapa a etapa, o tempo e o pico de
+memória de: features_cashflow, a matriz densa (empresas × meses) com o
+perfil financeiro e as janelas móveis calculados sobre ela (comparados com
+_perfil_financeiro na base longa), _criar_features_para_cluster,
+clusterizar_empresas_kmeans, prever_com_modelos, prever_fluxo_caixa (numa
+amostra de empresas), construção do grafo, motor de risco, comunidades e as
+consultas da página de Cadeia de Valor. O resultado é gravado em JSON, para
+comparar versões do código.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.escala_pipeline
+    python -m benchmarks.escala_pipeline --empresas 10000 100000 --saida resultado.json
+    python -m benchmarks.escala_pipeline --empresas 10000 --comparar benchmarks/resultados/anterior.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.dados_sinteticos import MESES, TRANSACOES_POR_EMPRESA, gerar_bases
+from comunidades import detectar_comunidades
+from grafo_local import GrafoLocal
+from indice_empresas import IndiceEmpresas
+from matriz_mensal import MatrizMensal, desvio_movel, media_movel
+from previsao import MODELOS, prever_com_modelos
+from risco_rede import calcular_risco
+from utils import _criar_features_para_cluster, _perfil_financeiro, clusterizar_empresas_kmeans, features_cashflow, prever_fluxo_caixa
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# --- CONFIGURAÇÃO DO BENCHMARK ---
+TAMANHOS = [10_000, 100_000, 1_000_000]
+PASTA_RESULTADOS = os.path.join("benchmarks", "resultados")
+# Empresas sorteadas para as etapas que são chamadas uma empresa de cada vez
+AMOSTRA_CONSULTAS = 200
+# Louvain acima deste tamanho demora demais para um benchmark de rotina
+MAX_EMPRESAS_COMUNIDADES = 100_000
+# Razão de tempo a partir da qual uma etapa é marcada como regressão
+LIMIAR_REGRESSAO = 1.2
+# -----------------------------
+
+
+def _rss_mb():
+    """Memória residente atual do processo (None se não houver /proc, p.ex. fora do Linux)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _pico_rss_processo_mb():
+    """Pico de memória residente desde o início do processo (None fora de Unix)."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux devolve KB, macOS devolve bytes
+    return pico / 1024 ** 2 if platform.system() == "Darwin" else pico / 1024
+
+
+class _AmostradorRSS:
+    """Lê a memória residente a cada `intervalo` segundos numa thread e guarda o maior valor."""
+
+    def __init__(self, intervalo=0.01):
+        self.intervalo = intervalo
+        self.pico = _rss_mb()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, daemon=True)
+
+    def _amostrar(self):
+        while not self._parar.wait(self.intervalo):
+            self.pico = max(self.pico, _rss_mb())
+
+    def __enter__(self):
+        if self.pico is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *erro):
+        self._parar.set()
+        if self._thread.is_alive():
+            self._thread.join()
+            self.pico = max(self.pico, _rss_mb())
+
+
+class Medidor:
+    """
+    Cronometra etapas e guarda tempo, pico de memória residente durante a
+    etapa e, opcionalmente, o pico de memória alocada pelo Python
+    (tracemalloc, que deixa as etapas bem mais lentas).
+    """
+
+    def __init__(self, rastrear_alocacoes=False):
+        self.rastrear_alocacoes = rastrear_alocacoes
+        self.etapas = []
+
+    def medir(self, etapa, funcao, *args, **kwargs):
+        gc.collect()
+        if self.rastrear_alocacoes:
+            tracemalloc.start()
+        with _AmostradorRSS() as amostrador:
+            inicio = time.perf_counter()
+            resultado = funcao(*args, **kwargs)
+            segundos = time.perf_counter() - inicio
+        alocado = None
+        if self.rastrear_alocacoes:
+            alocado = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+            tracemalloc.stop()
+
+        pico = amostrador.pico if amostrador.pico is not None else _pico_rss_processo_mb()
+        linhas = len(resultado) if hasattr(resultado, '__len__') and not isinstance(resultado, (dict, tuple)) else None
+        self.etapas.append({
+            'etapa': etapa,
+            'segundos': round(segundos, 4),
+            'pico_rss_mb': None if pico is None else round(pico, 1),
+            'pico_alocado_mb': None if alocado is None else round(alocado, 1),
+            'linhas': linhas,
+        })
+        print(f"  {etapa:<40} {segundos:>10.3f}s {'' if pico is None else f'{pico:>10.1f} MB'}")
+        return resultado
+
+
+def _consultas_grafo(grafo, amostra):
+    """As consultas da página de Cadeia de Valor para uma amostra de empresas."""
+    grafo.get_top_conexoes(200)
+    grafo.get_dependencias_criticas_geral(0.7)
+    for empresa_id in amostra:
+        clientes, _ = grafo.get_relacoes_individuais(empresa_id)
+        if not clientes.empty:
+            grafo.get_risco_em_cascata(clientes.iloc[0]['cliente'])
+        grafo.get_vizinhanca(empresa_id)
+
+
+def _janelas_moveis(matriz, janela=6):
+    """Média e volatilidade móveis da receita de todas as empresas, mês a mês."""
+    return media_movel(matriz['receita'], janela, matriz.mascara), desvio_movel(matriz['receita'], janela, matriz.mascara)
+
+
+def _previsoes_individuais(base, amostra):
+    # Como na página de Previsão: o histórico vem do índice por empresa
+    indice = IndiceEmpresas(base, 'id')
+    for empresa_id in amostra:
+        prever_fluxo_caixa(indice.linhas(empresa_id), 'receita')
+
+
+def executar(n_empresas, transacoes_por_empresa=TRANSACOES_POR_EMPRESA, meses=MESES, seed=42,
+             modelos=tuple(MODELOS), rastrear_alocacoes=False):
+    """Executa todas as etapas para um tamanho de portfólio e devolve o registo do ensaio."""
+    print(f"\n{n_empresas:,} empresas × {transacoes_por_empresa} transações por empresa")
+    inicio = time.perf_counter()
+    empresas, transacoes = gerar_bases(n_empresas, transacoes_por_empresa, meses, seed)
+    print(f"  {'(geração da base sintética)':<40} {time.perf_counter() - inicio:>10.3f}s")
+
+    medidor = Medidor(rastrear_alocacoes)
+    rng = np.random.default_rng(seed)
+
+    base = medidor.medir('features_cashflow', features_cashflow, transacoes)
+    medidor.medir('_perfil_financeiro (base longa)', _perfil_financeiro, base)
+    matriz = medidor.medir('MatrizMensal.de_transacoes', MatrizMensal.de_transacoes, transacoes)
+    medidor.medir('perfil_financeiro (matriz densa)', matriz.perfil_financeiro)
+    medidor.medir('janelas móveis de 6 meses (matriz densa)', _janelas_moveis, matriz)
+    medidor.medir('_criar_features_para_cluster', _criar_features_para_cluster, base, empresas)
+    perfil = medidor.medir('clusterizar_empresas_kmeans', clusterizar_empresas_kmeans, base, empresas)
+    medidor.medir('prever_com_modelos', prever_com_modelos, base, modelos)
+
+    amostra = rng.choice(perfil['id'].to_numpy(), min(AMOSTRA_CONSULTAS, len(perfil)), replace=False)
+    medidor.medir(f'prever_fluxo_caixa ({len(amostra)} empresas)', _previsoes_individuais, base, amostra)
+
+    grafo = medidor.medir('GrafoLocal', GrafoLocal, transacoes, empresas)
+    medidor.medir('calcular_risco', calcular_risco, grafo)
+    if n_empresas <= MAX_EMPRESAS_COMUNIDADES:
+        medidor.medir('detectar_comunidades', detectar_comunidades, grafo)
+    medidor.medir(f'consultas do grafo ({len(amostra)} empresas)', _consultas_grafo, grafo, amostra)
+
+    return {
+        'empresas': n_empresas,
+        'transacoes': len(transacoes),
+        'linhas_base_mensal': len(base),
+        'pares_no_grafo': len(grafo.par_valor),
+        'etapas': medidor.etapas,
+    }
+
+
+def _versao_codigo():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(anterior, atual, limiar=LIMIAR_REGRESSAO):
+    """Tabela de tempos (anterior vs. atual) por tamanho e etapa, com as regressões marcadas."""
+    def tempos(resultado):
+        return {(ensaio['empresas'], etapa['etapa']): etapa['segundos']
+                for ensaio in resultado['ensaios'] for etapa in ensaio['etapas']}
+
+    antes, depois = tempos(anterior), tempos(atual)
+    linhas = [
+        {'empresas': chave[0], 'etapa': chave[1], 'anterior_s': antes[chave], 'atual_s': depois[chave],
+         'razao': depois[chave] / antes[chave] if antes[chave] > 0 else np.nan}
+        for chave in depois if chave in antes
+    ]
+    tabela = pd.DataFrame(linhas, columns=['empresas', 'etapa', 'anterior_s', 'atual_s', 'razao'])
+    tabela['regressao'] = tabela['razao'] > limiar
+    return tabela
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--empresas", type=int, nargs="+", default=TAMANHOS)
+    parser.add_argument("--transacoes-por-empresa", type=int, default=TRANSACOES_POR_EMPRESA)
+    parser.add_argument("--meses", type=int, default=MESES)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--modelos", nargs="+", choices=list(MODELOS), default=list(MODELOS),
+                        help="modelos da etapa prever_com_modelos")
+    parser.add_argument("--tracemalloc", action="store_true", help="mede também a memória alocada pelo Python (bem mais lento)")
+    parser.add_argument("--saida", default=None, help="arquivo JSON do resultado (padrão: benchmarks/resultados/escala-<commit>-<data>.json)")
+    parser.add_argument("--comparar", default=None, help="JSON de uma execução anterior, para comparar os tempos")
+    args = parser.parse_args()
+
+    commit = _versao_codigo()
+    resultado = {
+        'benchmark': 'escala_pipeline',
+        'commit': commit,
+        'executado_em': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'ambiente': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'parametros': {
+            'transacoes_por_empresa': args.transacoes_por_empresa,
+            'meses': args.meses,
+            'seed': args.seed,
+            'amostra_consultas': AMOSTRA_CONSULTAS,
+            'modelos': args.modelos,
+        },
+        'ensaios': [
+            executar(n, args.transacoes_por_empresa, args.meses, args.seed, tuple(args.modelos), args.tracemalloc)
+            for n in args.empresas
+        ],
+    }
+
+    saida = args.saida or os.path.join(
+        PASTA_RESULTADOS, f"escala-{commit or 'sem-git'}-{pd.Timestamp.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(saida) or ".", exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"\nResultado gravado em '{saida}'.")
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            anterior = json.load(f)
+        print(f"\nComparação com {anterior.get('commit')} ({anterior.get('executado_em')}):")
+        print(comparar(anterior, resultado).to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+
+
+if __name__ == "__main__":
+    main()
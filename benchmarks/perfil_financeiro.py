@@ -0,0 +1,82 @@
+"""
+Benchmark do cálculo do perfil financeiro (_perfil_financeiro).
+
+Compara a versão vetorizada atual com a implementação antiga baseada em
+lambdas por grupo, confere que os resultados batem e mostra como o tempo
+cresce com o número de empresas.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.perfil_financeiro
+    python -m benchmarks.perfil_financeiro --empresas 1000 10000 50000 --sem-legado
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+from utils import _perfil_financeiro
+
+
+def _tendencia_legado(serie):
+    if len(serie) < 2: return 0
+    x = np.arange(len(serie)).reshape(-1, 1)
+    y = serie.values.reshape(-1, 1)
+    return LinearRegression().fit(x, y).coef_[0][0]
+
+
+def perfil_financeiro_legado(base):
+    """Implementação original, com cinco lambdas por empresa."""
+    return base.groupby('id').agg(
+        receita_media_6m=('receita', lambda x: x.tail(6).mean()),
+        despesa_media_6m=('despesa', lambda x: x.tail(6).mean()),
+        crescimento_receita_3m=('receita', lambda x: _tendencia_legado(x.tail(3))),
+        margem_media_6m=('margem', lambda x: x.tail(6).mean()),
+        volatilidade_receita=('receita', lambda x: x.tail(6).std())
+    ).reset_index()
+
+
+def gerar_base(n_empresas, max_meses=24, seed=42):
+    """Gera uma base mensal sintética com um número variável de meses por empresa."""
+    rng = np.random.default_rng(seed)
+    meses_por_empresa = rng.integers(1, max_meses + 1, n_empresas)
+    ids = np.repeat([f"CNPJ_{i:07d}" for i in range(n_empresas)], meses_por_empresa)
+    inicio = max_meses - meses_por_empresa
+    offsets = np.concatenate([np.arange(i, max_meses) for i in inicio])
+    # Ordinal do mês, como em features_cashflow
+    ano_mes = (pd.Period('2023-01', 'M').ordinal + offsets).astype(np.int32)
+    receita = rng.gamma(2.0, 50_000, len(ids)) * (rng.random(len(ids)) > 0.1)
+    despesa = rng.gamma(2.0, 45_000, len(ids))
+    base = pd.DataFrame({'id': ids, 'ano_mes': ano_mes, 'receita': receita, 'despesa': despesa})
+    base['fluxo_liq'] = base['receita'] - base['despesa']
+    base['margem'] = (base['fluxo_liq'] / base['receita'].replace(0, np.nan)).fillna(0)
+    return base.sort_values(['id', 'ano_mes'])
+
+
+def _cronometrar(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return resultado, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--empresas", type=int, nargs="+", default=[500, 2000, 10000])
+    parser.add_argument("--sem-legado", action="store_true", help="não executa a implementação antiga")
+    args = parser.parse_args()
+
+    print(f"{'empresas':>10} {'linhas':>10} {'vetorizado (s)':>15} {'legado (s)':>12} {'ganho':>8}")
+    for n in args.empresas:
+        base = gerar_base(n)
+        novo, t_novo = _cronometrar(_perfil_financeiro, base)
+        if args.sem_legado:
+            print(f"{n:>10} {len(base):>10} {t_novo:>15.4f} {'-':>12} {'-':>8}")
+            continue
+        antigo, t_antigo = _cronometrar(perfil_financeiro_legado, base)
+        pd.testing.assert_frame_equal(novo, antigo, check_dtype=False, rtol=1e-9)
+        print(f"{n:>10} {len(base):>10} {t_novo:>15.4f} {t_antigo:>12.4f} {t_antigo / t_novo:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
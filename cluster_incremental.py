@@ -0,0 +1,157 @@
+import os
+import threading
+
+import joblib
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.preprocessing import StandardScaler
+
+from data_loader import CACHE_DIR
+from utils import FEATURES_CLUSTER, _nomear_clusters
+
+# Arquivo onde ficam o scaler, os centróides e os nomes dos clusters
+CAMINHO_MODELO = os.path.join(CACHE_DIR, "modelo_clusters.joblib")
+
+
+class ClusterizadorIncremental:
+    """
+    Clusterização com modelo persistido: o StandardScaler e os centróides do
+    MiniBatchKMeans ficam gravados em disco, as empresas novas ou atualizadas
+    são atribuídas ao centróide mais próximo e o modelo pode ser reajustado
+    em segundo plano sem bloquear quem está a consultar.
+
+    Nos reajustes, cada centróide novo herda o nome ('Início', 'Declínio',
+    'Crescimento', 'Maturidade') do centróide antigo mais próximo, para que
+    os segmentos não troquem de rótulo entre um ajuste e outro.
+
+    Só corre um ajuste de cada vez por clusterizador (_trava_ajuste): um
+    pedido de reajuste enquanto outro está a correr é ignorado.
+    """
+
+    def __init__(self, caminho=CAMINHO_MODELO, n_clusters=4, random_state=42):
+        self.caminho = caminho
+        self.n_clusters = n_clusters
+        self.random_state = random_state
+        self.scaler = None
+        self.kmeans = None
+        self.nomes = None
+        self._lock = threading.Lock()
+        self._trava_ajuste = threading.Lock()
+        self._thread = None
+        if caminho and os.path.exists(caminho):
+            self._carregar()
+
+    @property
+    def ajustado(self):
+        return self.kmeans is not None
+
+    def _carregar(self):
+        modelo = joblib.load(self.caminho)
+        self.scaler, self.kmeans, self.nomes = modelo['scaler'], modelo['kmeans'], modelo['nomes']
+
+    def salvar(self):
+        """Grava o modelo atual em disco (escrita atómica)."""
+        if not self.caminho:
+            return
+        with self._lock:
+            modelo = {'scaler': self.scaler, 'kmeans': self.kmeans, 'nomes': self.nomes}
+        os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+        temporario = f"{self.caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        joblib.dump(modelo, temporario)
+        os.replace(temporario, self.caminho)
+
+    def _herdar_nomes(self, scaler, kmeans):
+        """Associa cada centróide novo a um antigo (atribuição de custo mínimo) e copia o nome."""
+        antigos = scaler.transform(self.scaler.inverse_transform(self.kmeans.cluster_centers_))
+        custo = ((kmeans.cluster_centers_[:, None, :] - antigos[None, :, :]) ** 2).sum(axis=2)
+        novos_idx, antigos_idx = linear_sum_assignment(custo)
+        return {int(novo): self.nomes[int(antigo)] for novo, antigo in zip(novos_idx, antigos_idx)}
+
+    def ajustar(self, df_features):
+        """Ajusta scaler e MiniBatchKMeans sobre a população inteira e troca o modelo em uso."""
+        with self._trava_ajuste:
+            self._ajustar(df_features)
+
+    def ajustar_se_preciso(self, df_features):
+        """Faz o primeiro ajuste se ainda não houver modelo (um só, mesmo com chamadas concorrentes)."""
+        with self._trava_ajuste:
+            if not self.ajustado:
+                self._ajustar(df_features)
+
+    def _ajustar(self, df_features):
+        X = df_features[FEATURES_CLUSTER].to_numpy(dtype='float64')
+        scaler = StandardScaler().fit(X)
+        kmeans = MiniBatchKMeans(n_clusters=self.n_clusters, random_state=self.random_state, n_init='auto', batch_size=1024)
+        rotulos = kmeans.fit_predict(scaler.transform(X))
+
+        if self.ajustado:
+            nomes = self._herdar_nomes(scaler, kmeans)
+        else:
+            nomes = {int(c): nome for c, nome in _nomear_clusters(df_features.assign(cluster=rotulos)).items()}
+
+        with self._lock:
+            self.scaler, self.kmeans, self.nomes = scaler, kmeans, nomes
+        self.salvar()
+
+    def prever(self, df_features):
+        """Atribui cada empresa ao centróide mais próximo do modelo em uso."""
+        with self._lock:
+            scaler, kmeans, nomes = self.scaler, self.kmeans, self.nomes
+        resultado = df_features.copy()
+        X = resultado[FEATURES_CLUSTER].to_numpy(dtype='float64')
+        resultado['cluster'] = kmeans.predict(scaler.transform(X))
+        resultado['momento'] = resultado['cluster'].map(nomes)
+        return resultado
+
+    def reajustar_em_segundo_plano(self, df_features):
+        """
+        Dispara o reajuste numa thread. Se já houver um reajuste a correr, não
+        inicia outro. Devolve True quando um reajuste foi iniciado.
+        """
+        if not self._trava_ajuste.acquire(blocking=False):
+            return False
+        self._thread = threading.Thread(target=self._reajustar, args=(df_features.copy(),), daemon=True)
+        self._thread.start()
+        return True
+
+    def _reajustar(self, df_features):
+        # Corre na thread com a trava já adquirida por reajustar_em_segundo_plano
+        try:
+            self._ajustar(df_features)
+        finally:
+            self._trava_ajuste.release()
+
+    def aguardar(self, timeout=None):
+        """Espera o reajuste em segundo plano terminar (útil em scripts e jobs)."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+_clusterizador = None
+_trava_clusterizador = threading.Lock()
+
+
+def obter_clusterizador():
+    """O clusterizador partilhado pelo processo (criado na primeira chamada)."""
+    global _clusterizador
+    with _trava_clusterizador:
+        if _clusterizador is None:
+            _clusterizador = ClusterizadorIncremental()
+        return _clusterizador
+
+
+def clusterizar_perfil_incremental(df_features, clusterizador=None):
+    """
+    Versão incremental de clusterizar_perfil. Na primeira execução ajusta e
+    grava o modelo; nas seguintes classifica com o modelo gravado e agenda um
+    reajuste em segundo plano, que vale a partir da próxima chamada.
+    """
+    if clusterizador is None:
+        clusterizador = obter_clusterizador()
+    if not clusterizador.ajustado:
+        clusterizador.ajustar_se_preciso(df_features)
+        return clusterizador.prever(df_features)
+
+    resultado = clusterizador.prever(df_features)
+    clusterizador.reajustar_em_segundo_plano(df_features)
+    return resultado
@@ -0,0 +1,213 @@
+import os
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from networkx.algorithms import community as nx_comm
+
+from data_loader import CACHE_DIR
+from instrumentacao import instrumentar, marcar_cache
+
+# --- CONFIGURAÇÃO DAS COMUNIDADES ---
+# Partições do grafo completo, uma por resolução, guardadas entre execuções
+PASTA_COMUNIDADES = os.path.join(CACHE_DIR, "comunidades")
+RESOLUCAO_PADRAO = 1.1
+SEMENTE = 42
+
+# Paleta fixa: a comunidade n tem sempre a mesma cor (as comunidades são
+# numeradas da maior para a menor na deteção completa, ver _numerar, e
+# mantêm o número nas atualizações incrementais, ver _herdar_numeros)
+PALETA_COMUNIDADES = [
+    "#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f",
+    "#bcbd22", "#17becf", "#aec7e8", "#ffbb78", "#98df8a", "#ff9896", "#c5b0d5", "#c49c94",
+    "#f7b6d2", "#c7c7c7", "#dbdb8d", "#9edae5",
+]
+COR_SEM_COMUNIDADE = "#808080"
+# -----------------------------
+
+
+def cor_comunidade(comunidade):
+    """Cor determinística de uma comunidade (-1 = sem comunidade)."""
+    if comunidade < 0:
+        return COR_SEM_COMUNIDADE
+    return PALETA_COMUNIDADES[comunidade % len(PALETA_COMUNIDADES)]
+
+
+def assinaturas_nos(grafo):
+    """
+    Um hash por empresa das suas relações agregadas (entrada e saída), para
+    saber quais empresas mudaram entre duas versões do grafo.
+    """
+    hash_pares = pd.util.hash_pandas_object(pd.DataFrame({
+        'pagador': grafo.ids[grafo.par_pagador],
+        'recebedor': grafo.ids[grafo.par_recebedor],
+        'valor': grafo.par_valor,
+    }), index=False).to_numpy()
+
+    n = len(grafo)
+    assinaturas = np.zeros(n, dtype=np.uint64)
+    # Somas em uint64 (com overflow) dos hashes dos pares de cada empresa
+    np.add.at(assinaturas, grafo.par_pagador, hash_pares)
+    np.add.at(assinaturas, grafo.par_recebedor, hash_pares * np.uint64(31))
+    return assinaturas
+
+
+def versao_grafo(assinaturas):
+    return f"{int(assinaturas.sum(dtype=np.uint64)):016x}-{len(assinaturas)}"
+
+
+def _grafo_nao_direcionado(grafo, posicoes=None):
+    """
+    Grafo networkx não direcionado com peso = soma dos valores nas duas
+    direções. Com posicoes, só as arestas entre essas empresas.
+    """
+    pagador, recebedor, valor = grafo.par_pagador, grafo.par_recebedor, grafo.par_valor
+    if posicoes is not None:
+        dentro = np.zeros(len(grafo), dtype=bool)
+        dentro[posicoes] = True
+        manter = dentro[pagador] & dentro[recebedor]
+        pagador, recebedor, valor = pagador[manter], recebedor[manter], valor[manter]
+
+    a, b = np.minimum(pagador, recebedor), np.maximum(pagador, recebedor)
+    arestas = pd.DataFrame({'a': a, 'b': b, 'peso': valor}).groupby(['a', 'b'], sort=False)['peso'].sum()
+
+    G = nx.Graph()
+    G.add_nodes_from(range(len(grafo)) if posicoes is None else posicoes)
+    G.add_weighted_edges_from(zip(arestas.index.get_level_values(0), arestas.index.get_level_values(1), arestas.to_numpy()))
+    return G
+
+
+def _numerar(rotulos, ids):
+    """
+    Renumera as comunidades de forma determinística: 0 é a maior, empates
+    desfeitos pelo menor id. Assim as cores não mudam entre execuções.
+    """
+    df = pd.DataFrame({'id': ids, 'rotulo': rotulos})
+    resumo = df.groupby('rotulo')['id'].agg(['size', 'min']).sort_values(['size', 'min'], ascending=[False, True])
+    novos = pd.Series(np.arange(len(resumo)), index=resumo.index)
+    return novos.loc[rotulos].to_numpy()
+
+
+def _herdar_numeros(novos, anteriores, ids, proximo):
+    """
+    Números das comunidades recalculadas numa atualização incremental, sem
+    mexer nos números já existentes: cada comunidade anterior passa o seu
+    número à comunidade nova com que partilha mais empresas (numa divisão,
+    à maior parte; numa junção, fica o número da comunidade anterior que
+    trouxe mais empresas). As comunidades novas que sobram recebem números
+    a partir de `proximo`, da maior para a menor (empates pelo menor id).
+
+    novos: rótulo do Louvain de cada empresa recalculada; anteriores: o seu
+    número anterior (-1 para empresas novas).
+    """
+    df = pd.DataFrame({'novo': novos, 'anterior': anteriores, 'id': ids})
+    partilhadas = (df[df['anterior'] >= 0].groupby(['novo', 'anterior']).size().rename('empresas').reset_index()
+                   .sort_values(['empresas', 'anterior', 'novo'], ascending=[False, True, True]))
+
+    numeros, herdados = {}, set()
+    for novo, anterior in zip(partilhadas['novo'], partilhadas['anterior']):
+        if novo not in numeros and anterior not in herdados:
+            numeros[novo] = anterior
+            herdados.add(anterior)
+
+    resumo = df.groupby('novo')['id'].agg(['size', 'min']).sort_values(['size', 'min'], ascending=[False, True])
+    for novo in resumo.index:
+        if novo not in numeros:
+            numeros[novo] = proximo
+            proximo += 1
+    return df['novo'].map(numeros).to_numpy()
+
+
+@instrumentar()
+def detectar_comunidades(grafo, resolucao=RESOLUCAO_PADRAO, semente=SEMENTE):
+    """Louvain sobre o grafo agregado completo. Devolve a comunidade de cada empresa (na ordem de grafo.ids)."""
+    G = _grafo_nao_direcionado(grafo)
+    rotulos = np.full(len(grafo), -1)
+    for rotulo, comunidade in enumerate(nx_comm.louvain_communities(G, weight='weight', resolution=resolucao, seed=semente)):
+        rotulos[list(comunidade)] = rotulo
+    return _numerar(rotulos, grafo.ids)
+
+
+def atualizar_comunidades(grafo, anteriores, alteradas, resolucao=RESOLUCAO_PADRAO, semente=SEMENTE):
+    """
+    Atualização incremental: as comunidades que não têm nenhuma empresa
+    alterada ficam como estão; as empresas das comunidades tocadas (e as
+    empresas novas) são reagrupadas com Louvain só no subgrafo entre elas.
+    Os números das comunidades existentes não mudam; só as comunidades
+    novas ou as partes novas de uma divisão recebem números novos (ver
+    _herdar_numeros), para que as cores se mantenham entre versões.
+
+    anteriores: comunidade anterior de cada empresa (-1 para empresas novas);
+    alteradas: máscara booleana das empresas cujas relações mudaram.
+    """
+    tocadas = np.unique(anteriores[alteradas & (anteriores >= 0)])
+    refazer = alteradas | (anteriores < 0) | np.isin(anteriores, tocadas)
+    posicoes = np.flatnonzero(refazer)
+
+    rotulos = anteriores.copy()
+    if len(posicoes):
+        G = _grafo_nao_direcionado(grafo, posicoes)
+        louvain = np.full(len(grafo), -1)
+        for rotulo, comunidade in enumerate(nx_comm.louvain_communities(G, weight='weight', resolution=resolucao, seed=semente)):
+            louvain[list(comunidade)] = rotulo
+        proximo = anteriores.max() + 1 if len(anteriores) else 0
+        rotulos[posicoes] = _herdar_numeros(louvain[posicoes], anteriores[posicoes], np.asarray(grafo.ids)[posicoes], max(proximo, 0))
+    return rotulos
+
+
+def _caminho(pasta, resolucao):
+    return os.path.join(pasta, f"comunidades-res{resolucao:g}.parquet")
+
+
+@instrumentar()
+def obter_comunidades(grafo, resolucao=RESOLUCAO_PADRAO, pasta=PASTA_COMUNIDADES):
+    """
+    Comunidade de cada empresa para uma resolução, como Series indexada pelo id.
+
+    A partição fica gravada por resolução. Se o grafo não mudou, é lida do
+    disco; se mudou (novas transações), só as empresas com relações alteradas
+    e as suas comunidades são recalculadas; sem partição anterior, o Louvain
+    corre sobre o grafo inteiro.
+    """
+    assinaturas = assinaturas_nos(grafo)
+    versao = versao_grafo(assinaturas)
+    caminho = _caminho(pasta, resolucao)
+
+    gravada = None
+    if os.path.exists(caminho):
+        tabela = pq.read_table(caminho)
+        if tabela.schema.metadata and tabela.schema.metadata.get(b"versao_grafo", b"").decode() == versao:
+            marcar_cache("hit")
+            df = tabela.to_pandas()
+            return pd.Series(df['comunidade'].to_numpy(), index=pd.Index(df['id'], name='id'), name='comunidade')
+        gravada = tabela.to_pandas().set_index('id')
+
+    marcar_cache("miss")
+    if gravada is None:
+        rotulos = detectar_comunidades(grafo, resolucao)
+    else:
+        posicao = gravada.index.get_indexer(grafo.ids)
+        novas = posicao < 0
+        anteriores = np.where(novas, -1, gravada['comunidade'].to_numpy()[np.maximum(posicao, 0)])
+        alteradas = novas | (gravada['assinatura'].to_numpy(dtype=np.uint64)[np.maximum(posicao, 0)] != assinaturas)
+        rotulos = atualizar_comunidades(grafo, anteriores, alteradas, resolucao)
+
+    os.makedirs(pasta, exist_ok=True)
+    df = pd.DataFrame({'id': grafo.ids, 'comunidade': rotulos, 'assinatura': assinaturas})
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    tabela = tabela.replace_schema_metadata({**(tabela.schema.metadata or {}), b"versao_grafo": versao.encode()})
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    pq.write_table(tabela, temporario)
+    os.replace(temporario, caminho)
+    return pd.Series(rotulos, index=pd.Index(grafo.ids, name='id'), name='comunidade')
+
+
+def projetar_comunidades(comunidades, nos):
+    """
+    Projeção da partição completa nos nós de uma vista (p.ex. as N conexões
+    mais fortes): lista de conjuntos, um por comunidade presente na vista.
+    """
+    presentes = comunidades.reindex(list(nos)).dropna().astype(int)
+    return [set(grupo.index) for _, grupo in presentes.groupby(presentes)]
@@ -1,23 +1,153 @@
-from openai import OpenAI
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from openai import AsyncOpenAI, OpenAI
 import pandas as pd
 from dotenv import load_dotenv
-import os
 import streamlit as st
 
+from data_loader import CACHE_DIR
+from instrumentacao import marcar_cache, medir
+
 # --- Carregamento da Chave de API ---
 load_dotenv()
 api_key = os.getenv('API_KEY') or st.secrets.get("OPENAI_API_KEY")
 
+# --- CONFIGURAÇÃO DAS CHAMADAS À IA ---
+MODELO = "gpt-4o-mini"
+# Endereço da API: permite apontar para um servidor local (p.ex. um stub nos testes)
+BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+TEMPO_LIMITE_IA = 60  # segundos por chamada
+# Cache persistente das respostas, partilhado entre sessões e reinícios
+CAMINHO_CACHE_IA = os.getenv("CACHE_IA_PATH", os.path.join(CACHE_DIR, "respostas_ia.sqlite"))
+VALIDADE_CACHE_IA = 7 * 24 * 3600  # segundos
+MAX_RESPOSTAS_EM_CACHE = 5000
+# -----------------------------
+
 if not api_key:
     st.error("Chave de API da OpenAI não encontrada. Por favor, configure o ficheiro .env ou os segredos do Streamlit.")
     client = None
+    client_async = None
 else:
-    client = OpenAI(api_key=api_key)
+    client = OpenAI(api_key=api_key, base_url=BASE_URL, timeout=TEMPO_LIMITE_IA)
+    client_async = AsyncOpenAI(api_key=api_key, base_url=BASE_URL, timeout=TEMPO_LIMITE_IA)
+
+
+# --- CACHE DAS RESPOSTAS (SQLite) ---
+def _chave_cache(mensagens, parametros, modelo=MODELO):
+    """Hash do pedido completo: mensagens (prompt), modelo e parâmetros."""
+    pedido = json.dumps({'modelo': modelo, 'mensagens': mensagens, 'parametros': parametros}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(pedido.encode("utf-8")).hexdigest()
+
+
+def _conectar_cache(caminho=CAMINHO_CACHE_IA):
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    conexao = sqlite3.connect(caminho, timeout=10)
+    conexao.execute("PRAGMA journal_mode=WAL")
+    conexao.execute(
+        "CREATE TABLE IF NOT EXISTS respostas ("
+        "chave TEXT PRIMARY KEY, resposta TEXT NOT NULL, criada REAL NOT NULL, acessada REAL NOT NULL)"
+    )
+    return conexao
+
+
+def ler_cache(chave, caminho=CAMINHO_CACHE_IA, validade=VALIDADE_CACHE_IA):
+    """Resposta guardada para a chave, ou None se não existir ou tiver expirado."""
+    agora = time.time()
+    # closing fecha a conexão; o "with conexao" só faz o commit (ou o rollback)
+    with closing(_conectar_cache(caminho)) as conexao, conexao:
+        linha = conexao.execute("SELECT resposta, criada FROM respostas WHERE chave = ?", (chave,)).fetchone()
+        if linha is None:
+            return None
+        if agora - linha[1] > validade:
+            conexao.execute("DELETE FROM respostas WHERE chave = ?", (chave,))
+            return None
+        conexao.execute("UPDATE respostas SET acessada = ? WHERE chave = ?", (agora, chave))
+    return linha[0]
+
+
+def gravar_cache(chave, resposta, caminho=CAMINHO_CACHE_IA, validade=VALIDADE_CACHE_IA, max_respostas=MAX_RESPOSTAS_EM_CACHE):
+    """Guarda a resposta e apaga as expiradas e, acima do limite, as menos usadas recentemente."""
+    agora = time.time()
+    with closing(_conectar_cache(caminho)) as conexao, conexao:
+        conexao.execute("INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?)", (chave, resposta, agora, agora))
+        conexao.execute("DELETE FROM respostas WHERE criada < ?", (agora - validade,))
+        excesso = conexao.execute("SELECT COUNT(*) FROM respostas").fetchone()[0] - max_respostas
+        if excesso > 0:
+            conexao.execute(
+                "DELETE FROM respostas WHERE chave IN (SELECT chave FROM respostas ORDER BY acessada LIMIT ?)", (excesso,)
+            )
+
+
+def _completar(mensagens, **parametros):
+    """Chamada síncrona ao chat da OpenAI, passando primeiro pelo cache."""
+    chave = _chave_cache(mensagens, parametros)
+    with medir("ia.chat", modelo=MODELO):
+        resposta = ler_cache(chave)
+        marcar_cache("miss" if resposta is None else "hit")
+        if resposta is None:
+            response = client.chat.completions.create(model=MODELO, messages=mensagens, **parametros)
+            resposta = response.choices[0].message.content.strip()
+            gravar_cache(chave, resposta)
+    return resposta
+
+
+async def _completar_async(mensagens, **parametros):
+    """Mesma chamada com o cliente assíncrono; o SQLite fica fora do loop de eventos."""
+    chave = _chave_cache(mensagens, parametros)
+    with medir("ia.chat", modelo=MODELO):
+        resposta = await asyncio.to_thread(ler_cache, chave)
+        marcar_cache("miss" if resposta is None else "hit")
+        if resposta is None:
+            response = await client_async.chat.completions.create(model=MODELO, messages=mensagens, **parametros)
+            resposta = response.choices[0].message.content.strip()
+            await asyncio.to_thread(gravar_cache, chave, resposta)
+    return resposta
+
+
+# --- EXECUÇÃO EM SEGUNDO PLANO ---
+# Um único loop de eventos, numa thread própria, para todas as chamadas
+# assíncronas: a página agenda a chamada, continua a preparar os dados e os
+# gráficos, e só espera pela resposta quando a vai mostrar.
+_loop_ia = None
+_trava_loop_ia = threading.Lock()
+
+
+def _obter_loop_ia():
+    global _loop_ia
+    with _trava_loop_ia:
+        if _loop_ia is None:
+            _loop_ia = asyncio.new_event_loop()
+            threading.Thread(target=_loop_ia.run_forever, name="consulta_ia", daemon=True).start()
+    return _loop_ia
+
+
+def em_segundo_plano(corrotina):
+    """Agenda a corrotina no loop da IA e devolve um concurrent.futures.Future (use .result())."""
+    return asyncio.run_coroutine_threadsafe(corrotina, _obter_loop_ia())
+
+
+def _responder(pedido):
+    try:
+        return _completar(**pedido)
+    except Exception as e:
+        return f"Ocorreu um erro ao comunicar com a IA: {e}"
+
+
+async def _responder_async(pedido):
+    try:
+        return await _completar_async(**pedido)
+    except Exception as e:
+        return f"Ocorreu um erro ao comunicar com a IA: {e}"
 
 # --- Função para a página de Análise Individual (Mantida) ---
-def retorna_informacao_empresas(perfil_empresa, media_setor):
-    if not client: return "Cliente OpenAI não inicializado. Verifique a sua chave de API."
-    
+def _pedido_informacao_empresas(perfil_empresa, media_setor):
     contexto = f"""
     - ID da Empresa: {perfil_empresa['id']}
     - Momento (via ML): {perfil_empresa['momento']}
@@ -39,28 +169,20 @@ def retorna_informacao_empresas(perfil_empresa, media_setor):
     3.  Com base na tendência de crescimento, dar uma recomendação estratégica.
     Seja direto e foque em insights acionáveis para um gestor.
     """
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Você é um analista financeiro sênior a escrever um diagnóstico para um cliente empresarial."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=250, temperature=0.5,
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"Ocorreu um erro ao comunicar com a IA: {e}"
+    return {
+        'mensagens': [
+            {"role": "system", "content": "Você é um analista financeiro sênior a escrever um diagnóstico para um cliente empresarial."},
+            {"role": "user", "content": prompt}
+        ],
+        'max_tokens': 250, 'temperature': 0.5,
+    }
 
 # --- Função para a página de Análise de Rede  ---
-def gerar_resumo_executivo(G, communities, limiar_risco, limite_conexoes, relacoes_risco_df):
+def _pedido_resumo_executivo(G, communities, limiar_risco, limite_conexoes, relacoes_risco_df):
     """
     Gera um resumo executivo estratégico, agora num formato de dados puro,
     com cada insight numa nova linha, para garantir a formatação no Streamlit.
     """
-    if not client:
-        return "Cliente OpenAI não inicializado."
-
     total_empresas = G.number_of_nodes()
     num_clusters = len(communities)
     top_risco = relacoes_risco_df.iloc[0].to_dict() if not relacoes_risco_df.empty else None
@@ -82,29 +204,21 @@ def gerar_resumo_executivo(G, communities, limiar_risco, limite_conexoes, relaco
     3. [Parágrafo com uma única recomendação acionável.]
     """
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Você é um analista de risco a preparar um briefing. Responda apenas com 3 parágrafos de texto, um por linha."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=300,
-            temperature=0.4,
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"Ocorreu um erro ao comunicar com a IA: {e}"
+    return {
+        'mensagens': [
+            {"role": "system", "content": "Você é um analista de risco a preparar um briefing. Responda apenas com 3 parágrafos de texto, um por linha."},
+            {"role": "user", "content": prompt}
+        ],
+        'max_tokens': 300,
+        'temperature': 0.4,
+    }
 
 # --- FUNÇÃO ATUALIZADA PARA A PÁGINA DE PREVISÃO ---
-def gerar_resumo_previsao(df_historico, df_previsao):
+def _pedido_resumo_previsao(df_historico, df_previsao):
     """
     Gera uma análise de IA sobre a previsão de fluxo de caixa,
     identificando a tendência e sugerindo produtos financeiros de forma direta.
     """
-    if not client:
-        return "Cliente OpenAI não inicializado. Verifique a sua chave de API."
-
     fluxo_historico_medio = df_historico['fluxo_liq'].mean()
     fluxo_previsto_total = df_previsao['fluxo_liq'].sum()
     tendencia = "superavitário (sobra de caixa)" if fluxo_previsto_total > 0 else "deficitário (necessidade de caixa)"
@@ -130,29 +244,21 @@ def gerar_resumo_previsao(df_historico, df_previsao):
     
     **Seja direto e termine a sua resposta logo após a sugestão do produto. Não adicione frases de encerramento ou convites para discussão.**
     """
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Você é um analista financeiro a oferecer uma recomendação objetiva a um cliente PJ."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=150, # Reduzido para garantir ainda mais concisão
-            temperature=0.5,
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"Ocorreu um erro ao comunicar com a IA: {e}"
+    return {
+        'mensagens': [
+            {"role": "system", "content": "Você é um analista financeiro a oferecer uma recomendação objetiva a um cliente PJ."},
+            {"role": "user", "content": prompt}
+        ],
+        'max_tokens': 150,  # Reduzido para garantir ainda mais concisão
+        'temperature': 0.5,
+    }
     
 # --- ANÁLISE DE REDE INDIVIDUAL ---
-def gerar_resumo_individual_rede(empresa_foco, top_clientes, top_fornecedores, risco_cascata):
+def _pedido_resumo_individual_rede(empresa_foco, top_clientes, top_fornecedores, risco_cascata):
     """
     Gera uma análise de IA sobre a cadeia de valor de uma única empresa,
     focando em riscos de dependência e interdependência.
     """
-    if not client:
-        return "Cliente OpenAI não inicializado. Verifique a sua chave de API."
-
     # Prepara os dados de contexto para a IA
     cliente_principal = top_clientes.iloc[0].to_dict() if not top_clientes.empty else "Nenhum cliente significativo."
     fornecedor_principal = top_fornecedores.iloc[0].to_dict() if not top_fornecedores.empty else "Nenhum fornecedor significativo."
@@ -178,16 +284,57 @@ def gerar_resumo_individual_rede(empresa_foco, top_clientes, top_fornecedores, r
 
     Seja direto, focando na identificação do risco e na solução que o banco pode oferecer.
     """
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Você é um especialista em risco de crédito a preparar um diagnóstico para um cliente empresarial."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=250,
-            temperature=0.6,
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"Ocorreu um erro ao comunicar com a IA: {e}"
\ No newline at end of file
+    return {
+        'mensagens': [
+            {"role": "system", "content": "Você é um especialista em risco de crédito a preparar um diagnóstico para um cliente empresarial."},
+            {"role": "user", "content": prompt}
+        ],
+        'max_tokens': 250,
+        'temperature': 0.6,
+    }
+
+
+# --- FUNÇÕES CHAMADAS PELAS PÁGINAS ---
+# Cada análise tem uma versão síncrona e uma assíncrona (_async), para ser
+# agendada com em_segundo_plano enquanto a página prepara os dados.
+SEM_CLIENTE = "Cliente OpenAI não inicializado. Verifique a sua chave de API."
+
+
+def retorna_informacao_empresas(perfil_empresa, media_setor):
+    if not client: return SEM_CLIENTE
+    return _responder(_pedido_informacao_empresas(perfil_empresa, media_setor))
+
+
+async def retorna_informacao_empresas_async(perfil_empresa, media_setor):
+    if not client_async: return SEM_CLIENTE
+    return await _responder_async(_pedido_informacao_empresas(perfil_empresa, media_setor))
+
+
+def gerar_resumo_executivo(G, communities, limiar_risco, limite_conexoes, relacoes_risco_df):
+    if not client: return SEM_CLIENTE
+    return _responder(_pedido_resumo_executivo(G, communities, limiar_risco, limite_conexoes, relacoes_risco_df))
+
+
+async def gerar_resumo_executivo_async(G, communities, limiar_risco, limite_conexoes, relacoes_risco_df):
+    if not client_async: return SEM_CLIENTE
+    return await _responder_async(_pedido_resumo_executivo(G, communities, limiar_risco, limite_conexoes, relacoes_risco_df))
+
+
+def gerar_resumo_previsao(df_historico, df_previsao):
+    if not client: return SEM_CLIENTE
+    return _responder(_pedido_resumo_previsao(df_historico, df_previsao))
+
+
+async def gerar_resumo_previsao_async(df_historico, df_previsao):
+    if not client_async: return SEM_CLIENTE
+    return await _responder_async(_pedido_resumo_previsao(df_historico, df_previsao))
+
+
+def gerar_resumo_individual_rede(empresa_foco, top_clientes, top_fornecedores, risco_cascata):
+    if not client: return SEM_CLIENTE
+    return _responder(_pedido_resumo_individual_rede(empresa_foco, top_clientes, top_fornecedores, risco_cascata))
+
+
+async def gerar_resumo_individual_rede_async(empresa_foco, top_clientes, top_fornecedores, risco_cascata):
+    if not client_async: return SEM_CLIENTE
+    return await _responder_async(_pedido_resumo_individual_rede(empresa_foco, top_clientes, top_fornecedores, risco_cascata))
@@ -1,6 +1,13 @@
+import hashlib
+import json
+import os
+
 import pandas as pd
 import streamlit as st
 
+from instrumentacao import marcar_cache, medir
+from transacoes_compactas import compactar_transacoes
+
 # --- CONFIGURAÇÃO PRINCIPAL ---
 # Nome do seu arquivo Excel. Ele deve estar na mesma pasta que o Home.py
 EXCEL_FILE_PATH = "Challenge FIAP - Bases.xlsx"
@@ -8,31 +15,168 @@ EXCEL_FILE_PATH = "Challenge FIAP - Bases.xlsx"
 # Nomes exatos das suas planilhas
 NOME_PLANILHA_EMPRESAS = "Base 1 - ID"
 NOME_PLANILHA_TRANSACOES = "Base 2 - Transações"
+
+# Base de transações em arquivo plano (CSV ou Parquet), usada no modo streaming
+TRANSACOES_PATH = "data/transacoes.csv"
+
+# Pasta onde ficam as cópias em Parquet das planilhas já convertidas.
+# O Excel só é relido quando o arquivo muda (mtime + hash).
+CACHE_DIR = ".cache_bases"
+
+COLUNAS_EMPRESAS = ['id', 'dt_abrt', 'dt_refe', 'vl_fatu', 'vl_sldo', 'ds_cnae']
+COLUNAS_TRANSACOES = ['id_pgto', 'id_rcbe', 'vl', 'dt_refe', 'ds_tran']
+
+# Versão do layout das tabelas tipadas. Faz parte do nome das cópias em
+# Parquet: ao mudar os tipos, as cópias antigas deixam de ser usadas.
+VERSAO_LAYOUT = 2
 # -----------------------------
 
 
+# --- CACHE COLUNAR DAS PLANILHAS ---
+def _hash_arquivo(caminho, tamanho_bloco=1 << 20):
+    """Calcula o SHA-256 do arquivo lendo-o em blocos."""
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _gravar_atomico(caminho, escrever):
+    """Grava num arquivo temporário e renomeia, para que workers concorrentes nunca leiam um arquivo pela metade."""
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    try:
+        escrever(temporario)
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+def versao_workbook(caminho=EXCEL_FILE_PATH):
+    """
+    Devolve o hash do workbook. O hash fica guardado num manifesto junto com o
+    mtime e o tamanho do arquivo, e só é recalculado quando um deles muda.
+    """
+    stat = os.stat(caminho)
+    chave = os.path.abspath(caminho)
+    caminho_manifesto = os.path.join(CACHE_DIR, "manifesto.json")
+
+    manifesto = {}
+    if os.path.exists(caminho_manifesto):
+        try:
+            with open(caminho_manifesto, "r", encoding="utf-8") as f:
+                manifesto = json.load(f)
+        except (OSError, ValueError):
+            manifesto = {}
+
+    entrada = manifesto.get(chave)
+    if entrada and entrada["mtime"] == stat.st_mtime_ns and entrada["tamanho"] == stat.st_size:
+        return entrada["sha256"]
+
+    sha256 = _hash_arquivo(caminho)
+    manifesto[chave] = {"mtime": stat.st_mtime_ns, "tamanho": stat.st_size, "sha256": sha256}
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    def escrever(destino):
+        with open(destino, "w", encoding="utf-8") as f:
+            json.dump(manifesto, f, indent=2)
+
+    _gravar_atomico(caminho_manifesto, escrever)
+    return sha256
+
+
+def _tipar_empresas(df):
+    """Aplica os tipos definitivos às colunas da base de empresas."""
+    df['dt_abrt'] = pd.to_datetime(df['dt_abrt'])
+    df['dt_refe'] = pd.to_datetime(df['dt_refe'])
+    df['ds_cnae'] = df['ds_cnae'].astype('category')
+    return df
+
+
+def _tipar_transacoes(df):
+    """Aplica os tipos definitivos às colunas da base de transações (layout compacto, ver transacoes_compactas.py)."""
+    return compactar_transacoes(df)
+
+
+_PLANILHAS = {
+    NOME_PLANILHA_EMPRESAS: ("empresas", COLUNAS_EMPRESAS, _tipar_empresas),
+    NOME_PLANILHA_TRANSACOES: ("transacoes", COLUNAS_TRANSACOES, _tipar_transacoes),
+}
+
+
+def ler_planilha(nome_planilha, colunas=None):
+    """
+    Lê uma das planilhas do workbook já com as colunas tipadas, usando o cache
+    em Parquet sempre que ele corresponder à versão atual do arquivo Excel.
+    Com `colunas`, devolve só essas colunas (do Parquet só são lidas elas).
+
+    Levanta FileNotFoundError se o Excel não existir, ValueError se a planilha
+    não existir e KeyError com o nome da coluna se faltar uma coluna essencial.
+    """
+    prefixo, colunas_necessarias, tipar = _PLANILHAS[nome_planilha]
+    with medir(f"ler_planilha.{prefixo}") as etapa:
+        df = _ler_planilha(nome_planilha, prefixo, colunas_necessarias, tipar, colunas)
+        etapa["linhas"] = len(df)
+    return df
+
+
+def _ler_planilha(nome_planilha, prefixo, colunas_necessarias, tipar, colunas=None):
+    versao = versao_workbook()
+    caminho_cache = os.path.join(CACHE_DIR, f"{prefixo}-{versao[:16]}-v{VERSAO_LAYOUT}.parquet")
+
+    if os.path.exists(caminho_cache):
+        marcar_cache("hit")
+        return pd.read_parquet(caminho_cache, columns=colunas)
+    marcar_cache("miss")
+
+    df = pd.read_excel(EXCEL_FILE_PATH, sheet_name=nome_planilha)
+    for col in colunas_necessarias:
+        if col not in df.columns:
+            raise KeyError(col)
+    df = tipar(df)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    _gravar_atomico(caminho_cache, lambda destino: df.to_parquet(destino, index=False))
+
+    # Remove as cópias de versões anteriores do workbook
+    for nome in os.listdir(CACHE_DIR):
+        if nome.startswith(f"{prefixo}-") and nome.endswith(".parquet") and os.path.join(CACHE_DIR, nome) != caminho_cache:
+            os.remove(os.path.join(CACHE_DIR, nome))
+
+    return df if colunas is None else df[colunas]
+
+
+# --- LEITURA EM STREAMING ---
+def iterar_transacoes(caminho=TRANSACOES_PATH, tamanho_chunk=500_000):
+    """
+    Lê as transações de um CSV ou Parquet em pedaços de até `tamanho_chunk`
+    linhas, já tipados, sem carregar o arquivo inteiro em memória.
+    """
+    if caminho.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        arquivo = pq.ParquetFile(caminho)
+        for lote in arquivo.iter_batches(batch_size=tamanho_chunk, columns=COLUNAS_TRANSACOES):
+            yield _tipar_transacoes(lote.to_pandas())
+    else:
+        for chunk in pd.read_csv(caminho, usecols=COLUNAS_TRANSACOES, chunksize=tamanho_chunk):
+            yield _tipar_transacoes(chunk)
+
+
 @st.cache_data
 def load_empresas():
     """
     Carrega e prepara o dataset de empresas a partir da planilha do Excel.
     """
     try:
-        # Lê a planilha especificada do arquivo Excel
-        df = pd.read_excel(EXCEL_FILE_PATH, sheet_name=NOME_PLANILHA_EMPRESAS)
-        
+        return ler_planilha(NOME_PLANILHA_EMPRESAS)
+
+    except KeyError as e:
         # --- Validação de Colunas Essenciais ---
-        # Verifique se os nomes das colunas no seu Excel correspondem a estes
-        colunas_necessarias = ['id', 'dt_abrt', 'dt_refe', 'vl_fatu', 'vl_sldo', 'ds_cnae']
-        for col in colunas_necessarias:
-            if col not in df.columns:
-                st.error(f"Coluna '{col}' não encontrada na planilha de empresas '{NOME_PLANILHA_EMPRESAS}'. Verifique seu arquivo Excel.")
-                return pd.DataFrame()
-
-        # Converte as colunas de data
-        df['dt_abrt'] = pd.to_datetime(df['dt_abrt'])
-        df['dt_refe'] = pd.to_datetime(df['dt_refe'])
-        return df
-        
+        # Verifique se os nomes das colunas no seu Excel correspondem a COLUNAS_EMPRESAS
+        st.error(f"Coluna '{e.args[0]}' não encontrada na planilha de empresas '{NOME_PLANILHA_EMPRESAS}'. Verifique seu arquivo Excel.")
+        return pd.DataFrame()
     except FileNotFoundError:
         st.error(f"Arquivo Excel '{EXCEL_FILE_PATH}' não encontrado. Verifique o nome e se o arquivo está na pasta correta.")
         return pd.DataFrame()
@@ -50,21 +194,13 @@ def load_transacoes():
     Carrega e prepara o dataset de transações a partir da planilha do Excel.
     """
     try:
-        # Lê a planilha especificada do arquivo Excel
-        df = pd.read_excel(EXCEL_FILE_PATH, sheet_name=NOME_PLANILHA_TRANSACOES)
+        return ler_planilha(NOME_PLANILHA_TRANSACOES)
 
+    except KeyError as e:
         # --- Validação de Colunas Essenciais ---
-        # Verifique se os nomes das colunas no seu Excel correspondem a estes
-        colunas_necessarias = ['id_pgto', 'id_rcbe', 'vl', 'dt_refe', 'ds_tran']
-        for col in colunas_necessarias:
-            if col not in df.columns:
-                st.error(f"Coluna '{col}' não encontrada na planilha de transações '{NOME_PLANILHA_TRANSACOES}'. Verifique seu arquivo Excel.")
-                return pd.DataFrame()
-
-        # Converte a coluna de data
-        df['dt_refe'] = pd.to_datetime(df['dt_refe'])
-        return df
-
+        # Verifique se os nomes das colunas no seu Excel correspondem a COLUNAS_TRANSACOES
+        st.error(f"Coluna '{e.args[0]}' não encontrada na planilha de transações '{NOME_PLANILHA_TRANSACOES}'. Verifique seu arquivo Excel.")
+        return pd.DataFrame()
     except FileNotFoundError:
         st.error(f"Arquivo Excel '{EXCEL_FILE_PATH}' não encontrado. Verifique o nome e se o arquivo está na pasta correta.")
         return pd.DataFrame()
@@ -74,4 +210,3 @@ def load_transacoes():
         else:
             st.error(f"Erro ao ler a planilha de transações: {e}")
         return pd.DataFrame()
-
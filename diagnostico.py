@@ -0,0 +1,70 @@
+# Página de diagnóstico (oculta): não faz parte da navegação do dashboard.
+# Para abrir, numa outra porta:
+#   streamlit run diagnostico.py --server.port 8502
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+from instrumentacao import CAMINHO_METRICAS, ler_metricas, resumo_etapas
+
+st.set_page_config(page_title="Diagnóstico do Pipeline", layout="wide")
+
+st.title("Diagnóstico: Tempo e Memória por Etapa")
+st.caption(f"Eventos lidos de '{CAMINHO_METRICAS}' (todas as sessões e jobs que gravam no mesmo log).")
+
+eventos = ler_metricas()
+if eventos.empty:
+    st.info("Ainda não há métricas gravadas. Abra as páginas do dashboard ou execute o pipeline para gerar eventos.")
+    st.stop()
+
+# --- Filtros ---
+col1, col2 = st.columns(2)
+with col1:
+    horas = st.selectbox("Período analisado:", [1, 6, 24, 24 * 7, None], index=2,
+                         format_func=lambda h: "Todo o log" if h is None else f"Últimas {h} horas")
+with col2:
+    busca = st.text_input("Filtrar etapas que contêm:", "")
+
+if horas is not None:
+    eventos = eventos[eventos['momento'] >= pd.Timestamp.now() - pd.Timedelta(hours=horas)]
+if busca:
+    eventos = eventos[eventos['etapa'].str.contains(busca, case=False, regex=False)]
+
+resumo = resumo_etapas(eventos)
+
+# --- KPIs ---
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Eventos", f"{len(eventos):,}")
+col2.metric("Etapas distintas", f"{len(resumo):,}")
+com_cache = eventos['cache'].isin(['hit', 'miss'])
+col3.metric("Taxa de acerto do cache", f"{(eventos.loc[com_cache, 'cache'] == 'hit').mean():.0%}" if com_cache.any() else "-")
+col4.metric("Maior memória residente", f"{eventos['rss_mb'].max():,.0f} MB" if eventos['rss_mb'].notna().any() else "-")
+
+st.markdown("---")
+
+# --- Etapas mais lentas ---
+st.subheader("Etapas Mais Lentas (tempo total no período)")
+fig = px.bar(resumo.head(15).iloc[::-1], x='total_s', y='etapa', orientation='h',
+             hover_data=['chamadas', 'media_s', 'p95_s', 'taxa_hit'],
+             labels={'total_s': 'Tempo total (s)', 'etapa': 'Etapa'})
+st.plotly_chart(fig, use_container_width=True)
+
+st.dataframe(resumo, column_config={
+    "total_s": st.column_config.NumberColumn("Total (s)", format="%.3f"),
+    "media_s": st.column_config.NumberColumn("Média (s)", format="%.4f"),
+    "p95_s": st.column_config.NumberColumn("p95 (s)", format="%.4f"),
+    "max_s": st.column_config.NumberColumn("Máximo (s)", format="%.4f"),
+    "taxa_hit": st.column_config.ProgressColumn("Acerto do cache", format="percent", min_value=0, max_value=1),
+    "rss_max_mb": st.column_config.NumberColumn("RSS máx. (MB)", format="%.0f"),
+}, use_container_width=True, hide_index=True)
+
+st.markdown("---")
+
+# --- Chamadas individuais ---
+st.subheader("Chamadas Mais Lentas")
+colunas = [c for c in ['momento', 'etapa', 'pai', 'segundos', 'linhas', 'cache', 'rss_mb', 'pid', 'erro'] if c in eventos.columns]
+st.dataframe(eventos.nlargest(50, 'segundos')[colunas], use_container_width=True, hide_index=True)
+
+erros = eventos[eventos['erro'].notna()] if 'erro' in eventos.columns else eventos.iloc[0:0]
+if not erros.empty:
+    st.subheader("Etapas com Erro")
+    st.dataframe(erros[colunas].sort_values('momento', ascending=False), use_container_width=True, hide_index=True)
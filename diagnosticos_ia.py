@@ -0,0 +1,198 @@
+import argparse
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+from consulta_ia import (SEM_CLIENTE, _completar_async, _pedido_informacao_empresas, _pedido_resumo_previsao,
+                         client_async, em_segundo_plano)
+from data_loader import CACHE_DIR
+from instrumentacao import marcar_cache, medir
+from previsao import MODELOS, consultar_previsao
+
+# --- CONFIGURAÇÃO DOS DIAGNÓSTICOS EM LOTE ---
+# Os diagnósticos de IA de todas as empresas são gerados offline e guardados
+# por (empresa, tipo) junto com a versão dos dados que os originou. As páginas
+# leem o texto pronto e só pedem à IA as entradas em falta ou desatualizadas.
+CAMINHO_DIAGNOSTICOS = os.path.join(CACHE_DIR, "diagnosticos_ia.sqlite")
+# Pedidos em simultâneo e limite de pedidos por minuto ao endpoint
+CONCORRENCIA = 8
+PEDIDOS_POR_MINUTO = 300
+# A recomendação de previsão é gerada para a seleção inicial da página 3
+HORIZONTE_DIAGNOSTICO = 6
+MODELO_DIAGNOSTICO = next(iter(MODELOS))
+# -----------------------------
+
+log = logging.getLogger(__name__)
+
+
+def tipo_previsao(modelo=MODELO_DIAGNOSTICO, horizonte=HORIZONTE_DIAGNOSTICO):
+    """A recomendação depende do modelo e do horizonte escolhidos, que entram no tipo."""
+    return f"previsao:{modelo}:{horizonte}"
+
+
+# --- ARMAZENAMENTO (SQLite) ---
+def _conectar(caminho=CAMINHO_DIAGNOSTICOS):
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    conexao = sqlite3.connect(caminho, timeout=10)
+    conexao.execute("PRAGMA journal_mode=WAL")
+    conexao.execute(
+        "CREATE TABLE IF NOT EXISTS diagnosticos ("
+        "id TEXT NOT NULL, tipo TEXT NOT NULL, versao TEXT NOT NULL, texto TEXT NOT NULL, gerado_em REAL NOT NULL, "
+        "PRIMARY KEY (id, tipo))"
+    )
+    return conexao
+
+
+def ler_diagnostico(empresa_id, tipo, versao, caminho=CAMINHO_DIAGNOSTICOS):
+    """Texto guardado para a empresa, ou None se não existir ou for de outra versão dos dados."""
+    with closing(_conectar(caminho)) as conexao, conexao:
+        linha = conexao.execute(
+            "SELECT texto FROM diagnosticos WHERE id = ? AND tipo = ? AND versao = ?", (str(empresa_id), tipo, versao)
+        ).fetchone()
+    return linha[0] if linha else None
+
+
+def gravar_diagnostico(empresa_id, tipo, versao, texto, caminho=CAMINHO_DIAGNOSTICOS):
+    with closing(_conectar(caminho)) as conexao, conexao:
+        conexao.execute("INSERT OR REPLACE INTO diagnosticos VALUES (?, ?, ?, ?, ?)",
+                        (str(empresa_id), tipo, versao, texto, time.time()))
+
+
+def empresas_atualizadas(tipo, versao, caminho=CAMINHO_DIAGNOSTICOS):
+    """Ids que já têm diagnóstico deste tipo para a versão atual."""
+    with closing(_conectar(caminho)) as conexao, conexao:
+        return {linha[0] for linha in conexao.execute(
+            "SELECT id FROM diagnosticos WHERE tipo = ? AND versao = ?", (tipo, versao))}
+
+
+# --- DIAGNÓSTICO DE UMA EMPRESA ---
+async def obter_diagnostico_async(empresa_id, tipo, versao, pedido, caminho=CAMINHO_DIAGNOSTICOS):
+    """
+    Diagnóstico pré-gerado, se estiver atualizado; senão pede-o à IA e guarda
+    o texto novo no lugar do antigo. Usado pelas páginas via em_segundo_plano.
+    """
+    with medir("ia.diagnostico", tipo=tipo):
+        texto = await asyncio.to_thread(ler_diagnostico, empresa_id, tipo, versao, caminho)
+        marcar_cache("miss" if texto is None else "hit")
+        if texto is not None:
+            return texto
+        if not client_async:
+            return SEM_CLIENTE
+        try:
+            texto = await _completar_async(**pedido)
+        except Exception as e:
+            return f"Ocorreu um erro ao comunicar com a IA: {e}"
+        await asyncio.to_thread(gravar_diagnostico, empresa_id, tipo, versao, texto, caminho)
+    return texto
+
+
+def pedido_momento(artefatos, empresa_id):
+    perfil_empresa = artefatos["indices"]["perfil"].primeira(empresa_id)
+    media_setor = artefatos["benchmark"][('ds_cnae', perfil_empresa['ds_cnae'])]['media']
+    return _pedido_informacao_empresas(perfil_empresa, media_setor)
+
+
+def pedido_previsao(artefatos, empresa_id, modelo=MODELO_DIAGNOSTICO, horizonte=HORIZONTE_DIAGNOSTICO):
+    hist_id = artefatos["indices"]["base"].linhas(empresa_id).sort_values("ano_mes")
+    df_previsao = consultar_previsao(artefatos["previsoes"], empresa_id, horizonte, modelo)[['ano_mes', 'receita', 'despesa', 'fluxo_liq']]
+    return _pedido_resumo_previsao(hist_id, df_previsao)
+
+
+# --- GERAÇÃO EM LOTE ---
+class LimitadorTaxa:
+    """Espaça o início dos pedidos para não passar de pedidos_por_minuto (0 = sem limite)."""
+
+    def __init__(self, pedidos_por_minuto):
+        self.intervalo = 60.0 / pedidos_por_minuto if pedidos_por_minuto else 0.0
+        self.proximo = 0.0
+        self.trava = asyncio.Lock()
+
+    async def aguardar(self):
+        async with self.trava:
+            agora = time.monotonic()
+            espera = self.proximo - agora
+            self.proximo = max(agora, self.proximo) + self.intervalo
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+
+async def _gerar_lote(tarefas, versao, concorrencia, pedidos_por_minuto, caminho):
+    """
+    tarefas: lista de (empresa_id, tipo, funcao_pedido). Cada resposta é gravada
+    assim que chega, por isso um lote interrompido continua de onde parou.
+    """
+    semaforo = asyncio.Semaphore(concorrencia)
+    limitador = LimitadorTaxa(pedidos_por_minuto)
+    contagem = {'gerados': 0, 'erros': 0}
+
+    async def gerar(empresa_id, tipo, funcao_pedido):
+        async with semaforo:
+            await limitador.aguardar()
+            try:
+                texto = await _completar_async(**funcao_pedido())
+            except Exception as e:
+                contagem['erros'] += 1
+                log.warning("%s %s: erro (%s)", tipo, empresa_id, e)
+                return
+            await asyncio.to_thread(gravar_diagnostico, empresa_id, tipo, versao, texto, caminho)
+            contagem['gerados'] += 1
+            if contagem['gerados'] % 100 == 0:
+                log.info("%d/%d diagnósticos gerados", contagem['gerados'], len(tarefas))
+
+    await asyncio.gather(*(gerar(*tarefa) for tarefa in tarefas))
+    return contagem
+
+
+def gerar_diagnosticos(artefatos, tipos=("momento", "previsao"), concorrencia=CONCORRENCIA,
+                       pedidos_por_minuto=PEDIDOS_POR_MINUTO, forcar=False, limite=None,
+                       caminho=CAMINHO_DIAGNOSTICOS):
+    """
+    Gera os diagnósticos de todas as empresas do perfil que ainda não têm um
+    para a versão atual dos dados (todas, com forcar). Devolve as contagens.
+    """
+    if not client_async:
+        raise RuntimeError(SEM_CLIENTE)
+    versao = artefatos["manifesto"]["versao"]
+    ids = list(artefatos["indices"]["perfil"].ids)[:limite]
+
+    funcoes = {
+        "momento": pedido_momento,
+        tipo_previsao(): pedido_previsao,
+    }
+    tarefas = []
+    for nome in tipos:
+        tipo = tipo_previsao() if nome == "previsao" else nome
+        prontas = set() if forcar else empresas_atualizadas(tipo, versao, caminho)
+        # O pedido só é montado quando a tarefa começa, para não ter todos os prompts em memória
+        tarefas += [(i, tipo, lambda i=i, f=funcoes[tipo]: f(artefatos, i)) for i in ids if str(i) not in prontas]
+
+    contagem = {'atualizados': len(ids) * len(tipos) - len(tarefas)}
+    if tarefas:
+        # Corre no mesmo loop de eventos do cliente assíncrono da IA
+        contagem.update(em_segundo_plano(_gerar_lote(tarefas, versao, concorrencia, pedidos_por_minuto, caminho)).result())
+    return contagem
+
+
+# --- Execução como job em lote ---
+# O endpoint vem de OPENAI_BASE_URL (pode ser um servidor local compatível com a OpenAI).
+if __name__ == "__main__":
+    from pipeline import carregar_artefatos
+
+    parser = argparse.ArgumentParser(description="Gera offline os diagnósticos de IA de todas as empresas do portfólio.")
+    parser.add_argument("--tipos", nargs="+", choices=["momento", "previsao"], default=["momento", "previsao"])
+    parser.add_argument("--concorrencia", type=int, default=CONCORRENCIA, help="pedidos em simultâneo")
+    parser.add_argument("--pedidos-por-minuto", type=int, default=PEDIDOS_POR_MINUTO, help="0 = sem limite")
+    parser.add_argument("--forcar", action="store_true", help="regera também os diagnósticos já atualizados")
+    parser.add_argument("--limite", type=int, default=None, help="só as primeiras N empresas")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    log.info("A carregar os artefatos do pipeline...")
+    artefatos = carregar_artefatos()
+    inicio = time.perf_counter()
+    contagem = gerar_diagnosticos(artefatos, args.tipos, args.concorrencia, args.pedidos_por_minuto, args.forcar, args.limite)
+    log.info("%s em %.1fs (versão %s, '%s').", contagem, time.perf_counter() - inicio,
+             artefatos['manifesto']['versao'], CAMINHO_DIAGNOSTICOS)
@@ -0,0 +1,195 @@
+import numpy as np
+import pandas as pd
+
+from transacoes_compactas import ids_presentes, posicoes_em
+
+
+# --- INTERFACE DOS BACKENDS DE GRAFO ---
+# A página de Cadeia de Valor faz sempre as mesmas consultas sobre a rede de
+# pagamentos (pagador → recebedor). Qualquer backend que implemente estes
+# métodos, com os mesmos formatos de retorno, pode ser usado pela página.
+class BackendGrafo:
+    """
+    Interface comum dos backends de grafo.
+
+    - get_lista_empresas(): lista ordenada dos ids;
+    - get_top_conexoes(limite): DataFrame pagador, recebedor, valor_total;
+    - get_dependencias_criticas_geral(limiar_percentual): DataFrame
+      empresa_dependente, cliente_chave, dependencia (em %), top 10;
+    - get_relacoes_individuais(empresa_id): (clientes, fornecedores), com as
+      colunas cliente/fornecedor, valor e dependencia_% (top 5 de cada);
+    - get_risco_em_cascata(top_cliente_id): Series cliente, dependencia ou None;
+    - get_vizinhanca(empresa_id): {'foco', 'clientes', 'fornecedores'}, com
+      listas de {'id': ..., 'rel': {'valor': ..., 'n_transacoes': ...}}.
+    """
+    nome = None
+
+    def get_lista_empresas(self):
+        raise NotImplementedError
+
+    def get_top_conexoes(self, limite):
+        raise NotImplementedError
+
+    def get_dependencias_criticas_geral(self, limiar_percentual):
+        raise NotImplementedError
+
+    def get_relacoes_individuais(self, empresa_id):
+        raise NotImplementedError
+
+    def get_risco_em_cascata(self, top_cliente_id):
+        raise NotImplementedError
+
+    def get_vizinhanca(self, empresa_id):
+        raise NotImplementedError
+
+
+def _top_dependencias(ids, valores, total, coluna_id, n):
+    """Tabela das n relações com maior fatia do total (dependencia_% em %)."""
+    df = pd.DataFrame({coluna_id: ids, 'valor': valores})
+    if df.empty:
+        return pd.DataFrame(columns=[coluna_id, 'valor', 'dependencia_%'])
+    df['dependencia_%'] = (df['valor'] / total * 100) if total > 0 else 0
+    return df.sort_values('dependencia_%', ascending=False).head(n)
+
+
+class GrafoLocal(BackendGrafo):
+    """
+    Grafo de pagamentos em memória, construído a partir do DataFrame de
+    transações, sem banco de dados.
+
+    As transações são agregadas uma vez por par (pagador, recebedor) com
+    SUM(vl) e guardadas em CSR (compressed sparse row) nas duas direções:
+    - saída: para cada empresa, os recebedores e valores em
+      out_destinos[out_ptr[i]:out_ptr[i+1]];
+    - entrada: para cada empresa, os pagadores e valores em
+      in_origens[in_ptr[i]:in_ptr[i+1]].
+    Clientes, fornecedores e dependências de uma empresa são fatias destes
+    vetores, sem varrer as transações.
+    """
+    nome = "local"
+
+    def __init__(self, transacoes, empresas=None):
+        if empresas is not None and not empresas.empty:
+            # Como no Neo4j: os nós são as empresas cadastradas e só entram as
+            # transações com pagador e recebedor conhecidos
+            self.ids = pd.Index(pd.unique(empresas['id'])).sort_values()
+        else:
+            self.ids = ids_presentes(transacoes['id_pgto']).union(ids_presentes(transacoes['id_rcbe'])).sort_values()
+        n = len(self.ids)
+
+        # Os ids são procurados no dicionário das colunas, não linha a linha
+        pagadores = posicoes_em(transacoes['id_pgto'], self.ids)
+        recebedores = posicoes_em(transacoes['id_rcbe'], self.ids)
+        conhecidas = (pagadores >= 0) & (recebedores >= 0)
+        pagadores, recebedores = pagadores[conhecidas].astype(np.int64), recebedores[conhecidas].astype(np.int64)
+        valores = transacoes['vl'].to_numpy(dtype='float64')[conhecidas]
+
+        # Agregação por par: chave única pagador * n + recebedor, já ordenada
+        pares, inverso = np.unique(pagadores * n + recebedores, return_inverse=True)
+        self.par_valor = np.bincount(inverso, weights=valores, minlength=len(pares))
+        self.par_n_transacoes = np.bincount(inverso, minlength=len(pares))
+        self.par_pagador, self.par_recebedor = pares // max(n, 1), pares % max(n, 1)
+
+        # CSR de saída: os pares já estão ordenados por pagador
+        self.out_ptr = np.concatenate([[0], np.cumsum(np.bincount(self.par_pagador, minlength=n))])
+        self.out_destinos = self.par_recebedor
+        self.out_valores = self.par_valor
+        self.out_n_transacoes = self.par_n_transacoes
+
+        # CSR de entrada: mesma lista de pares reordenada por recebedor
+        ordem = np.argsort(self.par_recebedor, kind='stable')
+        self.in_ptr = np.concatenate([[0], np.cumsum(np.bincount(self.par_recebedor, minlength=n))])
+        self.in_origens = self.par_pagador[ordem]
+        self.in_valores = self.par_valor[ordem]
+        self.in_n_transacoes = self.par_n_transacoes[ordem]
+
+        self.receita_total = np.bincount(self.par_recebedor, weights=self.par_valor, minlength=n)
+        self.despesa_total = np.bincount(self.par_pagador, weights=self.par_valor, minlength=n)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _posicao(self, empresa_id):
+        posicao = self.ids.get_indexer([empresa_id])[0]
+        return None if posicao < 0 else posicao
+
+    def _entrada(self, posicao):
+        inicio, fim = self.in_ptr[posicao], self.in_ptr[posicao + 1]
+        return self.in_origens[inicio:fim], self.in_valores[inicio:fim]
+
+    def _saida(self, posicao):
+        inicio, fim = self.out_ptr[posicao], self.out_ptr[posicao + 1]
+        return self.out_destinos[inicio:fim], self.out_valores[inicio:fim]
+
+    # --- As cinco consultas da página ---
+    def get_lista_empresas(self):
+        return self.ids.tolist()
+
+    def get_top_conexoes(self, limite):
+        limite = min(limite, len(self.par_valor))
+        if limite <= 0:
+            return pd.DataFrame(columns=['pagador', 'recebedor', 'valor_total'])
+        topo = np.argpartition(-self.par_valor, limite - 1)[:limite]
+        topo = topo[np.argsort(-self.par_valor[topo], kind='stable')]
+        return pd.DataFrame({
+            'pagador': self.ids[self.par_pagador[topo]],
+            'recebedor': self.ids[self.par_recebedor[topo]],
+            'valor_total': self.par_valor[topo],
+        })
+
+    def get_dependencias_criticas_geral(self, limiar_percentual, limite=10):
+        receita = self.receita_total[self.par_recebedor]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fatia = self.par_valor / receita
+        criticas = np.flatnonzero((receita > 0) & (fatia >= limiar_percentual))
+        criticas = criticas[np.argsort(-fatia[criticas], kind='stable')[:limite]]
+        return pd.DataFrame({
+            'empresa_dependente': self.ids[self.par_recebedor[criticas]],
+            'cliente_chave': self.ids[self.par_pagador[criticas]],
+            'dependencia': fatia[criticas] * 100,
+        })
+
+    def get_relacoes_individuais(self, empresa_id):
+        posicao = self._posicao(empresa_id)
+        if posicao is None:
+            return _top_dependencias([], [], 0, 'cliente', 5), _top_dependencias([], [], 0, 'fornecedor', 5)
+        origens, valores_in = self._entrada(posicao)
+        destinos, valores_out = self._saida(posicao)
+        df_clientes = _top_dependencias(self.ids[origens], valores_in, self.receita_total[posicao], 'cliente', 5)
+        df_fornecedores = _top_dependencias(self.ids[destinos], valores_out, self.despesa_total[posicao], 'fornecedor', 5)
+        return df_clientes, df_fornecedores
+
+    def get_risco_em_cascata(self, top_cliente_id):
+        if not top_cliente_id:
+            return None
+        posicao = self._posicao(top_cliente_id)
+        if posicao is None:
+            return None
+        origens, valores = self._entrada(posicao)
+        if len(origens) == 0:
+            return None
+        maior = np.argmax(valores)
+        return pd.Series({
+            'cliente': self.ids[origens[maior]],
+            'dependencia': valores[maior] / self.receita_total[posicao] * 100,
+        })
+
+    def get_vizinhanca(self, empresa_id):
+        posicao = self._posicao(empresa_id)
+        if posicao is None:
+            return {'foco': empresa_id, 'clientes': [], 'fornecedores': []}
+        origens, valores_in = self._entrada(posicao)
+        destinos, valores_out = self._saida(posicao)
+        inicio_in, fim_in = self.in_ptr[posicao], self.in_ptr[posicao + 1]
+        inicio_out, fim_out = self.out_ptr[posicao], self.out_ptr[posicao + 1]
+        return {
+            'foco': empresa_id,
+            'clientes': [
+                {'id': i, 'rel': {'valor': float(v), 'n_transacoes': int(n)}}
+                for i, v, n in zip(self.ids[origens], valores_in, self.in_n_transacoes[inicio_in:fim_in])
+            ],
+            'fornecedores': [
+                {'id': i, 'rel': {'valor': float(v), 'n_transacoes': int(n)}}
+                for i, v, n in zip(self.ids[destinos], valores_out, self.out_n_transacoes[inicio_out:fim_out])
+            ],
+        }
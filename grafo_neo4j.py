@@ -0,0 +1,142 @@
+import pandas as pd
+import streamlit as st
+from neo4j import GraphDatabase
+
+from grafo_local import BackendGrafo
+from instrumentacao import instrumentar, marcar_cache
+
+# --- CONFIGURAÇÕES ---
+URI = "bolt://localhost:7687"
+AUTH = ("neo4j", "Billiedani1!") # Verifique se esta é a sua palavra-passe correta
+
+
+# --- Funções de Consulta ao Neo4j ---
+# As consultas leem as relações :PAGOU_PARA_TOTAL (uma por par pagador →
+# recebedor, com valor_total já somado na ingestão) em vez de somar as
+# :PAGOU_PARA de cada transação a cada consulta. Cada chamada fica no log de
+# métricas; o corpo só corre quando o st.cache_data não tem o resultado (miss).
+@instrumentar("neo4j.get_lista_empresas", em_cache=True)
+@st.cache_data
+def get_lista_empresas(_driver):
+    marcar_cache("miss")
+    with _driver.session(database="neo4j") as session:
+        result = session.run("MATCH (e:Empresa) RETURN e.id AS id ORDER BY id")
+        return [record["id"] for record in result]
+
+@instrumentar("neo4j.get_top_conexoes", em_cache=True)
+@st.cache_data
+def get_top_conexoes(_driver, limite):
+    marcar_cache("miss")
+    query = """
+    MATCH (p:Empresa)-[r:PAGOU_PARA_TOTAL]->(c:Empresa)
+    RETURN p.id AS pagador, c.id AS recebedor, r.valor_total AS valor_total
+    ORDER BY valor_total DESC LIMIT $limite
+    """
+    with _driver.session(database="neo4j") as session:
+        return pd.DataFrame(session.read_transaction(lambda tx: tx.run(query, limite=limite).data()))
+
+@instrumentar("neo4j.get_dependencias_criticas_geral", em_cache=True)
+@st.cache_data
+def get_dependencias_criticas_geral(_driver, limiar_percentual):
+    marcar_cache("miss")
+    query = """
+    MATCH (e:Empresa)<-[r:PAGOU_PARA_TOTAL]-(c:Empresa)
+    WITH e, SUM(r.valor_total) AS receitaTotal
+    MATCH (e)<-[r_ind:PAGOU_PARA_TOTAL]-(c_ind:Empresa)
+    WITH e, receitaTotal, c_ind, r_ind.valor_total AS valor_individual
+    WHERE receitaTotal > 0 AND (valor_individual / receitaTotal) >= $limiar
+    RETURN e.id AS empresa_dependente, c_ind.id AS cliente_chave, (valor_individual / receitaTotal) * 100 AS dependencia
+    ORDER BY dependencia DESC LIMIT 10
+    """
+    with _driver.session(database="neo4j") as session:
+        return pd.DataFrame(session.read_transaction(lambda tx: tx.run(query, limiar=limiar_percentual).data()))
+
+@instrumentar("neo4j.get_relacoes_individuais", em_cache=True)
+@st.cache_data
+def get_relacoes_individuais(_driver, empresa_id):
+    marcar_cache("miss")
+    query = """
+    MATCH (empresa:Empresa {id: $empresa_id})
+    OPTIONAL MATCH (cliente:Empresa)-[r:PAGOU_PARA_TOTAL]->(empresa)
+    WITH empresa, cliente.id AS cliente_id, SUM(r.valor_total) AS valor_cliente
+    WITH empresa, COLLECT({cliente: cliente_id, valor: valor_cliente}) AS clientes_data
+    OPTIONAL MATCH (empresa)-[s:PAGOU_PARA_TOTAL]->(fornecedor:Empresa)
+    WITH empresa, clientes_data, fornecedor.id AS fornecedor_id, SUM(s.valor_total) AS valor_fornecedor
+    RETURN clientes_data, COLLECT({fornecedor: fornecedor_id, valor: valor_fornecedor}) AS fornecedores_data
+    """
+    with _driver.session(database="neo4j") as session:
+        result = session.read_transaction(lambda tx: tx.run(query, empresa_id=empresa_id).single())
+
+        clientes = [d for d in result['clientes_data'] if d['cliente'] is not None]
+        df_clientes = pd.DataFrame(clientes)
+        if not df_clientes.empty:
+            total_receita = df_clientes['valor'].sum()
+            df_clientes['dependencia_%'] = (df_clientes['valor'] / total_receita * 100) if total_receita > 0 else 0
+            df_clientes = df_clientes.sort_values('dependencia_%', ascending=False).head(5)
+
+        fornecedores = [d for d in result['fornecedores_data'] if d['fornecedor'] is not None]
+        df_fornecedores = pd.DataFrame(fornecedores)
+        if not df_fornecedores.empty:
+            total_despesa = df_fornecedores['valor'].sum()
+            df_fornecedores['dependencia_%'] = (df_fornecedores['valor'] / total_despesa * 100) if total_despesa > 0 else 0
+            df_fornecedores = df_fornecedores.sort_values('dependencia_%', ascending=False).head(5)
+
+        return df_clientes, df_fornecedores
+
+@instrumentar("neo4j.get_risco_em_cascata", em_cache=True)
+@st.cache_data
+def get_risco_em_cascata(_driver, top_cliente_id):
+    if not top_cliente_id: return None
+    marcar_cache("miss")
+    query = """
+    MATCH (cliente_foco:Empresa {id: $top_cliente_id})<-[r:PAGOU_PARA_TOTAL]-(cliente_do_cliente:Empresa)
+    WITH cliente_foco, SUM(r.valor_total) AS receitaTotal
+    MATCH (cliente_foco)<-[r_ind:PAGOU_PARA_TOTAL]-(cdc_ind:Empresa)
+    WITH receitaTotal, cdc_ind, r_ind.valor_total AS valor_individual
+    RETURN cdc_ind.id AS cliente, (valor_individual / receitaTotal) * 100 AS dependencia
+    ORDER BY dependencia DESC LIMIT 1
+    """
+    with _driver.session(database="neo4j") as session:
+        result = session.read_transaction(lambda tx: tx.run(query, top_cliente_id=top_cliente_id).single())
+        return pd.Series(result) if result else None
+
+@instrumentar("neo4j.get_vizinhanca", em_cache=True)
+@st.cache_data
+def get_vizinhanca(_driver, empresa_id):
+    marcar_cache("miss")
+    query = """
+    MATCH (foco:Empresa {id: $empresa_id})
+    OPTIONAL MATCH (foco)<-[r_in:PAGOU_PARA_TOTAL]-(cliente:Empresa)
+    OPTIONAL MATCH (foco)-[r_out:PAGOU_PARA_TOTAL]->(fornecedor:Empresa)
+    RETURN foco, COLLECT(DISTINCT {id: cliente.id, rel: {valor: r_in.valor_total, n_transacoes: r_in.n_transacoes}}) AS clientes,
+           COLLECT(DISTINCT {id: fornecedor.id, rel: {valor: r_out.valor_total, n_transacoes: r_out.n_transacoes}}) AS fornecedores
+    """
+    with _driver.session(database="neo4j") as session:
+        return session.read_transaction(lambda tx: tx.run(query, empresa_id=empresa_id).single())
+
+
+class GrafoNeo4j(BackendGrafo):
+    """Backend que envia cada consulta em Cypher para o Neo4j (resultados em st.cache_data)."""
+    nome = "neo4j"
+
+    def __init__(self, uri=URI, auth=AUTH):
+        self.driver = GraphDatabase.driver(uri, auth=auth)
+        self.driver.verify_connectivity()
+
+    def get_lista_empresas(self):
+        return get_lista_empresas(self.driver)
+
+    def get_top_conexoes(self, limite):
+        return get_top_conexoes(self.driver, limite)
+
+    def get_dependencias_criticas_geral(self, limiar_percentual):
+        return get_dependencias_criticas_geral(self.driver, limiar_percentual)
+
+    def get_relacoes_individuais(self, empresa_id):
+        return get_relacoes_individuais(self.driver, empresa_id)
+
+    def get_risco_em_cascata(self, top_cliente_id):
+        return get_risco_em_cascata(self.driver, top_cliente_id)
+
+    def get_vizinhanca(self, empresa_id):
+        return get_vizinhanca(self.driver, empresa_id)
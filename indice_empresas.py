@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+
+class IndiceEmpresas:
+    """
+    Índice construído uma única vez sobre um DataFrame para buscar as linhas
+    de uma empresa sem varrer a tabela inteira a cada rerun.
+
+    As linhas são agrupadas por empresa através de uma permutação estável
+    (argsort) e de um vetor de offsets: o id é convertido em posição por
+    hash (O(1)) e as linhas da empresa são o trecho ordem[inicio:fim].
+    O DataFrame original não é copiado nem reordenado; quando ele já está
+    ordenado pelo id, a busca devolve uma fatia contígua.
+    """
+
+    def __init__(self, df, coluna_id='id'):
+        self.df = df
+        self.coluna_id = coluna_id
+        codigos, ids = pd.factorize(df[coluna_id], sort=True)
+        self._ids = pd.Index(ids)
+        self._offsets = np.concatenate([[0], np.cumsum(np.bincount(codigos, minlength=len(ids)))])
+        ordem = np.argsort(codigos, kind='stable')
+        # Se o DataFrame já está agrupado por id, dispensa a permutação
+        self._ordem = None if np.array_equal(ordem, np.arange(len(ordem))) else ordem
+
+    @property
+    def ids(self):
+        """Ids indexados, em ordem crescente."""
+        return self._ids
+
+    def __contains__(self, empresa_id):
+        return empresa_id in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def linhas(self, empresa_id):
+        """Linhas da empresa, na ordem em que aparecem no DataFrame original."""
+        if empresa_id not in self._ids:
+            return self.df.iloc[0:0]
+        posicao = self._ids.get_loc(empresa_id)
+        inicio, fim = self._offsets[posicao], self._offsets[posicao + 1]
+        if self._ordem is None:
+            return self.df.iloc[inicio:fim]
+        return self.df.iloc[self._ordem[inicio:fim]]
+
+    def primeira(self, empresa_id):
+        """Primeira linha da empresa como Series (útil em tabelas com uma linha por id)."""
+        return self.linhas(empresa_id).iloc[0]
@@ -1,17 +1,41 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 from neo4j import GraphDatabase
 import pandas as pd
+from data_loader import (CACHE_DIR, EXCEL_FILE_PATH, NOME_PLANILHA_EMPRESAS, NOME_PLANILHA_TRANSACOES,
+                         _gravar_atomico, iterar_transacoes, ler_planilha, versao_workbook)
+from transacoes_compactas import ids_em_texto
 
 # --- 1. CONFIGURAÇÕES DE CONEXÃO ---
-# Altere com as informações do seu banco de dados Neo4j
-URI = "neo4j://127.0.0.1:7687"
-AUTH = ("neo4j", "Billiedani1!") # Substitua "password" pela sua palavra-passe
+# Altere com as informações do seu banco de dados Neo4j (ou use as variáveis
+# de ambiente NEO4J_URI, NEO4J_USER e NEO4J_PASSWORD).
+# Para testar com um Neo4j local em container:
+#   docker run --rm -p 7474:7474 -p 7687:7687 -e NEO4J_AUTH=neo4j/senha-de-teste neo4j:5
+#   NEO4J_PASSWORD=senha-de-teste python ingest_to_neo4j.py --sessoes 4
+URI = os.getenv("NEO4J_URI", "neo4j://127.0.0.1:7687")
+AUTH = (os.getenv("NEO4J_USER", "neo4j"), os.getenv("NEO4J_PASSWORD", "Billiedani1!")) # Substitua "password" pela sua palavra-passe
 
 # --- 2. CAMINHO DO SEU ARQUIVO DE DADOS ---
-# --- AQUI ESTÁ A CORREÇÃO ---
-# Removemos "data/" para que o script procure o ficheiro na pasta principal.
-EXCEL_FILE_PATH = "Challenge FIAP - Bases.xlsx"
-NOME_PLANILHA_EMPRESAS = "Base 1 - ID"
-NOME_PLANILHA_TRANSACOES = "Base 2 - Transações"
+# O caminho e os nomes das planilhas vêm do data_loader, que lê o Excel
+# através do mesmo cache em Parquet usado pelo dashboard. Para bases grandes,
+# as transações podem vir de um CSV/Parquet lido em blocos (--transacoes).
+
+# --- 3. CARGA EM LOTES ---
+# Cada lote é uma transação própria no Neo4j; o progresso fica gravado no
+# checkpoint e uma carga interrompida continua a partir dos lotes que faltam.
+TAMANHO_LOTE = 10_000
+N_SESSOES = 4
+CAMINHO_CHECKPOINT = os.path.join(CACHE_DIR, "ingestao_neo4j.json")
+
+# --- 4. RELAÇÕES AGREGADAS ---
+# Além de uma :PAGOU_PARA por transação, a carga mantém uma :PAGOU_PARA_TOTAL
+# por par (pagador, recebedor), que é o que o dashboard consulta. Com
+# POR_MES_E_TIPO, mantém também uma :PAGOU_PARA_MES por par, mês e ds_tran.
+POR_MES_E_TIPO = False
 
 def criar_constraints(tx):
     """
@@ -19,6 +43,8 @@ def criar_constraints(tx):
     empresas com o mesmo ID. Isto é crucial para a performance e integridade.
     """
     tx.run("CREATE CONSTRAINT unique_empresa_id IF NOT EXISTS FOR (e:Empresa) REQUIRE e.id IS UNIQUE")
+    # Índice da chave das relações de pagamento, procurada em cada MERGE de carregar_transacoes
+    tx.run("CREATE INDEX pagou_para_chave IF NOT EXISTS FOR ()-[t:PAGOU_PARA]-() ON (t.chave)")
 
 def carregar_empresas(tx, empresas_records):
     """
@@ -34,60 +60,298 @@ def carregar_empresas(tx, empresas_records):
     """
     tx.run(query, rows=empresas_records)
 
-def carregar_transacoes(tx, transacoes_records):
+def carregar_transacoes(tx, transacoes_records, por_mes_e_tipo=False):
     """
     Cria as RELAÇÕES (as setas) de pagamento entre as empresas.
     A query primeiro encontra o pagador e o recebedor e depois cria a relação :PAGOU_PARA.
+    Cada relação leva uma chave tirada do conteúdo da transação (ver
+    _preparar_transacoes) e é criada com MERGE, para que reenviar um lote (ao
+    retomar uma carga ou numa carga --incremental) não duplique pagamentos.
+    Na mesma transação, as relações agregadas são atualizadas só com os
+    pagamentos que acabaram de ser criados.
     """
     query = """
     UNWIND $rows AS row
     MATCH (pagador:Empresa {id: row.id_pgto})
     MATCH (recebedor:Empresa {id: row.id_rcbe})
-    CREATE (pagador)-[t:PAGOU_PARA {
-        valor: toFloat(row.vl),
-        tipo: row.ds_tran,
-        data: date(row.dt_refe)
-    }]->(recebedor)
+    MERGE (pagador)-[t:PAGOU_PARA {chave: row.chave}]->(recebedor)
+    ON CREATE SET t.valor = toFloat(row.vl),
+                  t.tipo = row.ds_tran,
+                  t.data = date(row.dt_refe),
+                  t._novo = true
+    WITH t WHERE t._novo
+    REMOVE t._novo
+    RETURN t.chave AS chave
+    """
+    novas = {registro["chave"] for registro in tx.run(query, rows=transacoes_records)}
+    if not novas:
+        return
+    df = pd.DataFrame(transacoes_records)
+    df = df[df['chave'].isin(novas)]
+    atualizar_agregados(tx, df)
+    if por_mes_e_tipo:
+        atualizar_agregados(tx, df.assign(ano_mes=df['dt_refe'].str[:7]), por_mes_e_tipo=True)
+
+def atualizar_agregados(tx, df, por_mes_e_tipo=False):
+    """
+    Soma as transações novas às relações agregadas por par (pagador, recebedor):
+    :PAGOU_PARA_TOTAL ou, com por_mes_e_tipo=True, :PAGOU_PARA_MES (uma por
+    ano_mes e tipo). Cada relação guarda valor_total, n_transacoes,
+    primeira_data e ultima_data, e é atualizada de forma incremental.
+    """
+    chaves = ['id_pgto', 'id_rcbe', 'ano_mes', 'ds_tran'] if por_mes_e_tipo else ['id_pgto', 'id_rcbe']
+    agregados = df.groupby(chaves, as_index=False).agg(
+        valor_total=('vl', 'sum'),
+        n_transacoes=('vl', 'size'),
+        primeira_data=('dt_refe', 'min'),
+        ultima_data=('dt_refe', 'max'),
+    ).to_dict('records')
+
+    relacao = "PAGOU_PARA_MES {ano_mes: row.ano_mes, tipo: row.ds_tran}" if por_mes_e_tipo else "PAGOU_PARA_TOTAL"
+    # SET a._lock antes de ler os totais: obriga o Neo4j a bloquear a relação,
+    # para que sessões paralelas não percam somas umas das outras
+    query = f"""
+    UNWIND $rows AS row
+    MATCH (pagador:Empresa {{id: row.id_pgto}})
+    MATCH (recebedor:Empresa {{id: row.id_rcbe}})
+    MERGE (pagador)-[a:{relacao}]->(recebedor)
+    ON CREATE SET a.valor_total = 0.0, a.n_transacoes = 0
+    SET a._lock = true
+    SET a.valor_total = a.valor_total + row.valor_total,
+        a.n_transacoes = a.n_transacoes + row.n_transacoes,
+        a.primeira_data = CASE WHEN a.primeira_data IS NULL OR date(row.primeira_data) < a.primeira_data
+                               THEN date(row.primeira_data) ELSE a.primeira_data END,
+        a.ultima_data = CASE WHEN a.ultima_data IS NULL OR date(row.ultima_data) > a.ultima_data
+                             THEN date(row.ultima_data) ELSE a.ultima_data END
+    REMOVE a._lock
+    """
+    tx.run(query, rows=agregados)
+
+# --- Preparação dos lotes ---
+def _preparar_empresas(df):
+    """
+    Formata um bloco de empresas para o Neo4j (IDs em texto, ver
+    transacoes_compactas.ids_em_texto, e datas YYYY-MM-DD). Linhas sem id
+    ficam de fora.
+    """
+    return pd.DataFrame({
+        'id': ids_em_texto(df['id']),
+        'dt_abrt': pd.to_datetime(df['dt_abrt']).dt.strftime('%Y-%m-%d').to_numpy(),
+        'vl_sldo': df['vl_sldo'].to_numpy(),
+        'ds_cnae': df['ds_cnae'].astype(str).to_numpy(),
+    }).dropna(subset=['id']).to_dict('records')
+
+def _preparar_transacoes(df, ocorrencias):
     """
-    tx.run(query, rows=transacoes_records)
+    Formata um bloco de transações (ids como em _preparar_empresas; linhas
+    sem pagador ou recebedor ficam de fora). A chave de cada transação vem
+    do seu conteúdo (hash de id_pgto, id_rcbe, dt_refe, vl em centavos e
+    ds_tran) mais o número de vezes que o mesmo conteúdo já apareceu no
+    arquivo, para que pagamentos repetidos no mesmo dia continuem distintos.
+    Assim a chave não depende da posição da linha: uma carga --incremental
+    com linhas já enviadas cai nas mesmas chaves e não soma de novo aos
+    agregados. Por isso a carga --incremental recebe o arquivo acumulado
+    (todas as transações até agora), não só as novas: num arquivo só com as
+    novas, um pagamento igual a outro já carregado (mesmo pagador, recebedor,
+    dia, valor e tipo) receberia a chave do primeiro e ficaria de fora.
+
+    ocorrencias: dicionário {hash: vezes já visto}, partilhado pelos blocos
+    do mesmo arquivo (na ordem do arquivo) e atualizado aqui.
+    """
+    registros = pd.DataFrame({
+        'id_pgto': ids_em_texto(df['id_pgto']),
+        'id_rcbe': ids_em_texto(df['id_rcbe']),
+        'vl': df['vl'].astype('float64').to_numpy(),
+        'ds_tran': df['ds_tran'].astype(str).to_numpy(),
+        'dt_refe': pd.to_datetime(df['dt_refe']).dt.strftime('%Y-%m-%d').to_numpy(),
+    }).dropna(subset=['id_pgto', 'id_rcbe'])
+    conteudo = registros.assign(vl=registros['vl'].mul(100).round().astype('int64'))
+    hashes = pd.Series(pd.util.hash_pandas_object(conteudo, index=False).to_numpy())
+    ocorrencia = hashes.map(ocorrencias).fillna(0).astype('int64') + hashes.groupby(hashes).cumcount()
+    ocorrencias.update((ocorrencia + 1).groupby(hashes).max().to_dict())
+
+    registros.insert(0, 'chave', [f"{h:016x}:{n}" for h, n in zip(hashes.to_numpy(), ocorrencia.to_numpy())])
+    return registros.to_dict('records')
+
+def gerar_lotes(blocos, preparar):
+    """
+    Gera (número do lote, registros) a partir de blocos de DataFrame. Só o
+    lote corrente é convertido em dicionários, o que limita a memória usada.
+    """
+    for numero, bloco in enumerate(blocos):
+        yield numero, preparar(bloco)
+
+def _fatias(df, tamanho_lote):
+    for inicio in range(0, len(df), tamanho_lote):
+        yield df.iloc[inicio:inicio + tamanho_lote]
+
+# --- Checkpoint ---
+def _ler_checkpoint(caminho, versao, tamanho_lote):
+    """Estado gravado da carga, se for da mesma versão dos dados e do mesmo tamanho de lote."""
+    if not os.path.exists(caminho):
+        return None
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            estado = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if estado.get("versao") != versao or estado.get("tamanho_lote") != tamanho_lote:
+        return None
+    estado["lotes_concluidos"] = set(estado["lotes_concluidos"])
+    return estado
+
+def _gravar_checkpoint(caminho, estado):
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+
+    def escrever(destino):
+        with open(destino, "w", encoding="utf-8") as f:
+            json.dump({**estado, "lotes_concluidos": sorted(estado["lotes_concluidos"])}, f)
+
+    _gravar_atomico(caminho, escrever)
+
+# --- Envio em paralelo ---
+def _enviar_lote(driver, funcao, registros, *args):
+    # execute_write repete a transação em erros transitórios (p.ex. deadlocks
+    # entre sessões que gravam relações nos mesmos nós)
+    with driver.session(database="neo4j") as session:
+        session.execute_write(funcao, registros, *args)
+    return len(registros)
+
+def enviar_lotes(driver, lotes, funcao, estado, caminho_checkpoint, n_sessoes=N_SESSOES, descricao="linhas", args=()):
+    """
+    Envia os lotes em n_sessoes sessões paralelas, com no máximo 2 lotes por
+    sessão em memória. Lotes já concluídos no checkpoint são saltados e cada
+    lote confirmado é gravado no checkpoint. Devolve o número de linhas enviadas.
+    """
+    concluidos = estado["lotes_concluidos"]
+    enviadas, inicio = 0, time.perf_counter()
+    pendentes = {}
+
+    def recolher(todos=False):
+        """Regista os lotes terminados; devolve o primeiro erro, se algum lote falhou."""
+        nonlocal enviadas
+        prontos, _ = wait(pendentes, return_when=ALL_COMPLETED if todos else FIRST_COMPLETED)
+        erro = None
+        for futuro in prontos:
+            numero = pendentes.pop(futuro)
+            if futuro.exception() is not None:
+                erro = erro or futuro.exception()
+                continue
+            enviadas += futuro.result()
+            concluidos.add(numero)
+        _gravar_checkpoint(caminho_checkpoint, estado)
+        decorrido = time.perf_counter() - inicio
+        print(f"  {enviadas:,} {descricao} em {decorrido:.1f}s ({enviadas / decorrido:,.0f} {descricao}/s)")
+        return erro
+
+    with ThreadPoolExecutor(max_workers=n_sessoes) as executor:
+        for numero, registros in lotes:
+            if numero in concluidos:
+                continue
+            pendentes[executor.submit(_enviar_lote, driver, funcao, registros, *args)] = numero
+            if len(pendentes) >= 2 * n_sessoes:
+                erro = recolher()
+                if erro is not None:
+                    # Deixa terminar os lotes já enviados, para o checkpoint ficar completo
+                    recolher(todos=True)
+                    raise erro
+        if pendentes:
+            erro = recolher(todos=True)
+            if erro is not None:
+                raise erro
+    return enviadas
 
 # --- Função Principal de Execução ---
+def ingerir(uri=URI, auth=AUTH, tamanho_lote=TAMANHO_LOTE, n_sessoes=N_SESSOES,
+            caminho_transacoes=None, caminho_checkpoint=CAMINHO_CHECKPOINT, recomecar=False,
+            incremental=False, por_mes_e_tipo=POR_MES_E_TIPO):
+    """
+    Carrega empresas e transações no Neo4j em lotes. Sem checkpoint válido
+    (ou com recomecar=True) a base é limpa antes; com checkpoint, a carga
+    continua de onde parou. Com incremental=True a base nunca é limpa: o
+    arquivo de transações deve ser o acumulado (as já carregadas mais as
+    novas); as que já estavam na base (mesma chave de conteúdo) não voltam a
+    ser somadas e só as novas são acrescentadas às relações agregadas.
+    """
+    versao = versao_workbook(EXCEL_FILE_PATH)
+    if caminho_transacoes:
+        versao = f"{versao[:16]}-{versao_workbook(caminho_transacoes)[:16]}"
+
+    estado = None if recomecar else _ler_checkpoint(caminho_checkpoint, versao, tamanho_lote)
+    empresas_df = ler_planilha(NOME_PLANILHA_EMPRESAS)
+
+    if caminho_transacoes:
+        blocos_transacoes = iterar_transacoes(caminho_transacoes, tamanho_chunk=tamanho_lote)
+    else:
+        blocos_transacoes = _fatias(ler_planilha(NOME_PLANILHA_TRANSACOES), tamanho_lote)
+
+    inicio = time.perf_counter()
+    with GraphDatabase.driver(uri, auth=auth) as driver:
+        if estado is None and incremental:
+            with driver.session(database="neo4j") as session:
+                session.execute_write(criar_constraints)
+            estado = {"versao": versao, "tamanho_lote": tamanho_lote, "empresas_concluidas": False, "lotes_concluidos": set()}
+            _gravar_checkpoint(caminho_checkpoint, estado)
+        elif estado is None:
+            print("A limpar base de dados antiga...")
+            with driver.session(database="neo4j") as session:
+                # Apaga em transações pequenas para não estourar a memória do servidor
+                session.run("MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS")
+                session.execute_write(criar_constraints)
+            print("Constraint de unicidade criada.")
+            estado = {"versao": versao, "tamanho_lote": tamanho_lote, "empresas_concluidas": False, "lotes_concluidos": set()}
+            _gravar_checkpoint(caminho_checkpoint, estado)
+        else:
+            print(f"A retomar a carga: {len(estado['lotes_concluidos'])} lotes de transações já enviados.")
+
+        if not estado["empresas_concluidas"]:
+            # MERGE é idempotente: as empresas são reenviadas por inteiro se a carga parou aqui
+            lotes = gerar_lotes(_fatias(empresas_df, tamanho_lote), _preparar_empresas)
+            for _, registros in lotes:
+                with driver.session(database="neo4j") as session:
+                    session.execute_write(carregar_empresas, registros)
+            estado["empresas_concluidas"] = True
+            _gravar_checkpoint(caminho_checkpoint, estado)
+            print(f"{len(empresas_df)} nós de Empresa carregados.")
+
+        # Os lotes são sempre todos preparados (mesmo os já concluídos), na
+        # ordem do arquivo, para que as contagens de ocorrências batam
+        ocorrencias = {}
+        lotes = gerar_lotes(blocos_transacoes, lambda bloco: _preparar_transacoes(bloco, ocorrencias))
+        enviadas = enviar_lotes(driver, lotes, carregar_transacoes, estado, caminho_checkpoint, n_sessoes,
+                                descricao="transações", args=(por_mes_e_tipo,))
+        decorrido = time.perf_counter() - inicio
+        print(f"{enviadas:,} relações de Pagamento carregadas em {decorrido:.1f}s "
+              f"({enviadas / max(decorrido, 1e-9):,.0f} linhas/s).")
+
+    # Carga completa: o checkpoint deixa de ser necessário
+    os.remove(caminho_checkpoint)
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingestão das bases no Neo4j em lotes paralelos e retomáveis.")
+    parser.add_argument("--tamanho-lote", type=int, default=TAMANHO_LOTE, help="linhas por transação no Neo4j")
+    parser.add_argument("--sessoes", type=int, default=N_SESSOES, help="sessões a gravar em paralelo")
+    parser.add_argument("--transacoes", default=None, help="CSV/Parquet de transações (em vez da planilha do Excel)")
+    parser.add_argument("--recomecar", action="store_true", help="ignora o checkpoint e recarrega tudo do zero")
+    parser.add_argument("--incremental", action="store_true",
+                        help="não limpa a base; o arquivo de transações deve ser o acumulado (as já carregadas "
+                             "são reconhecidas pela chave e só as novas são acrescentadas)")
+    parser.add_argument("--por-mes-e-tipo", action="store_true", default=POR_MES_E_TIPO,
+                        help="grava também as relações agregadas por mês e tipo (:PAGOU_PARA_MES)")
+    parser.add_argument("--uri", default=URI)
+    args = parser.parse_args()
+
     print("A iniciar a ingestão de dados para o Neo4j...")
-    
-    # Carregar dados do Excel
     try:
-        empresas_df = pd.read_excel(EXCEL_FILE_PATH, sheet_name=NOME_PLANILHA_EMPRESAS, dtype={'id': str})
-        trans_df = pd.read_excel(EXCEL_FILE_PATH, sheet_name=NOME_PLANILHA_TRANSACOES, dtype={'id_pgto': str, 'id_rcbe': str})
-    except FileNotFoundError:
-        print(f"\nERRO CRÍTICO: O ficheiro '{EXCEL_FILE_PATH}' não foi encontrado.")
-        print("Por favor, certifique-se de que o nome do ficheiro está correto e que ele está na pasta principal do projeto.")
-        exit() # Termina o script se o ficheiro não for encontrado
-
-    # Limpar e formatar datas para o formato do Neo4j (YYYY-MM-DD)
-    empresas_df['dt_abrt'] = pd.to_datetime(empresas_df['dt_abrt']).dt.strftime('%Y-%m-%d')
-    trans_df['dt_refe'] = pd.to_datetime(trans_df['dt_refe']).dt.strftime('%Y-%m-%d')
-    
-    empresas_records = empresas_df.to_dict('records')
-    trans_records = trans_df.to_dict('records')
-    
-    # Conectar e popular o banco de dados
-    try:
-        with GraphDatabase.driver(URI, auth=AUTH) as driver:
-            with driver.session(database="neo4j") as session:
-                print("A limpar base de dados antiga...")
-                session.run("MATCH (n) DETACH DELETE n")
-
-                session.execute_write(criar_constraints)
-                print("Constraint de unicidade criada.")
-                
-                session.execute_write(carregar_empresas, empresas_records)
-                print(f"{len(empresas_records)} nós de Empresa carregados.")
-                
-                session.execute_write(carregar_transacoes, trans_records)
-                print(f"{len(trans_records)} relações de Pagamento carregadas.")
-                
+        ingerir(uri=args.uri, tamanho_lote=args.tamanho_lote, n_sessoes=args.sessoes,
+                caminho_transacoes=args.transacoes, recomecar=args.recomecar,
+                incremental=args.incremental, por_mes_e_tipo=args.por_mes_e_tipo)
         print("\nIngestão de dados concluída com sucesso!")
+    except FileNotFoundError as e:
+        print(f"\nERRO CRÍTICO: O ficheiro '{e.filename or EXCEL_FILE_PATH}' não foi encontrado.")
+        print("Por favor, certifique-se de que o nome do ficheiro está correto e que ele está na pasta principal do projeto.")
     except Exception as e:
         print(f"\nOcorreu um erro durante a conexão com o Neo4j: {e}")
-        print("Verifique se o Neo4j Desktop está a correr e se as suas credenciais (URI, utilizador, palavra-passe) estão corretas.")
\ No newline at end of file
+        print("Verifique se o Neo4j Desktop está a correr e se as suas credenciais (URI, utilizador, palavra-passe) estão corretas.")
+        print("O progresso ficou gravado; execute novamente para continuar a carga.")
@@ -0,0 +1,202 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+try:
+    import psutil
+except ImportError:  # dependência opcional
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# --- CONFIGURAÇÃO DA INSTRUMENTAÇÃO ---
+# Cada etapa medida gera uma linha JSON no log de métricas (tempo, linhas,
+# cache e memória), partilhado por todos os processos do dashboard e jobs.
+# O caminho parte da pasta do projeto (e não da pasta de trabalho), para que
+# páginas e jobs lançados de outra pasta escrevam no mesmo log; não vem de
+# data_loader.CACHE_DIR porque o data_loader importa este módulo.
+CAMINHO_METRICAS = os.getenv("METRICAS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache_bases", "metricas.jsonl"))
+# Acima deste tamanho o log é rodado para metricas.jsonl.1
+MAX_BYTES_METRICAS = 5 * 1024 * 1024
+ATIVA = os.getenv("INSTRUMENTACAO", "1") != "0"
+# -----------------------------
+
+_trava_log = threading.Lock()
+# Etapa em curso no contexto atual (thread ou tarefa asyncio), para aninhar
+# etapas e para marcar_cache saber a que etapa se refere
+_etapa_atual = contextvars.ContextVar("etapa_atual", default=None)
+
+
+# --- MEMÓRIA ---
+def rss_mb():
+    """Memória residente atual do processo em MB (psutil, /proc ou None)."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def pico_rss_mb():
+    """Pico de memória residente do processo desde o início, em MB (None se indisponível)."""
+    if psutil is not None and hasattr(psutil.Process().memory_info(), "peak_wset"):
+        return psutil.Process().memory_info().peak_wset / 1024 ** 2  # Windows
+    if resource is not None:
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux devolve KB, macOS devolve bytes
+        return pico / 1024 ** 2 if os.uname().sysname == "Darwin" else pico / 1024
+    return None
+
+
+# --- REGISTO DAS ETAPAS ---
+def contar_linhas(resultado):
+    """Linhas de um resultado (DataFrame, Series, array, lista; num tuplo, as do primeiro elemento)."""
+    if isinstance(resultado, tuple) and resultado:
+        resultado = resultado[0]
+    if isinstance(resultado, (str, bytes, dict)) or not hasattr(resultado, "__len__"):
+        return None
+    return len(resultado)
+
+
+def _gravar(evento, caminho=CAMINHO_METRICAS):
+    linha = json.dumps(evento, ensure_ascii=False, default=str) + "\n"
+    with _trava_log:
+        try:
+            os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+            if os.path.exists(caminho) and os.path.getsize(caminho) > MAX_BYTES_METRICAS:
+                os.replace(caminho, f"{caminho}.1")
+            with open(caminho, "a", encoding="utf-8") as f:
+                f.write(linha)
+        except OSError:
+            # A instrumentação nunca deve derrubar o pipeline
+            pass
+
+
+class medir:
+    """
+    Context manager que mede uma etapa:
+
+        with medir("features_cashflow") as etapa:
+            base = ...
+            etapa["linhas"] = len(base)
+
+    Regista tempo de parede, linhas, estado do cache ('hit'/'miss', via
+    marcar_cache), memória residente no fim, pico do processo, a etapa-mãe
+    (quando aninhada) e o erro, se houver.
+    """
+
+    def __init__(self, etapa, **contexto):
+        self.evento = {"etapa": etapa, "linhas": None, "cache": None, **contexto}
+
+    def __enter__(self):
+        self._token = _etapa_atual.set(self.evento)
+        pai = self._token.old_value
+        self.evento["pai"] = pai["etapa"] if isinstance(pai, dict) else None
+        self._inicio = time.perf_counter()
+        return self.evento
+
+    def __exit__(self, tipo, erro, traceback):
+        segundos = time.perf_counter() - self._inicio
+        _etapa_atual.reset(self._token)
+        if not ATIVA:
+            return False
+        self.evento.update({
+            "momento": pd.Timestamp.now().isoformat(timespec="milliseconds"),
+            "segundos": round(segundos, 6),
+            "rss_mb": _arredondar(rss_mb()),
+            "pico_rss_mb": _arredondar(pico_rss_mb()),
+            "pid": os.getpid(),
+            "erro": None if erro is None else f"{tipo.__name__}: {erro}",
+        })
+        _gravar(self.evento)
+        return False
+
+
+def _arredondar(valor):
+    return None if valor is None else round(valor, 1)
+
+
+def marcar_cache(estado):
+    """Marca a etapa em curso como 'hit' ou 'miss' de cache."""
+    evento = _etapa_atual.get()
+    if evento is not None:
+        evento["cache"] = estado
+
+
+def instrumentar(etapa=None, em_cache=False):
+    """
+    Decorador que mede cada chamada da função (ver medir) e conta as linhas
+    do resultado. Com em_cache=True, para funções com st.cache_data por
+    baixo: a chamada conta como 'hit', a não ser que o corpo da função
+    (que só corre quando não há cache) chame marcar_cache('miss').
+    """
+    def decorador(funcao):
+        nome = etapa or funcao.__name__
+
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            with medir(nome) as evento:
+                if em_cache:
+                    evento["cache"] = "hit"
+                resultado = funcao(*args, **kwargs)
+                evento["linhas"] = contar_linhas(resultado)
+            return resultado
+        return medida
+    return decorador
+
+
+# --- LEITURA (página de diagnóstico) ---
+def ler_metricas(caminho=CAMINHO_METRICAS, incluir_rodado=True):
+    """Todos os eventos gravados no log (e no log rodado anterior) como DataFrame."""
+    linhas = []
+    for arquivo in ([f"{caminho}.1"] if incluir_rodado else []) + [caminho]:
+        if os.path.exists(arquivo):
+            with open(arquivo, "r", encoding="utf-8") as f:
+                for linha in f:
+                    try:
+                        linhas.append(json.loads(linha))
+                    except json.JSONDecodeError:
+                        continue  # linha cortada por uma escrita concorrente
+    df = pd.DataFrame(linhas)
+    if not df.empty:
+        df["momento"] = pd.to_datetime(df["momento"])
+    return df
+
+
+def resumo_etapas(eventos):
+    """
+    Uma linha por etapa: chamadas, tempo total, médio, p95 e máximo, linhas
+    médias, hits e misses de cache, pior memória residente e erros.
+    Ordenado pelo tempo total, das etapas mais lentas para as mais rápidas.
+    """
+    colunas = ['etapa', 'chamadas', 'total_s', 'media_s', 'p95_s', 'max_s', 'linhas_media', 'hits', 'misses', 'taxa_hit', 'rss_max_mb', 'erros']
+    if eventos.empty:
+        return pd.DataFrame(columns=colunas)
+    # Colunas que podem vir só com None (p.ex. linhas de etapas sem resultado tabular)
+    eventos = eventos.assign(**{c: pd.to_numeric(eventos[c], errors='coerce') for c in ('segundos', 'linhas', 'rss_mb')})
+    grupos = eventos.groupby('etapa')
+    resumo = pd.DataFrame({
+        'chamadas': grupos.size(),
+        'total_s': grupos['segundos'].sum(),
+        'media_s': grupos['segundos'].mean(),
+        'p95_s': grupos['segundos'].quantile(0.95),
+        'max_s': grupos['segundos'].max(),
+        'linhas_media': grupos['linhas'].mean(),
+        'hits': (eventos['cache'] == 'hit').groupby(eventos['etapa']).sum(),
+        'misses': (eventos['cache'] == 'miss').groupby(eventos['etapa']).sum(),
+        'rss_max_mb': grupos['rss_mb'].max(),
+        'erros': eventos['erro'].notna().groupby(eventos['etapa']).sum(),
+    })
+    com_cache = resumo['hits'] + resumo['misses']
+    resumo['taxa_hit'] = (resumo['hits'] / com_cache).where(com_cache > 0)
+    return resumo.reset_index().sort_values('total_s', ascending=False)[colunas].reset_index(drop=True)
@@ -0,0 +1,238 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from regressao import ajustar_retas
+from transacoes_compactas import ids_presentes, posicoes_em
+
+# --- CONFIGURAÇÃO DA MATRIZ MENSAL ---
+# Métricas guardadas como matrizes (empresas × meses do calendário)
+METRICAS = ('receita', 'despesa', 'fluxo_liq')
+# Janelas do perfil financeiro: médias e volatilidade dos últimos 6 meses com
+# linha e tendência da receita nos últimos 3 (ver perfil_das_janelas)
+JANELA_MEDIAS = 6
+JANELA_TENDENCIA = 3
+# -----------------------------
+
+
+class MatrizMensal:
+    """
+    Representação densa da base mensal: para cada métrica, uma matriz
+    float64 (n_empresas × n_meses) alinhada a `ids` (em ordem crescente) e a
+    `meses` (ordinais de mês consecutivos, ver transacoes_compactas.py), com
+    a máscara dos meses em que a empresa tem linha na base. Meses sem linha
+    valem 0, como no fillna(0) de features_cashflow.
+
+    Estatísticas de janela para o portfólio inteiro saem de operações sobre
+    as linhas (ver media_movel e desvio_movel), sem groupby por empresa. Com
+    salvar/carregar as matrizes ficam em .npy e podem ser abertas com
+    memory map, partilhadas entre processos pelo cache de páginas do SO.
+    """
+
+    def __init__(self, ids, meses, valores, mascara):
+        self.ids = pd.Index(ids)
+        self.meses = np.asarray(meses, dtype=np.int32)
+        self.valores = dict(valores)
+        self.mascara = mascara
+
+    @classmethod
+    def de_base(cls, base, metricas=METRICAS):
+        """Constrói a partir da base longa (id, ano_mes, métricas...)."""
+        codigos, ids = pd.factorize(base['id'], sort=True)
+        ordinais = base['ano_mes'].to_numpy(dtype=np.int64)
+        primeiro = ordinais.min() if len(ordinais) else 0
+        colunas = ordinais - primeiro
+        n_meses = colunas.max() + 1 if len(colunas) else 0
+
+        mascara = np.zeros((len(ids), n_meses), dtype=bool)
+        mascara[codigos, colunas] = True
+        valores = {}
+        for metrica in metricas:
+            y = np.zeros((len(ids), n_meses))
+            y[codigos, colunas] = base[metrica].to_numpy(dtype='float64')
+            valores[metrica] = y
+        return cls(ids, np.arange(primeiro, primeiro + n_meses), valores, mascara)
+
+    @classmethod
+    def de_transacoes(cls, trans):
+        """
+        Constrói direto das transações no layout compacto, sem passar pela
+        base longa: cada célula é um np.bincount sobre código × meses + mês.
+        """
+        ids = ids_presentes(trans['id_pgto']).union(ids_presentes(trans['id_rcbe'])).sort_values()
+        mes = trans['mes'].to_numpy(dtype=np.int64)
+        primeiro = mes.min() if len(mes) else 0
+        n_meses = int(mes.max() - primeiro + 1) if len(mes) else 0
+        n_celulas = len(ids) * n_meses
+        vl = np.nan_to_num(trans['vl'].to_numpy(dtype='float64'))
+
+        def somar(coluna):
+            posicoes = posicoes_em(coluna, ids)
+            validas = posicoes >= 0
+            celulas = posicoes[validas].astype(np.int64) * n_meses + (mes[validas] - primeiro)
+            soma = np.bincount(celulas, weights=vl[validas], minlength=n_celulas)
+            contagem = np.bincount(celulas, minlength=n_celulas)
+            return soma.reshape(len(ids), n_meses), contagem.reshape(len(ids), n_meses) > 0
+
+        receita, recebeu = somar(trans['id_rcbe'])
+        despesa, pagou = somar(trans['id_pgto'])
+        valores = {'receita': receita, 'despesa': despesa, 'fluxo_liq': receita - despesa}
+        return cls(ids, np.arange(primeiro, primeiro + n_meses), valores, recebeu | pagou)
+
+    def __getitem__(self, metrica):
+        return self.valores[metrica]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def posicao(self, empresa_id):
+        """Linha da empresa nas matrizes (-1 se não existir)."""
+        return int(self.ids.get_indexer([empresa_id])[0])
+
+    def historico(self, empresa_id, metricas=METRICAS):
+        """
+        Série mensal de uma empresa como as suas linhas na base longa
+        (ano_mes e métricas, só nos meses com linha, em ordem). Com memory
+        map, só as linhas da empresa são lidas do disco.
+        """
+        linha = self.posicao(empresa_id)
+        colunas = np.flatnonzero(self.mascara[linha]) if linha >= 0 else np.array([], dtype=np.int64)
+        return pd.DataFrame({
+            'ano_mes': self.meses[colunas],
+            **{metrica: np.asarray(self.valores[metrica][linha, colunas]) for metrica in metricas},
+        })
+
+    def ultimos_meses(self, metrica, janela):
+        """
+        Os últimos `janela` meses com linha de cada empresa, alinhados à
+        direita numa matriz (n_empresas × janela), com a máscara dos pontos
+        válidos: o mesmo que regressao.matriz_ultimos_pontos sobre a base.
+        """
+        # Posição de cada mês observado contada a partir do último (0 = último)
+        pos_fim = np.cumsum(self.mascara[:, ::-1], axis=1)[:, ::-1] - 1
+        linhas, colunas = np.nonzero(self.mascara & (pos_fim < janela))
+        destino = janela - 1 - pos_fim[linhas, colunas]
+
+        y = np.zeros((len(self.ids), janela))
+        mascara = np.zeros((len(self.ids), janela), dtype=bool)
+        y[linhas, destino] = self.valores[metrica][linhas, colunas]
+        mascara[linhas, destino] = True
+        return y, mascara
+
+    def perfil_financeiro(self):
+        """O perfil financeiro de utils._perfil_financeiro (ver perfil_das_janelas), a partir das matrizes."""
+        receita, mascara = self.ultimos_meses('receita', JANELA_MEDIAS)
+        despesa, _ = self.ultimos_meses('despesa', JANELA_MEDIAS)
+        fluxo, _ = self.ultimos_meses('fluxo_liq', JANELA_MEDIAS)
+        # A margem como na base longa: 0 nos meses sem receita
+        margem = np.where(receita != 0, fluxo / np.where(receita != 0, receita, 1.0), 0.0)
+        return perfil_das_janelas(self.ids, receita, despesa, margem, mascara)
+
+    # --- Persistência (memory map) ---
+    def salvar(self, pasta):
+        """Grava as matrizes em .npy e os ids em Parquet."""
+        os.makedirs(pasta, exist_ok=True)
+        pd.DataFrame({'id': self.ids}).to_parquet(os.path.join(pasta, "ids.parquet"), index=False)
+        np.save(os.path.join(pasta, "meses.npy"), self.meses)
+        np.save(os.path.join(pasta, "mascara.npy"), self.mascara)
+        for metrica, matriz in self.valores.items():
+            np.save(os.path.join(pasta, f"{metrica}.npy"), matriz)
+        with open(os.path.join(pasta, "metricas.json"), "w", encoding="utf-8") as f:
+            json.dump(list(self.valores), f)
+
+    @classmethod
+    def carregar(cls, pasta, mmap=True):
+        """Reabre uma matriz gravada com salvar(); com mmap, as matrizes são lidas do disco sob demanda."""
+        modo = 'r' if mmap else None
+        with open(os.path.join(pasta, "metricas.json"), "r", encoding="utf-8") as f:
+            metricas = json.load(f)
+        return cls(
+            pd.read_parquet(os.path.join(pasta, "ids.parquet"))['id'],
+            np.load(os.path.join(pasta, "meses.npy")),
+            {metrica: np.load(os.path.join(pasta, f"{metrica}.npy"), mmap_mode=modo) for metrica in metricas},
+            np.load(os.path.join(pasta, "mascara.npy"), mmap_mode=modo),
+        )
+
+
+def perfil_das_janelas(ids, receita, despesa, margem, mascara):
+    """
+    Perfil financeiro de cada empresa a partir dos seus últimos JANELA_MEDIAS
+    meses com linha, alinhados à direita em matrizes (n_empresas ×
+    JANELA_MEDIAS) com a máscara dos pontos válidos: médias de receita,
+    despesa e margem, volatilidade (desvio-padrão amostral) da receita e
+    tendência da receita (inclinação da reta de mínimos quadrados sobre os
+    últimos JANELA_TENDENCIA pontos, com o OLS em lote de regressao.py).
+
+    É o cálculo único usado por MatrizMensal.perfil_financeiro e por
+    utils._perfil_financeiro, que só diferem na forma de montar as janelas.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        n = mascara.sum(axis=1)
+        receita_media = np.where(mascara, receita, 0.0).sum(axis=1) / n
+        desvios2 = np.where(mascara, receita - receita_media[:, None], 0.0) ** 2
+        volatilidade = np.where(n >= 2, np.sqrt(desvios2.sum(axis=1) / (n - 1)), np.nan)
+        despesa_media = np.where(mascara, despesa, 0.0).sum(axis=1) / n
+        margem_media = np.where(mascara, margem, 0.0).sum(axis=1) / n
+
+    tendencia = ajustar_retas(receita[:, -JANELA_TENDENCIA:], mascara[:, -JANELA_TENDENCIA:])
+    return pd.DataFrame({
+        'id': ids,
+        'receita_media_6m': receita_media,
+        'despesa_media_6m': despesa_media,
+        'crescimento_receita_3m': tendencia.inclinacao,
+        'margem_media_6m': margem_media,
+        'volatilidade_receita': volatilidade,
+    })
+
+
+# --- ESTATÍSTICAS DE JANELA MÓVEL ---
+# Todas recebem matrizes (empresas × meses) e devolvem o mesmo formato, com a
+# estatística da janela que termina em cada mês (NaN nas primeiras janela - 1
+# colunas; tudo NaN se a janela for maior do que o número de meses).
+# sliding_window_view cria as janelas como uma vista com strides, sem copiar
+# os dados.
+def janelas_moveis(matriz, janela):
+    """
+    Vista (empresas × meses - janela + 1 × janela) com todas as janelas de
+    cada linha. Com janela maior do que o número de meses não há nenhuma
+    janela completa e o resultado tem 0 janelas por linha.
+    """
+    matriz = np.asarray(matriz)
+    if janela < 1:
+        raise ValueError(f"A janela deve ter pelo menos 1 mês (recebida: {janela}).")
+    if janela > matriz.shape[1]:
+        return np.empty((matriz.shape[0], 0, janela), dtype=matriz.dtype)
+    return sliding_window_view(matriz, janela, axis=1)
+
+
+def _alinhar_ao_fim(resultado, janela, n_meses):
+    """Põe o resultado de cada janela na coluna do seu último mês (n_meses colunas no total)."""
+    alinhado = np.full((resultado.shape[0], n_meses), np.nan)
+    alinhado[:, janela - 1:] = resultado
+    return alinhado
+
+
+def media_movel(matriz, janela, mascara=None):
+    """Média móvel de cada linha; com `mascara`, só dos meses observados em cada janela."""
+    if mascara is None:
+        return _alinhar_ao_fim(janelas_moveis(matriz, janela).mean(axis=2), janela, np.shape(matriz)[1])
+    soma = janelas_moveis(np.where(mascara, matriz, 0.0), janela).sum(axis=2)
+    contagem = janelas_moveis(mascara, janela).sum(axis=2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return _alinhar_ao_fim(np.where(contagem > 0, soma / contagem, np.nan), janela, np.shape(matriz)[1])
+
+
+def desvio_movel(matriz, janela, mascara=None):
+    """Desvio-padrão amostral móvel de cada linha (NaN com menos de 2 meses observados na janela)."""
+    if mascara is None:
+        return _alinhar_ao_fim(janelas_moveis(matriz, janela).std(axis=2, ddof=1), janela, np.shape(matriz)[1])
+    valores = janelas_moveis(np.where(mascara, matriz, 0.0), janela)
+    observados = janelas_moveis(mascara, janela)
+    contagem = observados.sum(axis=2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = valores.sum(axis=2) / contagem
+        soma2 = np.where(observados, (valores - media[..., None]) ** 2, 0.0).sum(axis=2)
+        return _alinhar_ao_fim(np.where(contagem >= 2, np.sqrt(soma2 / (contagem - 1)), np.nan), janela, np.shape(matriz)[1])
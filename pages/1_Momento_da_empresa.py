@@ -1,9 +1,9 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
-from data_loader import load_transacoes, load_empresas
-from utils import features_cashflow, clusterizar_empresas_kmeans
-from consulta_ia import retorna_informacao_empresas
+from pipeline import obter_artefatos
+from consulta_ia import em_segundo_plano
+from diagnosticos_ia import obter_diagnostico_async, pedido_momento
+from transacoes_compactas import data_de_mes
 import plotly.graph_objects as go
 
 st.set_page_config(page_title="Análise Individual da Empresa", layout="wide")
@@ -32,19 +32,9 @@ col1, col2, col3 = st.columns([1, 2, 1])
 with col1:
     st.image("assets/logo.png")
 
-# --- Função de Cache para Carregar e Processar todos os Dados ---
-@st.cache_data
-def carregar_e_processar_dados():
-    """
-    Função centralizada que carrega os dados e executa o pipeline de ML para esta página.
-    """
-    trans = load_transacoes()
-    empresas = load_empresas()
-    base = features_cashflow(trans)
-    perfil_clusterizado = clusterizar_empresas_kmeans(base, empresas.copy())
-    return trans, base, perfil_clusterizado
-
-trans, base, perfil = carregar_e_processar_dados()
+# --- Dados partilhados do pipeline (calculados uma vez por versão da base) ---
+artefatos = obter_artefatos()
+perfil, indices, benchmark = artefatos["perfil"], artefatos["indices"], artefatos["benchmark"]
 
 st.title("Diagnóstico Individual e Benchmarking Competitivo")
 
@@ -52,23 +42,29 @@ st.title("Diagnóstico Individual e Benchmarking Competitivo")
 if perfil.empty:
     st.error("Não foi possível carregar os dados para análise.")
 else:
-    ids_unicos = sorted(perfil["id"].unique())
+    ids_unicos = list(indices["perfil"].ids)
     id_sel = st.selectbox("Selecione a empresa para análise:", ids_unicos)
 
     # --- Toda a análise acontece DEPOIS da seleção ---
     if id_sel:
         # Extração dos dados da empresa selecionada
-        perfil_id = perfil[perfil["id"] == id_sel].iloc[0]
+        # Buscas pelo índice por empresa (sem varrer as tabelas inteiras)
+        perfil_id = indices["perfil"].primeira(id_sel)
         cnae_id = perfil_id['ds_cnae']
-        hist_id = base[base["id"] == id_sel].sort_values("ano_mes")
-        media_setor = perfil[perfil['ds_cnae'] == cnae_id][['receita_media_6m', 'margem_media_6m']].mean()
+        # Série mensal lida da matriz em memory map (só as linhas desta empresa)
+        hist_id = artefatos["matriz_mensal"].historico(id_sel)
+        # Estatísticas do setor pré-calculadas no pipeline (média, mediana, percentis)
+        benchmark_setor = benchmark[('ds_cnae', cnae_id)]
+        media_setor = benchmark_setor['media']
 
         # --- NOVA SEÇÃO: DIAGNÓSTICO DO ANALISTA VIRTUAL ---
         st.header("🤖 Diagnóstico do Analista Virtual")
-        with st.spinner("A IA está a analisar os dados e a gerar o diagnóstico..."):
-            # Chamamos a nossa função de IA com os dados já calculados
-            diagnostico_ia = retorna_informacao_empresas(perfil_id, media_setor)
-            st.markdown(f'<div class="ai-summary" style="white-space: pre-wrap;">{diagnostico_ia}</div>', unsafe_allow_html=True)
+        # Diagnóstico pré-gerado pelo job em lote (diagnosticos_ia.py); se faltar
+        # ou estiver desatualizado, é pedido à IA em segundo plano enquanto a
+        # página monta os gráficos abaixo, e escrito neste espaço no fim
+        espaco_diagnostico = st.empty()
+        diagnostico_futuro = em_segundo_plano(obter_diagnostico_async(
+            id_sel, "momento", artefatos["manifesto"].get("versao"), pedido_momento(artefatos, id_sel)))
         
         st.markdown("---")
 
@@ -77,6 +73,9 @@ else:
         col1, col2 = st.columns(2)
         with col1:
             st.metric("Momento da Empresa (via ML)", perfil_id['momento'])
+            benchmark_momento = benchmark.get(('momento', perfil_id['momento']))
+            if benchmark_momento is not None:
+                st.caption(f"Receita mediana das empresas neste momento: R$ {benchmark_momento.loc['receita_media_6m', 'mediana']:,.0f}")
         with col2:
             st.metric("Margem Média (6m)", f"{perfil_id['margem_media_6m']:.1%}")
 
@@ -92,7 +91,11 @@ else:
                 value=f"R$ {perfil_id['receita_media_6m']:,.0f}",
                 delta=f"R$ {delta_receita:,.0f}"
             )
-            st.caption(f"Média do setor: R$ {media_setor['receita_media_6m']:,.0f}")
+            st.caption(
+                f"Média do setor: R$ {media_setor['receita_media_6m']:,.0f} · "
+                f"Mediana: R$ {benchmark_setor.loc['receita_media_6m', 'mediana']:,.0f} · "
+                f"Percentil da empresa no setor: {perfil_id['percentil_setor_receita_media_6m']:.0%}"
+            )
         with col_bench2:
             delta_margem = perfil_id['margem_media_6m'] - media_setor['margem_media_6m']
             st.metric(
@@ -100,13 +103,18 @@ else:
                 value=f"{perfil_id['margem_media_6m']:.1%}",
                 delta=f"{delta_margem:.1%}"
             )
-            st.caption(f"Média do setor: {media_setor['margem_media_6m']:.1%}")
+            st.caption(
+                f"Média do setor: {media_setor['margem_media_6m']:.1%} · "
+                f"Mediana: {benchmark_setor.loc['margem_media_6m', 'mediana']:.1%} · "
+                f"Percentil da empresa no setor: {perfil_id['percentil_setor_margem_media_6m']:.0%}"
+            )
+        st.caption(f"Setor com {benchmark_setor.loc['receita_media_6m', 'contagem']:,.0f} empresas analisadas.")
 
         st.markdown("---")
 
         # --- ANÁLISE: APROXIMAÇÃO COM O FLUXO DE CAIXA (REGRESSÃO LINEAR) ---
         st.subheader("Análise de Tendências do Fluxo de Caixa")
-        hist_id['ano_mes'] = pd.to_datetime(hist_id['ano_mes'])
+        hist_id = hist_id.assign(ano_mes=data_de_mes(hist_id['ano_mes']))
         df_melted = hist_id.melt(id_vars=['ano_mes'], value_vars=['receita', 'despesa', 'fluxo_liq'], var_name='Métrica', value_name='Valor')
 
         fig_regressao = px.scatter(
@@ -122,9 +130,9 @@ else:
         st.subheader("Composição Detalhada de Receitas e Despesas")
         col_dist1, col_dist2 = st.columns(2)
 
-        def plotar_distribuicao_barras(df_trans, empresa_id, tipo, coluna_id, titulo, cor):
-            mix = (df_trans[df_trans[coluna_id] == empresa_id]
-                   .groupby("ds_tran")["vl"].sum()
+        def plotar_distribuicao_barras(trans_empresa, tipo, titulo, cor):
+            mix = (trans_empresa
+                   .groupby("ds_tran", observed=True)["vl"].sum()
                    .sort_values(ascending=False).reset_index())
             
             total = mix["vl"].sum()
@@ -144,12 +152,17 @@ else:
 
         with col_dist1:
             st.plotly_chart(
-                plotar_distribuicao_barras(trans, id_sel, 'Receita', 'id_rcbe', 'Distribuição de Receitas por Origem', 'mediumseagreen'),
+                plotar_distribuicao_barras(indices["recebimentos"].linhas(id_sel), 'Receita', 'Distribuição de Receitas por Origem', 'mediumseagreen'),
                 use_container_width=True
             )
             
         with col_dist2:
             st.plotly_chart(
-                plotar_distribuicao_barras(trans, id_sel, 'Despesa', 'id_pgto', 'Distribuição de Despesas por Categoria', 'indianred'),
+                plotar_distribuicao_barras(indices["pagamentos"].linhas(id_sel), 'Despesa', 'Distribuição de Despesas por Categoria', 'indianred'),
                 use_container_width=True
-            )
\ No newline at end of file
+            )
+
+        with espaco_diagnostico.container():
+            with st.spinner("A IA está a analisar os dados e a gerar o diagnóstico..."):
+                diagnostico_ia = diagnostico_futuro.result()
+        espaco_diagnostico.markdown(f'<div class="ai-summary" style="white-space: pre-wrap;">{diagnostico_ia}</div>', unsafe_allow_html=True)
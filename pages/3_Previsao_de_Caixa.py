@@ -1,9 +1,11 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from data_loader import load_transacoes
-from utils import features_cashflow, prever_fluxo_caixa
-from consulta_ia import gerar_resumo_previsao
+from pipeline import obter_artefatos
+from previsao import HORIZONTE_MAXIMO, HORIZONTE_MINIMO, MODELOS, consultar_previsao
+from consulta_ia import em_segundo_plano
+from diagnosticos_ia import obter_diagnostico_async, pedido_previsao, tipo_previsao
+from transacoes_compactas import data_de_mes
 import plotly.graph_objects as go
 
 st.set_page_config(page_title="Previsão de Fluxo de Caixa", layout="wide")
@@ -31,47 +33,40 @@ col1, col2, col3 = st.columns([1, 2, 1])
 with col1:
     st.image("assets/logo.png")
 
-# --- Função de Cache para Carregar os Dados ---
-@st.cache_data
-def carregar_dados_previsao():
-    """Carrega e prepara os dados de base para a previsão."""
-    trans = load_transacoes()
-    base = features_cashflow(trans)
-    return base
-
-base = carregar_dados_previsao()
+# --- Dados partilhados do pipeline (base mensal e tabela de previsões) ---
+artefatos = obter_artefatos()
+base, previsoes, indices = artefatos["base"], artefatos["previsoes"], artefatos["indices"]
+calculado_em = artefatos["manifesto"].get("previsoes_calculadas_em", "")
 
 st.title("Forecasting: Previsão de Fluxo de Caixa")
 st.write("""
-Esta ferramenta utiliza um modelo para projetar as tendências futuras de 
+Esta ferramenta utiliza modelos estatísticos para projetar as tendências futuras de 
 receitas, despesas e fluxo de caixa, e oferece uma recomendação estratégica baseada na previsão.
 """)
 
 # --- Filtros ---
-lista_empresas = sorted(base["id"].unique())
+lista_empresas = list(indices["base"].ids) if indices else []
 id_sel = st.selectbox("Selecione a empresa para a previsão:", lista_empresas)
-periodos_previsao = st.slider("Selecione o número de meses para prever:", min_value=3, max_value=12, value=6, step=1)
+modelo_sel = st.selectbox("Selecione o modelo de previsão:", list(MODELOS), format_func=lambda nome: MODELOS[nome].descricao)
+periodos_previsao = st.slider("Selecione o número de meses para prever:", min_value=HORIZONTE_MINIMO, max_value=HORIZONTE_MAXIMO, value=6, step=1)
 
 if id_sel:
-    # Filtra o histórico da empresa selecionada
-    hist_id = base[base["id"] == id_sel].sort_values("ano_mes")
-    
-    # Faz a previsão para cada métrica
-    previsao_receita = prever_fluxo_caixa(hist_id, 'receita', periodos_previsao)
-    previsao_despesa = prever_fluxo_caixa(hist_id, 'despesa', periodos_previsao)
+    # Histórico da empresa selecionada, buscado pelo índice por empresa
+    hist_id = indices["base"].linhas(id_sel).sort_values("ano_mes")
     
-    # Combina as previsões e calcula o fluxo de caixa previsto
-    df_previsao = pd.merge(previsao_receita, previsao_despesa, on='ano_mes')
-    df_previsao['fluxo_liq'] = df_previsao['receita'] - df_previsao['despesa']
+    # Busca a previsão já calculada (receita, despesa e fluxo líquido) na tabela do portfólio
+    df_previsao = consultar_previsao(previsoes, id_sel, periodos_previsao, modelo_sel)[['ano_mes', 'receita', 'despesa', 'fluxo_liq']]
     
     st.markdown("---")
 
     # --- NOVA SEÇÃO: RECOMENDAÇÃO DO ANALISTA VIRTUAL ---
     st.header("🤖 Recomendação Estratégica do Analista Virtual")
-    with st.spinner("A IA está a analisar a previsão e a gerar recomendações..."):
-        # Chamamos a nossa nova função de IA com os dados calculados
-        resumo_previsao_ia = gerar_resumo_previsao(hist_id, df_previsao)
-        st.markdown(f'<div class="ai-summary" style="white-space: pre-wrap;">{resumo_previsao_ia}</div>', unsafe_allow_html=True)
+    # Recomendação pré-gerada para este modelo e horizonte; se faltar, é pedida
+    # em segundo plano e escrita aqui depois do gráfico
+    espaco_recomendacao = st.empty()
+    recomendacao_futura = em_segundo_plano(obter_diagnostico_async(
+        id_sel, tipo_previsao(modelo_sel, periodos_previsao), artefatos["manifesto"].get("versao"),
+        pedido_previsao(artefatos, id_sel, modelo_sel, periodos_previsao)))
 
     st.markdown("---")
     
@@ -95,9 +90,11 @@ if id_sel:
     st.subheader("Gráfico de Histórico vs. Previsão")
     
     # Prepara dataframes para o plot
+    # Os meses vêm como ordinais; só aqui viram datas
     hist_id_plot = hist_id.copy()
-    hist_id_plot['ano_mes'] = pd.to_datetime(hist_id_plot['ano_mes'])
+    hist_id_plot['ano_mes'] = data_de_mes(hist_id_plot['ano_mes'])
     df_previsao_plot = df_previsao.copy()
+    df_previsao_plot['ano_mes'] = data_de_mes(df_previsao_plot['ano_mes'])
     
     df_completo = pd.concat([hist_id_plot, df_previsao_plot])
     
@@ -130,4 +127,10 @@ if id_sel:
     )
 
     st.plotly_chart(fig, use_container_width=True)
-    st.caption("Nota: As previsões são baseadas num modelo de regressão linear simples e representam uma extrapolação da tendência histórica.")
\ No newline at end of file
+    st.caption(f"Nota: As previsões são baseadas no modelo '{MODELOS[modelo_sel].descricao}' e representam uma extrapolação do comportamento histórico.")
+    st.caption(f"Tabela de previsões calculada em {calculado_em}.")
+
+    with espaco_recomendacao.container():
+        with st.spinner("A IA está a analisar a previsão e a gerar recomendações..."):
+            resumo_previsao_ia = recomendacao_futura.result()
+    espaco_recomendacao.markdown(f'<div class="ai-summary" style="white-space: pre-wrap;">{resumo_previsao_ia}</div>', unsafe_allow_html=True)
\ No newline at end of file
@@ -0,0 +1,261 @@
+import json
+import os
+import shutil
+
+import pandas as pd
+import streamlit as st
+
+from base_incremental import BaseIncremental
+from cluster_incremental import clusterizar_perfil_incremental, obter_clusterizador
+from comunidades import obter_comunidades
+from data_loader import CACHE_DIR, NOME_PLANILHA_EMPRESAS, NOME_PLANILHA_TRANSACOES, ler_planilha, versao_workbook
+from grafo_local import GrafoLocal
+from indice_empresas import IndiceEmpresas
+from instrumentacao import instrumentar, marcar_cache, medir
+from matriz_mensal import MatrizMensal
+from previsao import (CAMINHO_PREVISOES, carregar_tabela, prever_com_modelos, salvar_tabela, versao_tabela,
+                      versao_tabela_gravada)
+from risco_rede import calcular_risco
+from segmentos import adicionar_percentis_setor, comparativo_setores, construir_cubo_cnae, indexar_benchmark, tabela_benchmark
+from transacoes_compactas import COLUNAS_COMPACTAS
+
+# --- CONFIGURAÇÃO DO PIPELINE ---
+# Os artefatos (base mensal, perfil clusterizado e previsões) são gerados uma
+# vez por versão do workbook e partilhados por todas as páginas e sessões.
+PASTA_ARTEFATOS = os.path.join(CACHE_DIR, "pipeline")
+# Base mensal e perfil financeiro materializados (base_incremental.py): quando
+# o workbook novo só acrescenta transações, só as linhas novas são somadas.
+PASTA_BASE_INCREMENTAL = os.path.join(CACHE_DIR, "base_incremental")
+
+# Aumente este número sempre que mudar o cálculo de algum artefato, para
+# forçar a reconstrução mesmo que o workbook não tenha mudado.
+VERSAO_CODIGO = 8
+
+# Processos para as previsões quando o pipeline corre dentro do servidor do
+# Streamlit (miss de cache numa página): todos os modelos são vetorizados e
+# correm num só processo, sem abrir um pool de processos no servidor. O job
+# em lote (python previsao.py) usa todos os núcleos; se a tabela dele foi
+# calculada sobre a mesma base, o pipeline usa-a em vez de recalcular.
+PROCESSOS_PREVISAO = 1
+# -----------------------------
+
+
+def versao_pipeline():
+    """Versão dos artefatos: hash do workbook + versão do código do pipeline."""
+    return f"{versao_workbook()[:16]}-v{VERSAO_CODIGO}"
+
+
+@instrumentar()
+def construir_artefatos(versao=None, pasta=PASTA_ARTEFATOS):
+    """
+    Executa load → base mensal e perfil financeiro (BaseIncremental) →
+    clusterização (com o benchmark por setor e por momento) → previsões →
+    risco da rede e grava tudo em Parquet numa pasta com o nome da versão. A
+    pasta só passa a existir quando todos os arquivos estão completos.
+
+    Devolve (pasta da versão, GrafoLocal), para que carregar_artefatos
+    reaproveite o grafo em vez de o construir outra vez.
+    """
+    versao = versao or versao_pipeline()
+    destino = os.path.join(pasta, versao)
+    temporario = f"{destino}.{os.getpid()}.tmp"
+    os.makedirs(temporario, exist_ok=True)
+
+    try:
+        trans = ler_planilha(NOME_PLANILHA_TRANSACOES, COLUNAS_COMPACTAS)
+        empresas = ler_planilha(NOME_PLANILHA_EMPRESAS)
+        with medir("BaseIncremental"):
+            motor = BaseIncremental.sincronizar(trans, PASTA_BASE_INCREMENTAL)
+        base = motor.base
+        # Classifica com o modelo de clusters gravado e agenda o reajuste dele
+        # em segundo plano (cluster_incremental.py), que vale na próxima versão
+        with medir("clusterizar_perfil_incremental"):
+            perfil = adicionar_percentis_setor(clusterizar_perfil_incremental(motor.perfil_completo(empresas)))
+        benchmark = tabela_benchmark(perfil)
+        versao_previsoes = versao_tabela(base)
+        caminho_previsoes = os.path.join(temporario, "previsoes.parquet")
+        if versao_tabela_gravada(CAMINHO_PREVISOES) == versao_previsoes:
+            shutil.copyfile(CAMINHO_PREVISOES, caminho_previsoes)
+            tempos = pd.DataFrame(columns=['modelo', 'segundos', 'empresas'])
+        else:
+            previsoes, tempos = prever_com_modelos(base, n_processos=PROCESSOS_PREVISAO)
+            salvar_tabela(previsoes, versao_previsoes, caminho_previsoes)
+        with medir("GrafoLocal"):
+            grafo = GrafoLocal(trans, empresas)
+        risco = calcular_risco(grafo)
+        # Atualiza (de forma incremental, se já existir) a partição padrão das comunidades
+        obter_comunidades(grafo)
+
+        base.to_parquet(os.path.join(temporario, "base.parquet"), index=False)
+        MatrizMensal.de_base(base).salvar(os.path.join(temporario, "matriz_mensal"))
+        perfil.to_parquet(os.path.join(temporario, "perfil.parquet"), index=False)
+        benchmark.to_parquet(os.path.join(temporario, "benchmark.parquet"), index=False)
+        for nome, tabela in risco.items():
+            tabela.to_parquet(os.path.join(temporario, f"risco_{nome}.parquet"), index=False)
+        manifesto = {
+            "versao": versao,
+            "criado_em": pd.Timestamp.now().isoformat(timespec="seconds"),
+            "empresas": int(perfil["id"].nunique()),
+            "linhas_base": int(len(base)),
+            "versao_previsoes": versao_previsoes,
+            "tempos_previsao": tempos.to_dict("records"),
+        }
+        with open(os.path.join(temporario, "manifesto.json"), "w", encoding="utf-8") as f:
+            json.dump(manifesto, f, indent=2)
+
+        try:
+            os.rename(temporario, destino)
+        except OSError:
+            # Outro processo terminou a mesma versão primeiro; fica a dele
+            pass
+    finally:
+        if os.path.exists(temporario):
+            shutil.rmtree(temporario, ignore_errors=True)
+
+    # Remove as versões antigas
+    for nome in os.listdir(pasta):
+        if nome != versao and not nome.endswith(".tmp"):
+            shutil.rmtree(os.path.join(pasta, nome), ignore_errors=True)
+    return destino, grafo
+
+
+@instrumentar()
+def carregar_artefatos(versao=None, pasta=PASTA_ARTEFATOS):
+    """Lê os artefatos de uma versão, construindo-os antes se ainda não existirem."""
+    versao = versao or versao_pipeline()
+    destino = os.path.join(pasta, versao)
+    grafo = None
+    if os.path.exists(os.path.join(destino, "manifesto.json")):
+        marcar_cache("hit")
+    else:
+        marcar_cache("miss")
+        _, grafo = construir_artefatos(versao, pasta)
+
+    with open(os.path.join(destino, "manifesto.json"), "r", encoding="utf-8") as f:
+        manifesto = json.load(f)
+    # Uma tabela do job em lote calculada depois do build, sobre a mesma base,
+    # vale no lugar da que foi gravada com os artefatos
+    caminho_previsoes = os.path.join(destino, "previsoes.parquet")
+    if versao_tabela_gravada(CAMINHO_PREVISOES) == manifesto["versao_previsoes"]:
+        caminho_previsoes = CAMINHO_PREVISOES
+    previsoes, _, calculado_em = carregar_tabela(caminho_previsoes)
+    manifesto["previsoes_calculadas_em"] = calculado_em
+
+    base = pd.read_parquet(os.path.join(destino, "base.parquet"))
+    # Aberta com memory map: as páginas do arquivo são partilhadas entre processos
+    matriz_mensal = MatrizMensal.carregar(os.path.join(destino, "matriz_mensal"))
+    perfil = pd.read_parquet(os.path.join(destino, "perfil.parquet"))
+    benchmark = pd.read_parquet(os.path.join(destino, "benchmark.parquet"))
+    risco = {nome: pd.read_parquet(os.path.join(destino, f"risco_{nome}.parquet")) for nome in ("dependencias", "concentracao")}
+    trans = ler_planilha(NOME_PLANILHA_TRANSACOES, COLUNAS_COMPACTAS)
+    empresas = ler_planilha(NOME_PLANILHA_EMPRESAS)
+    if grafo is None:
+        with medir("GrafoLocal"):
+            grafo = GrafoLocal(trans, empresas)
+
+    return {
+        "base": base,
+        # A mesma base em matrizes (empresas × meses): séries por empresa da
+        # página 1 e estatísticas de janela
+        "matriz_mensal": matriz_mensal,
+        "perfil": perfil,
+        "previsoes": previsoes,
+        "transacoes": trans,
+        "empresas": empresas,
+        "manifesto": manifesto,
+        "benchmark": indexar_benchmark(benchmark),
+        # Agregados por setor da Home, refeitos só quando muda a versão
+        "cubo_cnae": construir_cubo_cnae(perfil, empresas, trans),
+        "comparativo_cnae": comparativo_setores(perfil),
+        # Grafo de pagamentos em memória (página de Cadeia de Valor)
+        "grafo": grafo,
+        # Dependências e concentração de todas as empresas (risco_rede.py)
+        "risco": risco,
+        # Índices por empresa, construídos uma vez por versão
+        "indices": {
+            "perfil": IndiceEmpresas(perfil, 'id'),
+            "perfil_cnae": IndiceEmpresas(perfil, 'ds_cnae'),
+            "base": IndiceEmpresas(base, 'id'),
+            "recebimentos": IndiceEmpresas(trans, 'id_rcbe'),
+            "pagamentos": IndiceEmpresas(trans, 'id_pgto'),
+            "risco": IndiceEmpresas(risco["concentracao"], 'id'),
+        },
+    }
+
+
+# --- ACESSO PARTILHADO PELAS PÁGINAS ---
+# st.cache_resource guarda UM objeto por versão para todo o servidor (em vez de
+# uma cópia por chamada, como o st.cache_data). Os DataFrames devolvidos são
+# partilhados: as páginas devem filtrá-los ou copiá-los, nunca alterá-los.
+@st.cache_resource(max_entries=1)
+def _artefatos_da_versao(versao):
+    return carregar_artefatos(versao)
+
+
+def _artefatos_vazios():
+    return {
+        "base": pd.DataFrame(columns=['id', 'ano_mes', 'receita', 'despesa', 'fluxo_liq', 'margem']),
+        "matriz_mensal": None,
+        "perfil": pd.DataFrame(),
+        "previsoes": pd.DataFrame(),
+        "transacoes": pd.DataFrame(),
+        "empresas": pd.DataFrame(),
+        "manifesto": {},
+        "benchmark": {},
+        "cubo_cnae": {},
+        "comparativo_cnae": pd.DataFrame(),
+        "grafo": None,
+        "risco": {},
+        "indices": {},
+    }
+
+
+def obter_artefatos():
+    """
+    Devolve o dicionário com 'base', 'matriz_mensal' (MatrizMensal em memory
+    map), 'perfil', 'previsoes', 'transacoes',
+    'empresas', 'manifesto', 'benchmark' ({(nivel, grupo): estatísticas}),
+    'cubo_cnae', 'comparativo_cnae', 'grafo' (GrafoLocal), 'risco'
+    (tabelas de dependencias e concentracao) e 'indices' (IndiceEmpresas por
+    tabela) da versão atual do workbook.
+    """
+    try:
+        return _artefatos_da_versao(versao_pipeline())
+    except FileNotFoundError as e:
+        st.error(f"Arquivo de dados não encontrado: {e.filename or e}. Verifique se o Excel está na pasta correta.")
+    except KeyError as e:
+        st.error(f"Coluna '{e.args[0]}' não encontrada nas planilhas. Verifique seu arquivo Excel.")
+    except ValueError as e:
+        st.error(f"Erro ao ler as planilhas do Excel: {e}")
+    return _artefatos_vazios()
+
+
+def obter_base():
+    return obter_artefatos()["base"]
+
+
+def obter_perfil():
+    return obter_artefatos()["perfil"]
+
+
+def obter_previsoes():
+    return obter_artefatos()["previsoes"]
+
+
+def obter_transacoes():
+    return obter_artefatos()["transacoes"]
+
+
+def obter_empresas():
+    return obter_artefatos()["empresas"]
+
+
+# --- Execução como job em lote ---
+if __name__ == "__main__":
+    print("A construir os artefatos do pipeline...")
+    destino, _ = construir_artefatos()
+    # O reajuste dos clusters corre numa thread daemon: espera-se por ele
+    # para que o modelo novo fique gravado antes de o processo terminar
+    obter_clusterizador().aguardar()
+    with open(os.path.join(destino, "manifesto.json"), "r", encoding="utf-8") as f:
+        print(f.read())
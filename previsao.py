@@ -0,0 +1,369 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data_loader import CACHE_DIR
+from instrumentacao import medir
+from matriz_mensal import MatrizMensal
+from regressao import ajustar_retas, prever
+
+# --- CONFIGURAÇÃO DA TABELA DE PREVISÕES ---
+# A tabela guarda os próximos HORIZONTE_MAXIMO meses de cada empresa; a previsão
+# para um horizonte h (3 a 12 no slider da página) são os h primeiros passos.
+HORIZONTE_MINIMO = 3
+HORIZONTE_MAXIMO = 12
+# Tabela do job em lote (python previsao.py). O pipeline usa-a no lugar da sua
+# quando foi calculada sobre a mesma base mensal e com os mesmos modelos.
+CAMINHO_PREVISOES = os.path.join(CACHE_DIR, "previsoes.parquet")
+# Aumente este número sempre que mudar o cálculo de algum modelo, para que as
+# tabelas já gravadas deixem de valer
+VERSAO_MODELOS = 2
+
+# Abaixo deste número de empresas o custo de abrir processos não compensa
+MIN_EMPRESAS_PARALELO = 20_000
+# -----------------------------
+
+
+def versao_base(base):
+    """Identifica o conteúdo da base mensal, para saber se a tabela gravada ainda vale."""
+    return f"{pd.util.hash_pandas_object(base, index=False).sum() & 0xFFFFFFFFFFFFFFFF:016x}"
+
+
+def _matriz_mensal(base, metricas):
+    """
+    Transforma a base longa numa matriz (empresas × meses do calendário) por
+    métrica, com a máscara dos meses que existem para cada empresa.
+    """
+    matriz = MatrizMensal.de_base(base, metricas)
+    meses = pd.PeriodIndex.from_ordinals(matriz.meses.astype(np.int64), freq='M')
+    return matriz.ids, meses, matriz.valores, matriz.mascara
+
+
+# --- MODELOS DE PREVISÃO ---
+# Todos os modelos seguem a mesma interface: recebem um bloco de empresas em
+# formato de matriz (empresas × meses do calendário) e devolvem a matriz
+# (empresas × passos) com as previsões. Assim qualquer modelo pode ser
+# ajustado em lote para o portfólio inteiro e distribuído entre processos.
+class ModeloPrevisao:
+    """
+    Interface comum dos modelos de previsão.
+
+    prever_bloco recebe:
+    - y: matriz (empresas × meses) com os valores da métrica (0 onde não há dado);
+    - mascara: matriz booleana com os meses observados de cada empresa;
+    - x: matriz de dias desde o primeiro mês da base para cada coluna;
+    - x_futuro: matriz (empresas × passos) com os dias dos meses futuros.
+    """
+    nome = None
+    descricao = None
+    # Número de empresas a partir do qual vale a pena abrir processos
+    min_empresas_paralelo = MIN_EMPRESAS_PARALELO
+
+    def prever_bloco(self, y, mascara, x, x_futuro):
+        raise NotImplementedError
+
+
+def _limites_historico(mascara):
+    """Primeira e última coluna observadas de cada empresa."""
+    primeira = np.argmax(mascara, axis=1)
+    ultima = mascara.shape[1] - 1 - np.argmax(mascara[:, ::-1], axis=1)
+    return primeira, ultima
+
+
+class ModeloLinear(ModeloPrevisao):
+    """Reta de mínimos quadrados sobre o índice de dias (o modelo de prever_fluxo_caixa)."""
+    nome = "linear"
+    descricao = "Regressão linear (tendência)"
+
+    def prever_bloco(self, y, mascara, x, x_futuro):
+        return prever(ajustar_retas(y, mascara, x), x_futuro)
+
+
+class ModeloSazonalIngenuo(ModeloPrevisao):
+    """
+    Repete o valor do mesmo mês no ciclo anterior. Empresas com menos de um
+    ciclo de histórico repetem o último valor observado.
+    """
+    nome = "sazonal_ingenuo"
+    descricao = "Sazonal ingênuo (repete o ano anterior)"
+
+    def __init__(self, periodo=12):
+        self.periodo = periodo
+
+    def prever_bloco(self, y, mascara, x, x_futuro):
+        primeira, ultima = _limites_historico(mascara)
+        passos = np.arange(1, x_futuro.shape[1] + 1)
+        ciclos = (passos - 1) // self.periodo + 1
+        origem = ultima[:, None] + passos - self.periodo * ciclos
+        linhas = np.arange(y.shape[0])[:, None]
+        valido = origem >= primeira[:, None]
+        return np.where(valido, y[linhas, np.maximum(origem, 0)], y[linhas, ultima[:, None]])
+
+
+class ModeloHoltWinters(ModeloPrevisao):
+    """
+    Suavização exponencial de Holt-Winters aditiva, ajustada em lote: as
+    recursões de nível, tendência e sazonalidade correm mês a mês sobre a
+    matriz inteira (todas as empresas e todas as combinações da grade de
+    parâmetros de uma vez). Cada empresa fica com a combinação de menor erro
+    quadrático um passo à frente.
+
+    Com pelo menos dois ciclos de histórico usa tendência e sazonalidade,
+    com pelo menos 4 meses só a tendência (Holt), e nos demais casos repete
+    o último valor observado. Meses sem transações dentro do histórico da
+    empresa contam como zero.
+    """
+    nome = "holt_winters"
+    descricao = "Holt-Winters / ETS (tendência e sazonalidade)"
+
+    # Grade de parâmetros de suavização (nível, tendência, sazonalidade)
+    GRADE_ALFA = (0.1, 0.3, 0.5, 0.8)
+    GRADE_BETA = (0.05, 0.2)
+    GRADE_GAMA = (0.1, 0.3)
+
+    def __init__(self, periodo=12):
+        self.periodo = periodo
+
+    def _estados_iniciais(self, y, primeira, sazonal):
+        """Nível, tendência e índices sazonais antes do primeiro mês de cada empresa."""
+        p = self.periodo
+        linhas = np.arange(y.shape[0])[:, None]
+        # Holt: nível no primeiro valor e tendência da primeira diferença
+        primeiro = y[linhas[:, 0], primeira]
+        segundo = y[linhas[:, 0], np.minimum(primeira + 1, y.shape[1] - 1)]
+        tendencia = segundo - primeiro
+        nivel = primeiro - tendencia
+        indices_sazonais = np.zeros((y.shape[0], p))
+
+        # Holt-Winters: médias dos dois primeiros ciclos. Os índices sazonais
+        # são os desvios do primeiro ciclo em relação à reta de tendência (e
+        # não à média do ciclo, que ainda inclui a subida da tendência)
+        ciclo1 = y[linhas, np.minimum(primeira[:, None] + np.arange(p), y.shape[1] - 1)]
+        ciclo2 = y[linhas, np.minimum(primeira[:, None] + p + np.arange(p), y.shape[1] - 1)]
+        tendencia_hw = (ciclo2.mean(axis=1) - ciclo1.mean(axis=1)) / p
+        nivel_hw = ciclo1.mean(axis=1) - tendencia_hw * (p + 1) / 2
+        nivel = np.where(sazonal, nivel_hw, nivel)
+        tendencia = np.where(sazonal, tendencia_hw, tendencia)
+        desvios = ciclo1 - ciclo1.mean(axis=1, keepdims=True) - tendencia_hw[:, None] * (np.arange(p) - (p - 1) / 2)
+        indices_sazonais = np.where(sazonal[:, None], desvios, indices_sazonais)
+        return nivel, tendencia, indices_sazonais
+
+    def prever_bloco(self, y, mascara, x, x_futuro):
+        n, n_meses = y.shape
+        passos = x_futuro.shape[1]
+        if n == 0:
+            return np.zeros((0, passos))
+        p = self.periodo
+        primeira, ultima = _limites_historico(mascara)
+        tamanho = ultima - primeira + 1
+        sazonal = tamanho >= 2 * p
+        holt = tamanho >= 4
+
+        alfa, beta, gama = (g.ravel() for g in np.meshgrid(self.GRADE_ALFA, self.GRADE_BETA, self.GRADE_GAMA, indexing='ij'))
+        # Sem sazonalidade, os índices sazonais ficam em zero (gama = 0)
+        gama = np.where(sazonal[:, None], gama, 0.0)
+
+        nivel, tendencia, indices = self._estados_iniciais(y, primeira, sazonal)
+        k = len(alfa)
+        # Estados por (empresa, combinação da grade)
+        nivel = np.repeat(nivel[:, None], k, axis=1)
+        tendencia = np.repeat(tendencia[:, None], k, axis=1)
+        indices = np.repeat(indices[:, None, :], k, axis=1)
+        sse = np.zeros((n, k))
+        linhas = np.arange(n)
+
+        for t in range(n_meses):
+            ativo = ((t >= primeira) & (t <= ultima))[:, None]
+            if not ativo.any():
+                continue
+            fase = (t - primeira) % p
+            s = indices[linhas, :, fase]
+            valor = y[:, t, None]
+            erro = valor - (nivel + tendencia + s)
+            sse += np.where(ativo, erro * erro, 0.0)
+
+            novo_nivel = alfa * (valor - s) + (1 - alfa) * (nivel + tendencia)
+            nova_tendencia = beta * (novo_nivel - nivel) + (1 - beta) * tendencia
+            novo_s = gama * (valor - novo_nivel) + (1 - gama) * s
+            nivel = np.where(ativo, novo_nivel, nivel)
+            tendencia = np.where(ativo, nova_tendencia, tendencia)
+            indices[linhas, :, fase] = np.where(ativo, novo_s, s)
+
+        melhor = np.argmin(sse, axis=1)
+        nivel, tendencia = nivel[linhas, melhor], tendencia[linhas, melhor]
+        indices = indices[linhas, melhor]
+
+        h = np.arange(1, passos + 1)
+        fases = (ultima[:, None] + h - primeira[:, None]) % p
+        previsao = nivel[:, None] + h * tendencia[:, None] + indices[linhas[:, None], fases]
+        ultimo_valor = y[linhas, ultima][:, None]
+        return np.where(holt[:, None], previsao, ultimo_valor)
+
+
+MODELOS = {modelo.nome: modelo for modelo in (ModeloLinear, ModeloSazonalIngenuo, ModeloHoltWinters)}
+
+
+def obter_modelo(modelo):
+    """Aceita o nome de um modelo registado em MODELOS ou uma instância de ModeloPrevisao."""
+    return MODELOS[modelo]() if isinstance(modelo, str) else modelo
+
+
+def _em_blocos(funcao, n_linhas, n_processos, min_linhas_paralelo, *matrizes):
+    """Aplica `funcao` a blocos de linhas das matrizes, em paralelo se compensar."""
+    if n_processos is None:
+        n_processos = os.cpu_count() or 1
+    if n_processos <= 1 or n_linhas < min_linhas_paralelo:
+        return funcao(*matrizes)
+
+    limites = np.linspace(0, n_linhas, n_processos + 1, dtype=int)
+    fatias = [slice(a, b) for a, b in zip(limites[:-1], limites[1:]) if b > a]
+    with ProcessPoolExecutor(max_workers=n_processos) as executor:
+        partes = executor.map(funcao, *[[m[f] for f in fatias] for m in matrizes])
+        return np.concatenate(list(partes))
+
+
+def prever_portfolio(base, modelo='linear', metricas=('receita', 'despesa'), passos=HORIZONTE_MAXIMO, n_processos=None):
+    """
+    Prevê os próximos `passos` meses de cada métrica para todas as empresas de
+    uma só vez com o modelo escolhido (nome em MODELOS ou instância).
+
+    Devolve um DataFrame longo com as colunas id, passo, ano_mes (ordinal do
+    mês, como na base), as métricas e fluxo_liq (quando receita e despesa
+    forem previstas). Uma base vazia dá uma tabela vazia com essas colunas.
+    """
+    modelo = obter_modelo(modelo)
+    if base.empty:
+        vazia = pd.DataFrame({
+            'id': pd.Series(dtype=object),
+            'passo': pd.Series(dtype=np.int64),
+            'ano_mes': pd.Series(dtype=np.int32),
+            **{metrica: pd.Series(dtype='float64') for metrica in metricas},
+        })
+        if 'receita' in metricas and 'despesa' in metricas:
+            vazia['fluxo_liq'] = pd.Series(dtype='float64')
+        return vazia
+    ids, meses, series, mascara = _matriz_mensal(base, metricas)
+    n_empresas = len(ids)
+
+    # Índice de tempo em dias desde o primeiro mês da base, usando os dias
+    # reais de cada mês (inclusive nos meses futuros)
+    origem = meses[0].to_timestamp()
+    dias = np.asarray((meses.to_timestamp() - origem).days, dtype='float64')
+    x = np.broadcast_to(dias, mascara.shape)
+
+    # Último mês observado de cada empresa e os meses futuros a partir dele
+    _, ultima_coluna = _limites_historico(mascara)
+    meses_futuros = meses[ultima_coluna].repeat(passos) + np.tile(np.arange(1, passos + 1), n_empresas)
+    datas_futuras = meses_futuros.to_timestamp()
+    x_futuro = np.asarray((datas_futuras - origem).days, dtype='float64').reshape(n_empresas, passos)
+
+    previsoes = pd.DataFrame({
+        'id': np.repeat(ids, passos),
+        'passo': np.tile(np.arange(1, passos + 1), n_empresas),
+        'ano_mes': meses_futuros.asi8.astype(np.int32),
+    })
+    for metrica in metricas:
+        with medir(f"prever_portfolio.{modelo.nome}", metrica=metrica) as etapa:
+            y = _em_blocos(modelo.prever_bloco, n_empresas, n_processos, modelo.min_empresas_paralelo, series[metrica], mascara, x, x_futuro)
+            etapa["linhas"] = n_empresas
+        previsoes[metrica] = y.ravel()
+
+    if 'receita' in metricas and 'despesa' in metricas:
+        previsoes['fluxo_liq'] = previsoes['receita'] - previsoes['despesa']
+    return previsoes
+
+
+def prever_com_modelos(base, modelos=tuple(MODELOS), passos=HORIZONTE_MAXIMO, n_processos=None):
+    """
+    Roda vários modelos sobre o portfólio inteiro. Devolve as previsões de
+    todos os modelos (coluna 'modelo') e um DataFrame com o tempo de cada um.
+    """
+    partes, tempos = [], []
+    for nome in modelos:
+        inicio = time.perf_counter()
+        previsoes = prever_portfolio(base, modelo=nome, passos=passos, n_processos=n_processos)
+        tempos.append({'modelo': nome, 'segundos': time.perf_counter() - inicio, 'empresas': previsoes['id'].nunique()})
+        partes.append(previsoes.assign(modelo=nome))
+    return pd.concat(partes, ignore_index=True), pd.DataFrame(tempos)
+
+
+def versao_tabela(base, modelos=tuple(MODELOS)):
+    """Versão de uma tabela de previsões: conteúdo da base mensal + modelos usados."""
+    return f"{versao_base(base)}:{','.join(modelos)}:v{VERSAO_MODELOS}"
+
+
+def salvar_tabela(previsoes, versao, caminho=CAMINHO_PREVISOES):
+    """Grava a tabela de previsões em Parquet, com a versão da base e a hora do cálculo."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    calculado_em = pd.Timestamp.now().isoformat(timespec='seconds')
+    tabela = pa.Table.from_pandas(previsoes, preserve_index=False)
+    metadados = dict(tabela.schema.metadata or {})
+    metadados[b'versao_base'] = versao.encode()
+    metadados[b'calculado_em'] = calculado_em.encode()
+
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    pq.write_table(tabela.replace_schema_metadata(metadados), temporario)
+    os.replace(temporario, caminho)
+    return calculado_em
+
+
+def carregar_tabela(caminho=CAMINHO_PREVISOES):
+    """
+    Lê a tabela gravada por salvar_tabela. Devolve (previsoes, versao, calculado_em),
+    com as previsões indexadas e ordenadas por id para consultas por empresa.
+    """
+    import pyarrow.parquet as pq
+
+    tabela = pq.read_table(caminho)
+    metadados = tabela.schema.metadata or {}
+    previsoes = tabela.to_pandas().set_index('id').sort_index(kind='stable')
+    return previsoes, metadados.get(b'versao_base', b'').decode(), metadados.get(b'calculado_em', b'').decode()
+
+
+def versao_tabela_gravada(caminho=CAMINHO_PREVISOES):
+    """Versão gravada numa tabela (só lê o esquema do Parquet); None se o arquivo não existir."""
+    import pyarrow.parquet as pq
+
+    if not os.path.exists(caminho):
+        return None
+    metadados = pq.read_schema(caminho).metadata or {}
+    return metadados.get(b'versao_base', b'').decode()
+
+
+def consultar_previsao(previsoes, empresa_id, horizonte, modelo='linear'):
+    """Previsão de uma empresa para os próximos `horizonte` meses (consulta pelo índice)."""
+    previsao = previsoes.loc[[empresa_id]]
+    return previsao[(previsao['modelo'] == modelo) & (previsao['passo'] <= horizonte)].reset_index(drop=True)
+
+
+# --- Execução como job em lote ---
+if __name__ == "__main__":
+    import argparse
+
+    from data_loader import NOME_PLANILHA_TRANSACOES, iterar_transacoes, ler_planilha
+    from transacoes_compactas import COLUNAS_COMPACTAS
+    from utils import features_cashflow, features_cashflow_streaming
+
+    parser = argparse.ArgumentParser(description="Calcula a tabela de previsões para todo o portfólio.")
+    parser.add_argument("--transacoes", default=None,
+                        help="CSV/Parquet de transações, lido em blocos (em vez da planilha do Excel)")
+    parser.add_argument("--tamanho-chunk", type=int, default=500_000, help="linhas por bloco com --transacoes")
+    args = parser.parse_args()
+
+    print("A calcular a tabela de previsões para todo o portfólio...")
+    if args.transacoes:
+        # Só os agregados mensais ficam em memória, nunca o arquivo inteiro
+        base = features_cashflow_streaming(iterar_transacoes(args.transacoes, tamanho_chunk=args.tamanho_chunk))
+    else:
+        base = features_cashflow(ler_planilha(NOME_PLANILHA_TRANSACOES, COLUNAS_COMPACTAS))
+    previsoes, tempos = prever_com_modelos(base)
+    calculado_em = salvar_tabela(previsoes, versao_tabela(base))
+    print(tempos.to_string(index=False))
+    print(f"{previsoes['id'].nunique()} empresas × {HORIZONTE_MAXIMO} meses gravadas em '{CAMINHO_PREVISOES}' (calculado em {calculado_em}).")
+    print("O pipeline usa esta tabela enquanto a base mensal do workbook for a mesma.")
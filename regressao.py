@@ -0,0 +1,85 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Resultado de ajustar_retas: um valor por série (linha da matriz)
+Retas = namedtuple("Retas", ["inclinacao", "intercepto", "n", "residuo_std", "r2"])
+
+
+def ajustar_retas(y, mascara=None, x=None):
+    """
+    Ajusta uma reta de mínimos quadrados (y = intercepto + inclinacao * x) para
+    cada linha de uma matriz (n_series × n_pontos) numa única chamada NumPy.
+
+    - y: matriz com as séries, preenchida com qualquer valor onde não há dado.
+    - mascara: matriz booleana do mesmo formato, True onde o ponto é válido.
+      Se omitida, todos os pontos não-NaN são usados.
+    - x: abscissas; pode ser um vetor (n_pontos) comum a todas as séries ou
+      uma matriz do mesmo formato de y. Por padrão, 0, 1, ..., n_pontos - 1.
+
+    Séries com menos de 2 pontos (ou com x constante) recebem inclinação 0 e
+    intercepto igual à média, como faz o LinearRegression do scikit-learn.
+    """
+    y = np.atleast_2d(np.asarray(y, dtype="float64"))
+    if mascara is None:
+        mascara = ~np.isnan(y)
+    mascara = np.atleast_2d(np.asarray(mascara, dtype=bool))
+    if x is None:
+        x = np.arange(y.shape[1], dtype="float64")
+    x = np.broadcast_to(np.asarray(x, dtype="float64"), y.shape)
+
+    peso = mascara.astype("float64")
+    y = np.where(mascara, y, 0.0)
+    x = np.where(mascara, x, 0.0)
+
+    n = peso.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_medio = x.sum(axis=1) / n
+        y_medio = y.sum(axis=1) / n
+        dx = (x - x_medio[:, None]) * peso
+        dy = (y - y_medio[:, None]) * peso
+        sxx = (dx * dx).sum(axis=1)
+        sxy = (dx * dy).sum(axis=1)
+        syy = (dy * dy).sum(axis=1)
+
+        inclinacao = np.where(sxx > 0, sxy / np.where(sxx > 0, sxx, 1.0), 0.0)
+        intercepto = y_medio - inclinacao * x_medio
+
+        residuos = (y - (intercepto[:, None] + inclinacao[:, None] * x)) * peso
+        sse = (residuos * residuos).sum(axis=1)
+        residuo_std = np.where(n > 2, np.sqrt(sse / np.maximum(n - 2, 1)), np.nan)
+        r2 = np.where(syy > 0, 1 - sse / np.where(syy > 0, syy, 1.0), np.nan)
+
+    return Retas(inclinacao, intercepto, n.astype("int64"), residuo_std, r2)
+
+
+def prever(retas, x_futuro):
+    """
+    Avalia as retas ajustadas em novos pontos. `x_futuro` pode ser um vetor
+    comum a todas as séries ou uma matriz (n_series × n_pontos_futuros).
+    """
+    x_futuro = np.asarray(x_futuro, dtype="float64")
+    return retas.intercepto[:, None] + retas.inclinacao[:, None] * x_futuro
+
+
+def matriz_ultimos_pontos(base, coluna, janela, coluna_id="id"):
+    """
+    Empilha os últimos `janela` valores de `coluna` de cada empresa numa matriz
+    (n_empresas × janela) alinhada à direita, com a máscara dos pontos válidos.
+    A ordem das linhas dentro de cada empresa é a ordem em que aparecem em `base`.
+
+    Devolve (ids, y, mascara), com os ids em ordem crescente.
+    """
+    base = base.sort_values(coluna_id, kind="stable")
+    codigos, ids = pd.factorize(base[coluna_id], sort=True)
+    tamanhos = np.bincount(codigos, minlength=len(ids))
+    pos_fim = (np.cumsum(tamanhos) - 1)[codigos] - np.arange(len(codigos))
+
+    dentro = pos_fim < janela
+    y = np.zeros((len(ids), janela))
+    mascara = np.zeros((len(ids), janela), dtype=bool)
+    colunas = janela - 1 - pos_fim[dentro]
+    y[codigos[dentro], colunas] = base[coluna].to_numpy(dtype="float64")[dentro]
+    mascara[codigos[dentro], colunas] = True
+    return ids, y, mascara
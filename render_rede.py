@@ -0,0 +1,91 @@
+import networkx as nx
+import numpy as np
+import streamlit as st
+from pyvis.network import Network
+
+from comunidades import cor_comunidade
+
+# --- CONFIGURAÇÃO DA RENDERIZAÇÃO ---
+# As posições dos nós são calculadas no servidor e enviadas fixas ao
+# navegador, com a física desligada: o grafo aparece pronto, sem simulação.
+ESCALA_LAYOUT = 1000
+SEMENTE_LAYOUT = 42
+# Número de páginas HTML de grafo guardadas em memória
+MAX_HTML_EM_CACHE = 64
+# -----------------------------
+
+
+def calcular_layout(G, semente=SEMENTE_LAYOUT, peso=None):
+    """Posições (x, y) em pixels de cada nó, com um layout de forças determinístico."""
+    if G.number_of_nodes() == 0:
+        return {}
+    posicoes = nx.spring_layout(G, weight=peso, seed=semente, scale=ESCALA_LAYOUT)
+    return {no: (float(x), float(y)) for no, (x, y) in posicoes.items()}
+
+
+def _rede_sem_fisica(altura):
+    net = Network(height=altura, width="100%", bgcolor="#ffffff", font_color="#333333", directed=True)
+    net.toggle_physics(False)
+    return net
+
+
+def _html(net):
+    # Gera o HTML em memória (sem arquivo temporário partilhado entre sessões)
+    return net.generate_html(notebook=False)
+
+
+@st.cache_data(max_entries=MAX_HTML_EM_CACHE, show_spinner=False)
+def html_ecossistema(_df_conexoes, _comunidades, versao, backend, limite, resolucao):
+    """
+    HTML do grafo das N conexões mais fortes, com as cores das comunidades.
+    O cache é indexado pelos parâmetros da consulta (versão dos dados,
+    backend, limite e resolução); os argumentos com _ não entram na chave.
+    """
+    G = nx.from_pandas_edgelist(_df_conexoes, 'pagador', 'recebedor', edge_attr=['valor_total'], create_using=nx.DiGraph())
+    posicoes = calcular_layout(G.to_undirected())
+    grau = dict(G.degree())
+    max_grau = max(grau.values()) if grau else 1.0
+    comunidade = _comunidades.reindex(list(G.nodes())).fillna(-1).astype(int).to_dict()
+
+    net = _rede_sem_fisica("700px")
+    nos = list(G.nodes())
+    net.add_nodes(
+        nos,
+        label=nos,
+        color=[cor_comunidade(comunidade[no]) for no in nos],
+        size=[10 + 40 * (grau[no] / max_grau) for no in nos],
+        title=[f"Cluster: {comunidade[no]}<br>Conexões: {grau[no]}" for no in nos],
+        x=[posicoes[no][0] for no in nos],
+        y=[posicoes[no][1] for no in nos],
+    )
+    for pagador, recebedor, valor in zip(_df_conexoes['pagador'], _df_conexoes['recebedor'], _df_conexoes['valor_total']):
+        net.add_edge(pagador, recebedor, value=valor, title=f"Valor: R$ {valor:,.2f}", color="#dddddd")
+    return _html(net)
+
+
+@st.cache_data(max_entries=MAX_HTML_EM_CACHE, show_spinner=False)
+def html_vizinhanca(_vizinhanca, versao, backend, empresa_foco):
+    """
+    HTML da vizinhança imediata de uma empresa: clientes à esquerda,
+    fornecedores à direita, empresa em foco ao centro (layout radial fixo).
+    """
+    clientes = [c for c in _vizinhanca['clientes'] if c and c['id']]
+    fornecedores = [f for f in _vizinhanca['fornecedores'] if f and f['id']]
+
+    def arco(n, centro):
+        # Distribui n nós num semicírculo à volta do foco
+        angulos = np.linspace(centro - np.pi / 2.5, centro + np.pi / 2.5, n) if n > 1 else np.array([centro])
+        return ESCALA_LAYOUT * 0.5 * np.cos(angulos), ESCALA_LAYOUT * 0.5 * np.sin(angulos)
+
+    net = _rede_sem_fisica("600px")
+    net.add_node(empresa_foco, label=empresa_foco, color='#ff4b4b', size=30, shape='star', x=0, y=0)
+
+    for lista, centro, cor, entrada in ((clientes, np.pi, '#28a745', True), (fornecedores, 0.0, '#007bff', False)):
+        xs, ys = arco(len(lista), centro)
+        for item, x, y in zip(lista, xs, ys):
+            if item['id'] not in net.node_ids:
+                net.add_node(item['id'], label=item['id'], color=cor, size=15, x=float(x), y=float(y))
+            valor = item['rel']['valor']
+            origem, destino = (item['id'], empresa_foco) if entrada else (empresa_foco, item['id'])
+            net.add_edge(origem, destino, value=valor, title=f"Valor: R$ {valor:,.2f}", width=max(1, valor / 500000))
+    return _html(net)
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from instrumentacao import instrumentar
+
+# --- CONFIGURAÇÃO DO MOTOR DE RISCO ---
+# Número de saltos seguidos na exposição em cascata (2 = cliente do cliente)
+SALTOS_CASCATA = 3
+# Fatias menores do que isto são descartadas entre um salto e o seguinte,
+# para que os produtos de matrizes não se encham de valores irrelevantes
+LIMIAR_PODA = 1e-3
+# Fatias acumuladas dos k maiores clientes/fornecedores
+TOP_K = (1, 3)
+# -----------------------------
+
+
+def _matriz_pagamentos(grafo):
+    """Matriz esparsa W (pagador × recebedor) com o valor agregado de cada par."""
+    n = len(grafo)
+    return sparse.csr_matrix((grafo.par_valor, (grafo.par_pagador, grafo.par_recebedor)), shape=(n, n))
+
+
+def _normalizar_linhas(matriz):
+    """Divide cada linha pela sua soma (linhas vazias ficam vazias)."""
+    totais = np.asarray(matriz.sum(axis=1)).ravel()
+    with np.errstate(divide='ignore'):
+        inversos = np.where(totais > 0, 1.0 / totais, 0.0)
+    return sparse.diags(inversos) @ matriz
+
+
+def _linhas_csr(matriz):
+    """Índice da linha de cada valor guardado numa matriz CSR."""
+    return np.repeat(np.arange(matriz.shape[0]), np.diff(matriz.indptr))
+
+
+def _topk_por_linha(matriz, ks):
+    """Soma dos k maiores valores de cada linha, para cada k em ks."""
+    linhas = _linhas_csr(matriz)
+    ordem = np.lexsort((-matriz.data, linhas))
+    posicao = np.arange(len(ordem)) - matriz.indptr[linhas[ordem]]
+    return {
+        k: np.bincount(linhas[ordem][posicao < k], weights=matriz.data[ordem][posicao < k], minlength=matriz.shape[0])
+        for k in ks
+    }
+
+
+def _maximo_por_linha(matriz):
+    """Maior valor de cada linha e a coluna onde está (-1 nas linhas vazias)."""
+    valores = np.zeros(matriz.shape[0])
+    colunas = np.full(matriz.shape[0], -1)
+    nao_vazias = np.diff(matriz.indptr) > 0
+    if matriz.nnz:
+        valores[nao_vazias] = np.maximum.reduceat(matriz.data, matriz.indptr[:-1][nao_vazias])
+        # Primeira posição de cada linha onde está o máximo
+        linhas = _linhas_csr(matriz)
+        posicoes = np.flatnonzero(matriz.data == valores[linhas])
+        primeiras = posicoes[np.r_[True, np.diff(linhas[posicoes]) != 0]]
+        colunas[linhas[primeiras]] = matriz.indices[primeiras]
+    return valores, colunas
+
+
+def _sem_diagonal(matriz):
+    matriz = (matriz - sparse.diags(matriz.diagonal())).tocsr()
+    matriz.eliminate_zeros()
+    return matriz
+
+
+def exposicao_em_cascata(dependencia, saltos=SALTOS_CASCATA, limiar_poda=LIMIAR_PODA):
+    """
+    Exposição indireta acumulada de 2 até `saltos` saltos.
+
+    dependencia[j, i] é a fatia da receita de j que vem do cliente i. O
+    produto dependencia @ dependencia dá, para cada par (j, k), quanto da
+    receita de j depende de k através dos clientes de j (cliente do cliente);
+    as potências seguintes somam os saltos mais longos. Ligações de uma
+    empresa consigo mesma (ciclos) são ignoradas.
+    """
+    potencia = dependencia
+    acumulada = sparse.csr_matrix(dependencia.shape)
+    for _ in range(2, saltos + 1):
+        potencia = (potencia @ dependencia).tocsr()
+        potencia.data[potencia.data < limiar_poda] = 0
+        potencia.eliminate_zeros()
+        acumulada = acumulada + potencia
+    return _sem_diagonal(acumulada)
+
+
+@instrumentar()
+def calcular_risco(grafo, saltos=SALTOS_CASCATA, top_k=TOP_K):
+    """
+    Calcula de uma vez, para todas as empresas do grafo (GrafoLocal):
+
+    - 'dependencias': todas as relações (empresa_dependente, cliente_chave,
+      dependencia em %) ordenadas da maior para a menor, para que o slider de
+      limiar só precise filtrar a tabela;
+    - 'concentracao': uma linha por empresa com receita e despesa totais,
+      número de clientes e fornecedores, índice de Herfindahl (HHI, de 0 a 1)
+      e fatias dos top-k clientes e fornecedores, e a maior exposição em
+      cascata (cliente_cascata e exposicao_cascata em %).
+    """
+    pagamentos = _matriz_pagamentos(grafo)
+    # Linha j de dep_clientes: de onde vem a receita de j; linha i de
+    # dep_fornecedores: para onde vai a despesa de i
+    dep_clientes = _normalizar_linhas(pagamentos.T.tocsr())
+    dep_fornecedores = _normalizar_linhas(pagamentos)
+
+    linhas = _linhas_csr(dep_clientes)
+    dependencias = pd.DataFrame({
+        'empresa_dependente': grafo.ids[linhas],
+        'cliente_chave': grafo.ids[dep_clientes.indices],
+        'dependencia': dep_clientes.data * 100,
+    }).sort_values('dependencia', ascending=False, kind='stable').reset_index(drop=True)
+
+    concentracao = pd.DataFrame({
+        'id': grafo.ids,
+        'receita_total': grafo.receita_total,
+        'despesa_total': grafo.despesa_total,
+        'n_clientes': np.diff(dep_clientes.indptr),
+        'n_fornecedores': np.diff(dep_fornecedores.indptr),
+        'hhi_clientes': np.asarray(dep_clientes.multiply(dep_clientes).sum(axis=1)).ravel(),
+        'hhi_fornecedores': np.asarray(dep_fornecedores.multiply(dep_fornecedores).sum(axis=1)).ravel(),
+    })
+    for k, fatias in _topk_por_linha(dep_clientes, top_k).items():
+        concentracao[f'top{k}_clientes_%'] = fatias * 100
+    for k, fatias in _topk_por_linha(dep_fornecedores, top_k).items():
+        concentracao[f'top{k}_fornecedores_%'] = fatias * 100
+
+    exposicao, coluna = _maximo_por_linha(exposicao_em_cascata(dep_clientes, saltos))
+    concentracao['cliente_cascata'] = np.where(coluna >= 0, grafo.ids[np.maximum(coluna, 0)], None)
+    concentracao['exposicao_cascata_%'] = exposicao * 100
+
+    return {'dependencias': dependencias, 'concentracao': concentracao}
+
+
+def filtrar_dependencias(dependencias, limiar_percentual, limite=10):
+    """
+    Relações com dependência >= limiar (fração de 0 a 1), já ordenadas, a
+    partir da tabela pré-calculada: uma busca binária, sem recalcular nada.
+    """
+    negativos = -dependencias['dependencia'].to_numpy()
+    corte = np.searchsorted(negativos, -limiar_percentual * 100, side='right')
+    return dependencias.iloc[:min(corte, limite)].reset_index(drop=True)
@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+
+from transacoes_compactas import mapear_ids
+
+# --- CONFIGURAÇÃO DOS SEGMENTOS ---
+# Chave do cubo com o total de todos os setores
+TODOS_OS_SETORES = "Todos os Setores"
+
+# Faixas de maturidade (idade em anos) usadas na Home
+FAIXAS_MATURIDADE = [0, 2, 5, 10, 100]
+ROTULOS_MATURIDADE = ['Startup (<2 anos)', 'Em Crescimento (2-5 anos)', 'Madura (5-10 anos)', 'Estabelecida (>10 anos)']
+# -----------------------------
+
+
+def _momento_predominante(contagem):
+    """Momento mais frequente (empates resolvidos como no Series.mode) e a sua fatia do total."""
+    if contagem.sum() == 0:
+        return None, 0.0
+    maximo = contagem.max()
+    return sorted(contagem[contagem == maximo].index)[0], maximo / contagem.sum()
+
+
+def _tipos_transacao_por_setor(trans, cnae_por_id):
+    """
+    Soma de vl por (setor, ds_tran), contando cada transação em que o pagador
+    OU o recebedor pertencem ao setor (uma vez só quando ambos pertencem).
+    """
+    cnae_pgto = mapear_ids(trans['id_pgto'], cnae_por_id).rename('ds_cnae')
+    cnae_rcbe = mapear_ids(trans['id_rcbe'], cnae_por_id).rename('ds_cnae')
+    vl = trans['vl'].astype('float64').rename('vl')
+    ds_tran = trans['ds_tran'].astype(object)
+
+    por_pagador = vl.groupby([cnae_pgto, ds_tran]).sum()
+    por_recebedor = vl.groupby([cnae_rcbe, ds_tran]).sum()
+    mesmo_setor = (cnae_pgto == cnae_rcbe).to_numpy()
+    em_dobro = vl[mesmo_setor].groupby([cnae_pgto[mesmo_setor], ds_tran[mesmo_setor]]).sum()
+
+    soma = por_pagador.add(por_recebedor, fill_value=0).sub(em_dobro, fill_value=0)
+    return soma.rename('vl').reset_index()
+
+
+def _segmento(perfil_setor, saldo_medio, tipos_transacao):
+    """Monta a entrada do cubo de um setor (ou do total)."""
+    contagem_momentos = perfil_setor['momento'].value_counts()
+    momento, fatia = _momento_predominante(contagem_momentos)
+
+    faixas = pd.cut(perfil_setor['idade'], bins=FAIXAS_MATURIDADE, labels=ROTULOS_MATURIDADE, right=False)
+    maturidade = perfil_setor.groupby(faixas, observed=True).agg(
+        receita_media=('receita_media_6m', 'mean')
+    ).rename_axis('faixa_maturidade').reset_index()
+
+    return {
+        'kpis': {
+            'total_empresas': int(perfil_setor['id'].nunique()),
+            'momento_predominante': momento,
+            'share_momento': float(fatia),
+            'saldo_medio': None if saldo_medio is None or np.isnan(saldo_medio) else float(saldo_medio),
+        },
+        'momentos': contagem_momentos.reset_index(),
+        'maturidade': maturidade,
+        'tipos_transacao': tipos_transacao.sort_values('vl', ascending=False).reset_index(drop=True),
+    }
+
+
+def construir_cubo_cnae(perfil, empresas, trans):
+    """
+    Pré-calcula, para cada setor (ds_cnae) e para o total, tudo o que a Home
+    mostra ao trocar de setor: KPIs, distribuição por momento, receita média
+    por faixa de maturidade e valor por tipo de transação.
+
+    Devolve um dicionário {ds_cnae: segmento}, com o total em TODOS_OS_SETORES.
+    """
+    cnae_por_id = perfil.drop_duplicates('id').set_index('id')['ds_cnae']
+
+    # Saldo da última linha de cada empresa, como no groupby("id")["vl_sldo"].last()
+    saldo_ultimo = empresas.groupby('id')['vl_sldo'].last()
+    saldo_por_setor = saldo_ultimo.groupby(saldo_ultimo.index.map(cnae_por_id)).mean().to_dict()
+
+    tipos = _tipos_transacao_por_setor(trans, cnae_por_id)
+    tipos_por_setor = {cnae: grupo[['ds_tran', 'vl']] for cnae, grupo in tipos.groupby('ds_cnae')}
+    vazio = pd.DataFrame({'ds_tran': pd.Series(dtype=object), 'vl': pd.Series(dtype='float64')})
+
+    cubo = {}
+    for cnae, perfil_setor in perfil.groupby('ds_cnae'):
+        cubo[cnae] = _segmento(perfil_setor, saldo_por_setor.get(cnae), tipos_por_setor.get(cnae, vazio))
+
+    tipos_total = trans['vl'].astype('float64').groupby(trans['ds_tran'].astype(object)).sum().rename_axis('ds_tran').reset_index()
+    cubo[TODOS_OS_SETORES] = _segmento(perfil, saldo_ultimo.mean() if len(saldo_ultimo) else None, tipos_total)
+    return cubo
+
+
+def comparativo_setores(perfil):
+    """Receita agregada e número de empresas por setor (visão entre setores da Home)."""
+    return perfil.groupby('ds_cnae').agg(
+        receita_total=('receita_media_6m', 'sum'),
+        numero_empresas=('id', 'count')
+    ).reset_index().sort_values('receita_total', ascending=False)
+
+
+# --- BENCHMARK POR SETOR E POR MOMENTO ---
+# Métricas do perfil comparadas na página de Momento da empresa
+METRICAS_BENCHMARK = ['receita_media_6m', 'despesa_media_6m', 'margem_media_6m', 'crescimento_receita_3m', 'volatilidade_receita']
+NIVEIS_BENCHMARK = ['ds_cnae', 'momento']
+PERCENTIS_BENCHMARK = [0.10, 0.25, 0.75, 0.90]
+
+
+def adicionar_percentis_setor(perfil, metricas=METRICAS_BENCHMARK):
+    """
+    Acrescenta ao perfil, para cada métrica, a posição percentual da empresa
+    dentro do seu setor (0 a 1; 1 = maior valor do setor), em colunas
+    'percentil_setor_<métrica>'.
+    """
+    grupos = perfil.groupby('ds_cnae', sort=False)[metricas]
+    percentis = grupos.rank(pct=True).add_prefix('percentil_setor_')
+    return pd.concat([perfil, percentis], axis=1)
+
+
+def tabela_benchmark(perfil, metricas=METRICAS_BENCHMARK):
+    """
+    Estatísticas de cada métrica por setor (ds_cnae) e por momento: contagem,
+    média, mediana e percentis. Uma linha por (nivel, grupo, metrica).
+    """
+    partes = []
+    for nivel in NIVEIS_BENCHMARK:
+        grupos = perfil.groupby(nivel)[metricas]
+        estatisticas = {
+            'contagem': grupos.count(),
+            'media': grupos.mean(),
+            'mediana': grupos.median(),
+        }
+        for q in PERCENTIS_BENCHMARK:
+            estatisticas[f'p{round(q * 100)}'] = grupos.quantile(q)
+
+        # colunas (estatística, métrica) → linhas (grupo, métrica)
+        tabela = pd.concat(estatisticas, axis=1).stack(level=1, future_stack=True)
+        tabela.index.names = ['grupo', 'metrica']
+        partes.append(tabela.reset_index().assign(nivel=nivel))
+
+    colunas = ['nivel', 'grupo', 'metrica', *estatisticas]
+    return pd.concat(partes, ignore_index=True)[colunas]
+
+
+def indexar_benchmark(tabela):
+    """
+    Dicionário {(nivel, grupo): estatísticas indexadas pela métrica}, para que
+    o benchmark de uma empresa seja uma busca direta, p.ex.
+    benchmark[('ds_cnae', cnae)].loc['receita_media_6m', 'mediana'].
+    """
+    return {
+        chave: grupo.drop(columns=['nivel', 'grupo']).set_index('metrica')
+        for chave, grupo in tabela.groupby(['nivel', 'grupo'], sort=False)
+    }
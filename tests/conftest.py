@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+# Os módulos do projeto ficam na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Os testes não escrevem no log de métricas (instrumentacao.py)
+os.environ.setdefault("INSTRUMENTACAO", "0")
+
+
+@pytest.fixture(scope="session")
+def bases():
+    """(empresas, transacoes) sintéticas e reprodutíveis, já no layout das planilhas (benchmarks/dados_sinteticos.py)."""
+    from benchmarks.dados_sinteticos import gerar_bases
+
+    return gerar_bases(200, transacoes_por_empresa=15, meses=12, seed=7)
+
+
+@pytest.fixture(scope="session")
+def transacoes(bases):
+    return bases[1]
+
+
+@pytest.fixture(scope="session")
+def base_mensal(transacoes):
+    from utils import features_cashflow
+
+    return features_cashflow(transacoes)
@@ -0,0 +1,53 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ServidorOpenAIStub:
+    """
+    Servidor HTTP local que imita o endpoint /chat/completions da OpenAI.
+    Responde "resposta <n>" ao n-ésimo pedido e guarda o corpo de cada pedido
+    em `pedidos`. Aponte OPENAI_BASE_URL para `url` (porta livre escolhida
+    pelo SO).
+
+        with ServidorOpenAIStub() as servidor:
+            os.environ["OPENAI_BASE_URL"] = servidor.url
+    """
+
+    def __init__(self):
+        self.pedidos = []
+        self._trava = threading.Lock()
+        servidor = self
+
+        class Tratador(BaseHTTPRequestHandler):
+            def do_POST(self):
+                corpo = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with servidor._trava:
+                    servidor.pedidos.append(corpo)
+                    numero = len(servidor.pedidos)
+                resposta = json.dumps({
+                    "id": f"stub-{numero}", "object": "chat.completion", "created": 0, "model": corpo["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": f" resposta {numero} "}}],
+                    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(resposta)))
+                self.end_headers()
+                self.wfile.write(resposta)
+
+            def log_message(self, *args):
+                pass
+
+        self._http = ThreadingHTTPServer(("127.0.0.1", 0), Tratador)
+        self.url = f"http://127.0.0.1:{self._http.server_port}/v1"
+
+    def __enter__(self):
+        threading.Thread(target=self._http.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._http.shutdown()
+        self._http.server_close()
+        return False
@@ -0,0 +1,60 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from base_incremental import BaseIncremental
+from utils import _perfil_financeiro, features_cashflow
+
+
+def _comparar(motor, transacoes):
+    base = features_cashflow(transacoes).reset_index(drop=True)
+    pd.testing.assert_frame_equal(motor.base, base, rtol=1e-9)
+    pd.testing.assert_frame_equal(motor.perfil_financeiro, _perfil_financeiro(base), rtol=1e-9)
+
+
+def test_lotes_somados_iguais_ao_recalculo_completo(transacoes):
+    corte = int(len(transacoes) * 0.8)
+    motor = BaseIncremental.de_transacoes(transacoes.iloc[:corte])
+
+    afetados = motor.adicionar_transacoes(transacoes.iloc[corte:])
+
+    _comparar(motor, transacoes)
+    novas = transacoes.iloc[corte:]
+    esperados = set(novas['id_pgto'].dropna()) | set(novas['id_rcbe'].dropna())
+    assert set(afetados) == esperados
+
+
+def test_lote_vazio_nao_muda_nada(transacoes):
+    motor = BaseIncremental.de_transacoes(transacoes)
+    afetados = motor.adicionar_transacoes(transacoes.iloc[:0])
+
+    assert len(afetados) == 0
+    assert afetados.dtype == motor.base['id'].dtype
+    _comparar(motor, transacoes)
+
+
+def test_sincronizar_soma_so_as_linhas_novas(transacoes, tmp_path, monkeypatch):
+    pasta = tmp_path / "base_incremental"
+    corte = len(transacoes) - 500
+
+    BaseIncremental.sincronizar(transacoes.iloc[:corte], str(pasta))
+    assert json.loads((pasta / "estado.json").read_text())["linhas"] == corte
+
+    # Com o estado gravado, a base não é refeita do zero
+    def recalculo_completo(trans):
+        raise AssertionError("recalculou a base inteira")
+    monkeypatch.setattr(BaseIncremental, "de_transacoes", staticmethod(recalculo_completo))
+    motor = BaseIncremental.sincronizar(transacoes, str(pasta))
+    monkeypatch.undo()
+    _comparar(motor, transacoes)
+    assert json.loads((pasta / "estado.json").read_text())["linhas"] == len(transacoes)
+
+
+def test_sincronizar_refaz_tudo_quando_linhas_antigas_mudam(transacoes, tmp_path):
+    pasta = str(tmp_path / "base_incremental")
+    BaseIncremental.sincronizar(transacoes, pasta)
+
+    alteradas = transacoes.copy()
+    alteradas['vl'] = alteradas['vl'].to_numpy() * np.float32(2)
+    _comparar(BaseIncremental.sincronizar(alteradas, pasta), alteradas)
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from transacoes_compactas import data_de_mes, mes_ordinal
+from utils import features_cashflow, features_cashflow_streaming, prever_fluxo_caixa
+
+
+def _base_de_referencia(trans):
+    """A base mensal calculada à moda antiga: groupby sobre o mês em texto 'AAAA-MM'."""
+    df = pd.DataFrame({
+        'id_pgto': trans['id_pgto'].astype(object),
+        'id_rcbe': trans['id_rcbe'].astype(object),
+        'vl': trans['vl'].astype('float64'),
+        'ano_mes': trans['dt_refe'].dt.strftime('%Y-%m'),
+    })
+    receita = df.groupby(['id_rcbe', 'ano_mes'])['vl'].sum().rename('receita').rename_axis(['id', 'ano_mes'])
+    despesa = df.groupby(['id_pgto', 'ano_mes'])['vl'].sum().rename('despesa').rename_axis(['id', 'ano_mes'])
+    base = pd.concat([receita, despesa], axis=1).fillna(0).reset_index()
+    base['fluxo_liq'] = base['receita'] - base['despesa']
+    base['margem'] = (base['fluxo_liq'] / base['receita'].replace(0, np.nan)).fillna(0)
+    return base.sort_values(['id', 'ano_mes']).reset_index(drop=True)
+
+
+def test_mes_ordinal_e_data_de_mes_sao_inversos():
+    datas = pd.Series(pd.date_range('1965-03-01', '2099-12-01', freq='MS'))
+    ordinais = mes_ordinal(datas + pd.Timedelta(days=17))
+
+    assert ordinais.dtype == np.int32
+    assert (np.diff(ordinais) == 1).all()
+    assert ordinais.iloc[0] == (1965 - 1970) * 12 + 2
+    assert data_de_mes(ordinais).equals(pd.DatetimeIndex(datas))
+
+
+def test_base_com_ordinais_igual_a_base_com_texto(transacoes, base_mensal):
+    referencia = _base_de_referencia(transacoes)
+    base = base_mensal.reset_index(drop=True)
+
+    assert base['ano_mes'].dtype == np.int32
+    assert list(base.columns) == list(referencia.columns)
+    pd.testing.assert_series_equal(base['id'].astype(object), referencia['id'], check_names=False)
+    assert (data_de_mes(base['ano_mes']).strftime('%Y-%m') == referencia['ano_mes']).all()
+    for coluna in ('receita', 'despesa', 'fluxo_liq', 'margem'):
+        np.testing.assert_allclose(base[coluna], referencia[coluna], rtol=1e-9, atol=1e-6)
+
+
+def test_streaming_em_pedacos_igual_a_base_inteira(transacoes, base_mensal):
+    pedacos = (transacoes.iloc[i:i + 700] for i in range(0, len(transacoes), 700))
+    streaming = features_cashflow_streaming(pedacos).reset_index(drop=True)
+
+    assert streaming['ano_mes'].dtype == np.int32
+    pd.testing.assert_frame_equal(streaming, base_mensal.reset_index(drop=True), rtol=1e-9)
+
+
+def test_streaming_sem_pedacos_devolve_base_vazia_tipada():
+    vazia = features_cashflow_streaming([])
+    assert vazia.empty
+    assert list(vazia.columns) == ['id', 'ano_mes', 'receita', 'despesa', 'fluxo_liq', 'margem']
+    assert vazia['ano_mes'].dtype == np.int32
+
+
+def test_previsao_continua_nos_meses_seguintes(base_mensal):
+    historico = base_mensal[base_mensal['id'] == base_mensal['id'].iloc[0]]
+    previsao = prever_fluxo_caixa(historico, 'receita', periodos_futuros=4)
+
+    assert previsao['ano_mes'].dtype == np.int32
+    ultimo = historico['ano_mes'].max()
+    assert previsao['ano_mes'].tolist() == list(range(ultimo + 1, ultimo + 5))
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from comunidades import _herdar_numeros, cor_comunidade, obter_comunidades
+from grafo_local import GrafoLocal
+from transacoes_compactas import compactar_transacoes
+
+
+def test_herdar_numeros_em_divisao_juncao_e_comunidade_nova():
+    # Rótulos do Louvain: 'a' junta as comunidades 3 (3 empresas) e 5 (1);
+    # 'b' e 'c' dividem a 7 (2 + 1 empresas); 'd' só tem uma empresa nova
+    novos = np.array(['a', 'a', 'a', 'a', 'b', 'b', 'c', 'd'])
+    anteriores = np.array([3, 3, 3, 5, 7, 7, 7, -1])
+    ids = np.array(['e1', 'e2', 'e3', 'e4', 'e5', 'e6', 'e7', 'e8'])
+
+    numeros = _herdar_numeros(novos, anteriores, ids, proximo=8)
+
+    # A junção fica com o número de quem trouxe mais empresas e a maior parte
+    # da divisão mantém o seu; as restantes recebem números novos (maior primeiro)
+    np.testing.assert_array_equal(numeros, [3, 3, 3, 3, 7, 7, 8, 9])
+
+
+def _com_transacoes_novas(transacoes, empresas, pares):
+    """GrafoLocal das transações mais um pagamento novo por par (pagador, recebedor)."""
+    texto = transacoes.astype({'id_pgto': object, 'id_rcbe': object, 'ds_tran': object})
+    novas = pd.DataFrame({
+        'id_pgto': [pagador for pagador, _ in pares],
+        'id_rcbe': [recebedor for _, recebedor in pares],
+        'vl': 5000.0,
+        'dt_refe': pd.Timestamp('2023-06-15'),
+        'ds_tran': 'PIX',
+    })
+    return GrafoLocal(compactar_transacoes(pd.concat([texto, novas], ignore_index=True)), empresas)
+
+
+def test_atualizacao_incremental_mantem_numeros_e_cores(bases, tmp_path):
+    empresas, transacoes = bases
+    pasta = str(tmp_path / "comunidades")
+    antes = obter_comunidades(GrafoLocal(transacoes, empresas), pasta=pasta)
+
+    # Duas arestas novas dentro de uma só comunidade
+    tocada = antes.value_counts().index[2]
+    membros = antes[antes == tocada].index[:4]
+    grafo = _com_transacoes_novas(transacoes, empresas, [(membros[0], membros[1]), (membros[2], membros[3])])
+    depois = obter_comunidades(grafo, pasta=pasta)
+
+    assert depois.index.equals(antes.index)
+    # As empresas das outras comunidades ficam com o mesmo número e a mesma cor
+    intactas = antes != tocada
+    pd.testing.assert_series_equal(depois[intactas], antes[intactas])
+    assert (depois[intactas].map(cor_comunidade) == antes[intactas].map(cor_comunidade)).all()
+
+    # Na comunidade refeita, a maior parte herda o número; as outras partes
+    # recebem números que ainda não existiam
+    partes = depois[antes == tocada].value_counts()
+    assert partes.index[0] == tocada
+    assert (partes.index[1:] > antes.max()).all()
+
+    # Sem mudanças, a partição é lida do disco tal como ficou
+    pd.testing.assert_series_equal(obter_comunidades(grafo, pasta=pasta), depois)
@@ -0,0 +1,65 @@
+import importlib
+
+import pytest
+
+from stub_openai import ServidorOpenAIStub
+
+PERFIL = {
+    'id': 'E1', 'momento': 'Início', 'ds_cnae': 'Comércio', 'receita_media_6m': 1000.0,
+    'margem_media_6m': 0.1, 'crescimento_receita_3m': 5.0,
+}
+MEDIA_SETOR = {'receita_media_6m': 800.0, 'margem_media_6m': 0.05}
+
+
+@pytest.fixture(scope="module")
+def ia(tmp_path_factory):
+    """consulta_ia e diagnosticos_ia ligados ao stub via OPENAI_BASE_URL, com o cache num diretório temporário."""
+    with ServidorOpenAIStub() as servidor, pytest.MonkeyPatch.context() as mp:
+        mp.setenv("OPENAI_BASE_URL", servidor.url)
+        mp.setenv("API_KEY", "chave-de-teste")
+        mp.setenv("CACHE_IA_PATH", str(tmp_path_factory.mktemp("ia") / "respostas.sqlite"))
+        # Cliente, endereço e caminho do cache são lidos na importação
+        consulta_ia = importlib.reload(importlib.import_module("consulta_ia"))
+        diagnosticos_ia = importlib.reload(importlib.import_module("diagnosticos_ia"))
+        yield servidor, consulta_ia, diagnosticos_ia
+
+
+def test_pedido_vai_ao_stub_e_fica_em_cache(ia):
+    servidor, consulta_ia, _ = ia
+    antes = len(servidor.pedidos)
+
+    resposta = consulta_ia.retorna_informacao_empresas(PERFIL, MEDIA_SETOR)
+    assert resposta == f"resposta {antes + 1}"
+    assert servidor.pedidos[-1]["model"] == consulta_ia.MODELO
+    assert servidor.pedidos[-1]["max_tokens"] == 250
+
+    # O mesmo pedido sai do cache SQLite, sem nova chamada
+    assert consulta_ia.retorna_informacao_empresas(PERFIL, MEDIA_SETOR) == resposta
+    assert len(servidor.pedidos) == antes + 1
+
+
+def test_pedido_assincrono_no_loop_da_ia(ia):
+    servidor, consulta_ia, _ = ia
+    perfil = {**PERFIL, 'id': 'E2'}
+    futuro = consulta_ia.em_segundo_plano(consulta_ia.retorna_informacao_empresas_async(perfil, MEDIA_SETOR))
+    assert futuro.result(timeout=30) == f"resposta {len(servidor.pedidos)}"
+
+
+def test_diagnostico_gravado_por_versao(ia, tmp_path):
+    servidor, consulta_ia, diagnosticos_ia = ia
+    caminho = str(tmp_path / "diagnosticos.sqlite")
+    pedido = consulta_ia._pedido_informacao_empresas({**PERFIL, 'id': 'E3'}, MEDIA_SETOR)
+
+    def obter(versao):
+        corrotina = diagnosticos_ia.obter_diagnostico_async('E3', 'momento', versao, pedido, caminho)
+        return consulta_ia.em_segundo_plano(corrotina).result(timeout=30)
+
+    texto = obter('v1')
+    assert diagnosticos_ia.ler_diagnostico('E3', 'momento', 'v1', caminho) == texto
+    assert diagnosticos_ia.empresas_atualizadas('momento', 'v1', caminho) == {'E3'}
+    # Outra versão dos dados não reaproveita o texto guardado
+    assert diagnosticos_ia.ler_diagnostico('E3', 'momento', 'v2', caminho) is None
+
+    antes = len(servidor.pedidos)
+    assert obter('v1') == texto
+    assert len(servidor.pedidos) == antes
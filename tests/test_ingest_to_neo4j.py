@@ -0,0 +1,143 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("neo4j")
+
+import ingest_to_neo4j
+from data_loader import NOME_PLANILHA_EMPRESAS
+from ingest_to_neo4j import _fatias, _preparar_transacoes, gerar_lotes, ingerir
+
+
+class _BancoFalso:
+    """
+    Neo4j em memória para a carga: guarda as empresas, as relações PAGOU_PARA
+    por chave (com o MERGE da query) e as PAGOU_PARA_TOTAL por par. Com
+    falhar_no_lote=n, o n-ésimo lote de transações falha uma vez.
+    """
+
+    def __init__(self, falhar_no_lote=None):
+        self.empresas = set()
+        self.pagamentos = {}
+        self.totais = {}
+        self.lotes_recebidos = 0
+        self.limpezas = 0
+        self.falhar_no_lote = falhar_no_lote
+        self._trava = threading.Lock()
+
+    # Driver, sessão e transação são o mesmo objeto
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+    def session(self, database=None):
+        return self
+
+    def execute_write(self, funcao, *args):
+        return funcao(self, *args)
+
+    def run(self, query, rows=()):
+        with self._trava:
+            if "DETACH DELETE" in query:
+                self.limpezas += 1
+                self.empresas.clear()
+                self.pagamentos.clear()
+                self.totais.clear()
+            elif "MERGE (e:Empresa" in query:
+                self.empresas.update(row["id"] for row in rows)
+            elif "PAGOU_PARA {chave" in query:
+                self.lotes_recebidos += 1
+                if self.lotes_recebidos == self.falhar_no_lote:
+                    raise RuntimeError("conexão perdida")
+                novas = [row for row in rows if row["chave"] not in self.pagamentos]
+                self.pagamentos.update((row["chave"], row) for row in novas)
+                return [{"chave": row["chave"]} for row in novas]
+            elif "PAGOU_PARA_TOTAL" in query:
+                for row in rows:
+                    valor, n = self.totais.get((row["id_pgto"], row["id_rcbe"]), (0.0, 0))
+                    self.totais[(row["id_pgto"], row["id_rcbe"])] = (valor + row["valor_total"], n + row["n_transacoes"])
+            return []
+
+
+@pytest.fixture(scope="module")
+def carga(bases):
+    """600 transações (a primeira repetida no fim, como um segundo pagamento igual) e as empresas."""
+    empresas, transacoes = bases
+    trans = pd.concat([transacoes.iloc[:599], transacoes.iloc[:1]], ignore_index=True)
+    return empresas, trans
+
+
+def _preparar_com(monkeypatch, banco, empresas, trans):
+    def ler_planilha(nome_planilha, colunas=None):
+        return empresas if nome_planilha == NOME_PLANILHA_EMPRESAS else trans
+
+    monkeypatch.setattr(ingest_to_neo4j, "ler_planilha", ler_planilha)
+    monkeypatch.setattr(ingest_to_neo4j, "versao_workbook", lambda caminho: f"{len(trans):064d}")
+    monkeypatch.setattr(ingest_to_neo4j.GraphDatabase, "driver", lambda uri, auth: banco)
+
+
+def _chaves(trans, tamanho_lote):
+    ocorrencias = {}
+    lotes = gerar_lotes(_fatias(trans, tamanho_lote), lambda bloco: _preparar_transacoes(bloco, ocorrencias))
+    return [registro["chave"] for _, registros in lotes for registro in registros]
+
+
+def test_chaves_nao_dependem_dos_lotes_nem_da_posicao(carga):
+    _, trans = carga
+    chaves = _chaves(trans, 100)
+
+    assert len(set(chaves)) == len(trans)
+    assert _chaves(trans, 37) == chaves == _chaves(trans, len(trans))
+    # Um arquivo com as mesmas linhas no início dá as mesmas chaves a essas linhas
+    assert _chaves(trans.iloc[:250], 100) == chaves[:250]
+    # O pagamento repetido fica com o mesmo hash e a ocorrência seguinte
+    assert chaves[0].endswith(":0") and chaves[-1] == chaves[0][:-1] + "1"
+    assert [numero for numero, _ in gerar_lotes(_fatias(trans, 250), len)] == [0, 1, 2]
+
+
+def _conferir(banco, trans):
+    assert len(banco.pagamentos) == len(trans)
+    assert sum(n for _, n in banco.totais.values()) == len(trans)
+    np.testing.assert_allclose(sum(valor for valor, _ in banco.totais.values()), trans['vl'].astype('float64').sum())
+
+
+def test_carga_interrompida_continua_do_checkpoint(carga, monkeypatch, tmp_path):
+    empresas, trans = carga
+    checkpoint = str(tmp_path / "ingestao.json")
+    banco = _BancoFalso(falhar_no_lote=4)
+    _preparar_com(monkeypatch, banco, empresas, trans)
+
+    with pytest.raises(RuntimeError):
+        ingerir(tamanho_lote=50, n_sessoes=2, caminho_checkpoint=checkpoint)
+    assert os.path.exists(checkpoint)
+    carregadas = len(banco.pagamentos)
+    assert 0 < carregadas < len(trans)
+
+    recebidos = banco.lotes_recebidos
+    ingerir(tamanho_lote=50, n_sessoes=2, caminho_checkpoint=checkpoint)
+
+    # Não limpou a base de novo e só enviou os lotes que faltavam
+    assert banco.limpezas == 1
+    assert banco.lotes_recebidos - recebidos == (len(trans) - carregadas) // 50
+    assert not os.path.exists(checkpoint)
+    _conferir(banco, trans)
+
+
+def test_incremental_com_o_arquivo_acumulado_so_soma_as_novas(carga, monkeypatch, tmp_path):
+    empresas, trans = carga
+    checkpoint = str(tmp_path / "ingestao.json")
+    banco = _BancoFalso()
+
+    _preparar_com(monkeypatch, banco, empresas, trans.iloc[:400])
+    ingerir(tamanho_lote=64, n_sessoes=3, caminho_checkpoint=checkpoint)
+    _conferir(banco, trans.iloc[:400])
+
+    _preparar_com(monkeypatch, banco, empresas, trans)
+    ingerir(tamanho_lote=64, n_sessoes=3, caminho_checkpoint=checkpoint, incremental=True)
+    assert banco.limpezas == 1
+    _conferir(banco, trans)
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from matriz_mensal import MatrizMensal, desvio_movel, media_movel
+from utils import _perfil_financeiro
+
+
+@pytest.fixture(scope="module")
+def matriz(base_mensal):
+    return MatrizMensal.de_base(base_mensal)
+
+
+def test_perfil_financeiro_igual_ao_da_base_longa(matriz, base_mensal):
+    esperado = _perfil_financeiro(base_mensal).sort_values('id').reset_index(drop=True)
+    obtido = matriz.perfil_financeiro()
+
+    assert list(obtido.columns) == list(esperado.columns)
+    pd.testing.assert_frame_equal(obtido, esperado, check_dtype=False, rtol=1e-9, atol=1e-6)
+
+
+def test_de_transacoes_igual_a_de_base(matriz, transacoes):
+    direta = MatrizMensal.de_transacoes(transacoes)
+
+    assert direta.ids.equals(matriz.ids)
+    np.testing.assert_array_equal(direta.meses, matriz.meses)
+    np.testing.assert_array_equal(direta.mascara, matriz.mascara)
+    for metrica in ('receita', 'despesa', 'fluxo_liq'):
+        np.testing.assert_allclose(direta[metrica], matriz[metrica], rtol=1e-9, atol=1e-6)
+
+
+def test_historico_igual_as_linhas_da_base(matriz, base_mensal):
+    for empresa_id in base_mensal['id'].unique()[:20]:
+        linhas = base_mensal[base_mensal['id'] == empresa_id].sort_values('ano_mes')
+        esperado = linhas[['ano_mes', 'receita', 'despesa', 'fluxo_liq']].reset_index(drop=True)
+        pd.testing.assert_frame_equal(matriz.historico(empresa_id), esperado)
+
+    vazio = matriz.historico('id-que-nao-existe')
+    assert vazio.empty and list(vazio.columns) == ['ano_mes', 'receita', 'despesa', 'fluxo_liq']
+
+
+def test_janelas_moveis_iguais_ao_rolling(matriz):
+    receita = matriz['receita']
+    rolling = pd.DataFrame(receita.T).rolling(3)
+    np.testing.assert_allclose(media_movel(receita, 3), rolling.mean().to_numpy().T, equal_nan=True)
+    np.testing.assert_allclose(desvio_movel(receita, 3), rolling.std().to_numpy().T, equal_nan=True, atol=1e-6)
+
+    # Com máscara, só os meses observados de cada janela contam; as primeiras
+    # janela - 1 colunas (janelas incompletas) ficam NaN
+    observados = pd.DataFrame(np.where(matriz.mascara, receita, np.nan).T)
+    media = observados.rolling(3, min_periods=1).mean().to_numpy().T
+    desvio = observados.rolling(3, min_periods=2).std().to_numpy().T
+    media[:, :2] = desvio[:, :2] = np.nan
+    np.testing.assert_allclose(media_movel(receita, 3, matriz.mascara), media, equal_nan=True, atol=1e-6)
+    np.testing.assert_allclose(desvio_movel(receita, 3, matriz.mascara), desvio, equal_nan=True, atol=1e-6)
+
+
+def test_salvar_e_carregar_com_memory_map(matriz, tmp_path):
+    matriz.salvar(tmp_path / "matriz")
+    reaberta = MatrizMensal.carregar(tmp_path / "matriz")
+
+    assert isinstance(reaberta['receita'], np.memmap)
+    assert reaberta.ids.equals(matriz.ids)
+    np.testing.assert_array_equal(reaberta.meses, matriz.meses)
+    np.testing.assert_array_equal(reaberta.mascara, matriz.mascara)
+    np.testing.assert_array_equal(reaberta['fluxo_liq'], matriz['fluxo_liq'])
+    pd.testing.assert_frame_equal(reaberta.perfil_financeiro(), matriz.perfil_financeiro())
+
+
+def test_janela_maior_do_que_o_historico_fica_toda_nan(matriz):
+    receita = matriz['receita']
+    janela = receita.shape[1] + 1
+
+    for estatistica in (media_movel(receita, janela), desvio_movel(receita, janela),
+                        media_movel(receita, janela, matriz.mascara), desvio_movel(receita, janela, matriz.mascara)):
+        assert estatistica.shape == receita.shape
+        assert np.isnan(estatistica).all()
+
+    with pytest.raises(ValueError, match="janela"):
+        media_movel(receita, 0)
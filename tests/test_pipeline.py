@@ -0,0 +1,89 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import pipeline
+from cluster_incremental import obter_clusterizador
+from data_loader import NOME_PLANILHA_EMPRESAS, NOME_PLANILHA_TRANSACOES
+from previsao import CAMINHO_PREVISOES, prever_com_modelos, salvar_tabela, versao_tabela
+from transacoes_compactas import compactar_transacoes
+from utils import CNAE_NAO_INFORMADO, features_cashflow
+
+
+@pytest.fixture
+def workbook_com_contraparte_de_fora(bases, tmp_path, monkeypatch):
+    """As bases sintéticas mais duas transações com a empresa 999, que não está na base de empresas."""
+    empresas, transacoes = bases
+    existente = transacoes['id_pgto'].iloc[0]
+    fora = pd.DataFrame({
+        'id_pgto': [existente, '999'],
+        'id_rcbe': ['999', existente],
+        'vl': [1500.0, 320.5],
+        'dt_refe': pd.to_datetime(['2023-03-10', '2023-04-02']),
+        'ds_tran': ['PIX', 'TED'],
+    })
+    texto = transacoes.astype({'id_pgto': object, 'id_rcbe': object, 'ds_tran': object})
+    trans = compactar_transacoes(pd.concat([texto, fora], ignore_index=True))
+
+    def ler_planilha(nome_planilha, colunas=None):
+        df = empresas if nome_planilha == NOME_PLANILHA_EMPRESAS else trans
+        return df.copy() if colunas is None else df[colunas].copy()
+
+    # Os caches relativos (modelo de clusters, comunidades) ficam na pasta temporária
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pipeline, "ler_planilha", ler_planilha)
+    monkeypatch.setattr(pipeline, "PASTA_BASE_INCREMENTAL", str(tmp_path / "base_incremental"))
+    yield tmp_path
+    # O reajuste em segundo plano grava no caminho relativo: espera antes de sair da pasta
+    obter_clusterizador().aguardar()
+
+
+def test_pipeline_com_contraparte_fora_da_base_de_empresas(workbook_com_contraparte_de_fora):
+    pasta = workbook_com_contraparte_de_fora / "pipeline"
+    destino, _ = pipeline.construir_artefatos("teste-v0", str(pasta))
+
+    perfil = pd.read_parquet(os.path.join(destino, "perfil.parquet"))
+    fora = perfil.loc[perfil['id'] == '999'].iloc[0]
+    assert fora['ds_cnae'] == CNAE_NAO_INFORMADO
+    assert fora['idade'] == 0
+    assert perfil['ds_cnae'].map(type).eq(str).all()
+
+    benchmark = pd.read_parquet(os.path.join(destino, "benchmark.parquet"))
+    assert CNAE_NAO_INFORMADO in set(benchmark['grupo'])
+    with open(os.path.join(destino, "manifesto.json"), encoding="utf-8") as f:
+        assert json.load(f)["empresas"] == perfil['id'].nunique()
+
+
+def _tabela_do_job(trans, deslocamento):
+    """Tabela como a do job em lote (python previsao.py), com a receita deslocada para se distinguir da do pipeline."""
+    base = features_cashflow(trans)
+    previsoes = prever_com_modelos(base, n_processos=1)[0]
+    previsoes['receita'] += deslocamento
+    salvar_tabela(previsoes, versao_tabela(base), CAMINHO_PREVISOES)
+    return previsoes
+
+
+def _receita(previsoes):
+    return previsoes.reset_index().sort_values(['modelo', 'id', 'passo'])['receita'].to_numpy()
+
+
+def test_pipeline_usa_a_tabela_do_job_calculada_sobre_a_mesma_base(workbook_com_contraparte_de_fora):
+    pasta = str(workbook_com_contraparte_de_fora / "pipeline")
+    trans = pipeline.ler_planilha(NOME_PLANILHA_TRANSACOES)
+
+    # Tabela do job gravada antes do build: é copiada em vez de recalculada
+    antes = _tabela_do_job(trans, 1000.0)
+    destino, _ = pipeline.construir_artefatos("teste-v0", pasta)
+    copiada = pd.read_parquet(os.path.join(destino, "previsoes.parquet"))
+    np.testing.assert_array_equal(_receita(copiada), _receita(antes))
+
+    # Tabela do job recalculada depois do build: carregar_artefatos prefere-a
+    depois = _tabela_do_job(trans, 2000.0)
+    np.testing.assert_array_equal(_receita(pipeline.carregar_artefatos("teste-v0", pasta)["previsoes"]), _receita(depois))
+
+    # Tabela do job de outra base: fica a dos artefatos
+    _tabela_do_job(trans.iloc[:-10], 3000.0)
+    np.testing.assert_array_equal(_receita(pipeline.carregar_artefatos("teste-v0", pasta)["previsoes"]), _receita(antes))
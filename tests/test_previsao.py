@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from previsao import (HORIZONTE_MAXIMO, MODELOS, ModeloHoltWinters, ModeloLinear, ModeloPrevisao, ModeloSazonalIngenuo,
+                      _em_blocos, carregar_tabela, consultar_previsao, obter_modelo, prever_com_modelos,
+                      prever_portfolio, salvar_tabela, versao_tabela, versao_tabela_gravada)
+
+
+@pytest.fixture(scope="module")
+def previsoes(base_mensal):
+    return prever_com_modelos(base_mensal, n_processos=1)[0]
+
+
+def test_tabela_tem_todos_os_passos_de_cada_empresa(previsoes, base_mensal):
+    ultimo_mes = base_mensal.groupby('id')['ano_mes'].max()
+
+    for nome in MODELOS:
+        tabela = previsoes[previsoes['modelo'] == nome]
+        assert len(tabela) == base_mensal['id'].nunique() * HORIZONTE_MAXIMO
+        passos = tabela.groupby('id')['passo'].apply(list)
+        assert passos.map(lambda p: p == list(range(1, HORIZONTE_MAXIMO + 1))).all()
+        # O passo h é o mês h depois do último mês observado da empresa
+        np.testing.assert_array_equal(tabela['ano_mes'], tabela['id'].map(ultimo_mes) + tabela['passo'])
+        np.testing.assert_allclose(tabela['fluxo_liq'], tabela['receita'] - tabela['despesa'])
+
+
+def test_base_vazia_devolve_tabela_vazia(base_mensal):
+    vazia = prever_portfolio(base_mensal.iloc[:0])
+    cheia = prever_portfolio(base_mensal)
+
+    assert vazia.empty
+    pd.testing.assert_series_equal(vazia.dtypes, cheia.dtypes)
+
+
+def test_salvar_e_carregar_guardam_versao_e_hora(previsoes, base_mensal, tmp_path):
+    caminho = str(tmp_path / "previsoes.parquet")
+    assert versao_tabela_gravada(caminho) is None
+
+    versao = versao_tabela(base_mensal)
+    calculado_em = salvar_tabela(previsoes, versao, caminho)
+    carregadas, versao_lida, calculado_lido = carregar_tabela(caminho)
+
+    assert versao_lida == versao_tabela_gravada(caminho) == versao
+    assert calculado_lido == calculado_em
+    assert pd.Timestamp(calculado_em) <= pd.Timestamp.now()
+    assert carregadas.index.is_monotonic_increasing
+    esperadas = previsoes.sort_values('id', kind='stable').set_index('id')
+    pd.testing.assert_frame_equal(carregadas, esperadas)
+
+
+def test_consulta_por_empresa_corta_no_horizonte(previsoes, base_mensal, tmp_path):
+    caminho = str(tmp_path / "previsoes.parquet")
+    salvar_tabela(previsoes, versao_tabela(base_mensal), caminho)
+    indexadas = carregar_tabela(caminho)[0]
+    empresa_id = base_mensal['id'].iloc[-1]
+
+    for horizonte in (3, 7, HORIZONTE_MAXIMO):
+        consulta = consultar_previsao(indexadas, empresa_id, horizonte, modelo='holt_winters')
+        esperada = previsoes[(previsoes['id'] == empresa_id) & (previsoes['modelo'] == 'holt_winters')
+                             & (previsoes['passo'] <= horizonte)]
+        assert consulta['passo'].tolist() == list(range(1, horizonte + 1))
+        pd.testing.assert_frame_equal(consulta, esperada.drop(columns='id').reset_index(drop=True))
+
+    with pytest.raises(KeyError):
+        consultar_previsao(indexadas, 'id-que-nao-existe', 3)
+
+
+def _serie(y, passos=12, inicio=0):
+    """Uma empresa em matriz, no formato de prever_bloco: meses 0..n-1 observados a partir de `inicio`."""
+    y = np.atleast_2d(np.asarray(y, dtype='float64'))
+    mascara = np.zeros_like(y, dtype=bool)
+    mascara[:, inicio:] = True
+    n_meses = y.shape[1]
+    x = np.broadcast_to(np.arange(n_meses) * 30.0, y.shape)
+    x_futuro = np.broadcast_to((n_meses + np.arange(passos)) * 30.0, (len(y), passos))
+    return np.where(mascara, y, 0.0), mascara, x, x_futuro
+
+
+def test_modelos_registados():
+    assert set(MODELOS) == {'linear', 'sazonal_ingenuo', 'holt_winters'}
+    for nome, classe in MODELOS.items():
+        assert issubclass(classe, ModeloPrevisao) and classe.nome == nome and classe.descricao
+        assert isinstance(obter_modelo(nome), classe)
+    instancia = ModeloHoltWinters(periodo=4)
+    assert obter_modelo(instancia) is instancia
+
+
+def test_linear_reproduz_uma_reta():
+    t = np.arange(10)
+    previsao = ModeloLinear().prever_bloco(*_serie(50 + 3 * t, passos=4))
+    np.testing.assert_allclose(previsao, [50 + 3 * np.arange(10, 14)])
+
+
+def test_sazonal_ingenuo_repete_o_ciclo_anterior():
+    y = np.arange(30, dtype='float64')
+    previsao = ModeloSazonalIngenuo().prever_bloco(*_serie(y, passos=15))
+    np.testing.assert_array_equal(previsao[0], np.r_[y[18:30], y[18:21]])
+
+    # Menos de um ciclo de histórico: repete o último valor observado
+    curta = ModeloSazonalIngenuo().prever_bloco(*_serie(np.arange(8.0), passos=3, inicio=2))
+    np.testing.assert_array_equal(curta, [[7.0, 7.0, 7.0]])
+
+
+def test_holt_winters_acerta_tendencia_e_sazonalidade_sem_ruido():
+    t = np.arange(48)
+    serie = 100 + 2 * t + 10 * np.sin(2 * np.pi * t / 12)
+    previsao = ModeloHoltWinters().prever_bloco(*_serie(serie[:36], passos=12))
+    np.testing.assert_allclose(previsao[0], serie[36:], atol=1e-9)
+
+    # Histórico a começar a meio da matriz, fora de fase com as colunas
+    deslocada = np.r_[np.zeros(5), serie[:31]]
+    previsao = ModeloHoltWinters().prever_bloco(*_serie(deslocada, passos=12, inicio=5))
+    np.testing.assert_allclose(previsao[0], serie[31:43], atol=1e-9)
+
+
+def test_holt_winters_sem_ciclos_suficientes():
+    # Entre 4 meses e dois ciclos: só a tendência (Holt)
+    t = np.arange(10)
+    previsao = ModeloHoltWinters().prever_bloco(*_serie(20 + 5 * t, passos=3))
+    np.testing.assert_allclose(previsao, [20 + 5 * np.arange(10, 13)], atol=1e-9)
+
+    # Menos de 4 meses: repete o último valor
+    previsao = ModeloHoltWinters().prever_bloco(*_serie([1.0, 4.0, 2.0], passos=3))
+    np.testing.assert_array_equal(previsao, [[2.0, 2.0, 2.0]])
+
+
+def test_blocos_em_paralelo_iguais_ao_calculo_num_so_processo():
+    rng = np.random.default_rng(5)
+    y = rng.lognormal(8, 1, (41, 30))
+    y, mascara, x, x_futuro = _serie(y, passos=6)
+    modelo = ModeloHoltWinters()
+
+    serial = _em_blocos(modelo.prever_bloco, len(y), 1, 0, y, mascara, x, x_futuro)
+    paralelo = _em_blocos(modelo.prever_bloco, len(y), 3, 0, y, mascara, x, x_futuro)
+    np.testing.assert_array_equal(paralelo, serial)
+    np.testing.assert_array_equal(serial, modelo.prever_bloco(y, mascara, x, x_futuro))
+
+
+def test_portfolio_aceita_uma_instancia_de_modelo(base_mensal):
+    class Constante(ModeloPrevisao):
+        nome = "constante"
+
+        def prever_bloco(self, y, mascara, x, x_futuro):
+            return np.full(x_futuro.shape, 7.0)
+
+    previsoes = prever_portfolio(base_mensal, modelo=Constante(), passos=3)
+    assert len(previsoes) == base_mensal['id'].nunique() * 3
+    assert (previsoes[['receita', 'despesa']] == 7.0).all().all()
+    assert (previsoes['fluxo_liq'] == 0.0).all()
@@ -0,0 +1,50 @@
+import numpy as np
+
+from regressao import ajustar_retas, matriz_ultimos_pontos, prever
+
+
+def test_retas_iguais_ao_polyfit_por_serie():
+    rng = np.random.default_rng(3)
+    y = rng.normal(100, 30, (50, 8))
+    mascara = rng.random((50, 8)) > 0.3
+    x = np.arange(8, dtype='float64') * 2.5 + 1
+
+    retas = ajustar_retas(y, mascara, x)
+
+    for i in range(len(y)):
+        validos = mascara[i]
+        if validos.sum() < 2:
+            assert retas.inclinacao[i] == 0
+            continue
+        inclinacao, intercepto = np.polyfit(x[validos], y[i, validos], 1)
+        np.testing.assert_allclose(retas.inclinacao[i], inclinacao, rtol=1e-9, atol=1e-9)
+        np.testing.assert_allclose(retas.intercepto[i], intercepto, rtol=1e-9, atol=1e-9)
+        assert retas.n[i] == validos.sum()
+
+
+def test_casos_degenerados():
+    # Um ponto só e x constante: inclinação 0, intercepto = média
+    retas = ajustar_retas([[5.0, np.nan, np.nan], [1.0, 3.0, 8.0]], x=[[0, 0, 0], [4, 4, 4]])
+    np.testing.assert_array_equal(retas.inclinacao, [0.0, 0.0])
+    np.testing.assert_allclose(retas.intercepto, [5.0, 4.0])
+    np.testing.assert_array_equal(retas.n, [1, 3])
+
+
+def test_prever_avalia_a_reta():
+    retas = ajustar_retas([[1.0, 3.0, 5.0]])
+    np.testing.assert_allclose(prever(retas, [3, 4]), [[7.0, 9.0]])
+
+
+def test_tendencia_de_3_meses_igual_ao_polyfit(base_mensal):
+    ids, y, mascara = matriz_ultimos_pontos(base_mensal, 'receita', 3)
+    retas = ajustar_retas(y, mascara)
+
+    for posicao, (empresa_id, historico) in enumerate(base_mensal.groupby('id', sort=True)):
+        ultimos = historico['receita'].to_numpy()[-3:]
+        assert ids[posicao] == empresa_id
+        if len(ultimos) < 2:
+            assert retas.inclinacao[posicao] == 0
+            continue
+        # Os pontos ficam alinhados à direita, em x = 3 - len, ..., 2
+        x = np.arange(3 - len(ultimos), 3)
+        np.testing.assert_allclose(retas.inclinacao[posicao], np.polyfit(x, ultimos, 1)[0], rtol=1e-9, atol=1e-6)
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from grafo_local import GrafoLocal
+from risco_rede import calcular_risco, filtrar_dependencias
+from transacoes_compactas import compactar_transacoes
+
+
+@pytest.fixture(scope="module")
+def risco():
+    """
+    Rede de 4 empresas com valores escolhidos para as contas de cabeça:
+
+        A → B 60 (em duas transações)   C → B 40   B → C 50   D → C 50   A → D 20
+
+    Receita de B: 60% de A e 40% de C; de C: 50% de B e 50% de D; de D: 100% de A.
+    """
+    pagamentos = [('A', 'B', 20.0), ('A', 'B', 40.0), ('C', 'B', 40.0), ('B', 'C', 50.0), ('D', 'C', 50.0), ('A', 'D', 20.0)]
+    transacoes = compactar_transacoes(pd.DataFrame({
+        'id_pgto': [pagador for pagador, _, _ in pagamentos],
+        'id_rcbe': [recebedor for _, recebedor, _ in pagamentos],
+        'vl': [valor for _, _, valor in pagamentos],
+        'dt_refe': pd.Timestamp('2024-01-10'),
+        'ds_tran': 'PIX',
+    }))
+    return calcular_risco(GrafoLocal(transacoes))
+
+
+def test_dependencias_ordenadas(risco):
+    dependencias = risco['dependencias']
+    np.testing.assert_allclose(dependencias['dependencia'], [100, 60, 50, 50, 40])
+    # Entre empates (as duas fatias de 50% de C) a ordem não importa
+    relacoes = {(d, c): round(v, 9) for d, c, v in dependencias.itertuples(index=False)}
+    assert relacoes == {('D', 'A'): 100, ('B', 'A'): 60, ('C', 'B'): 50, ('C', 'D'): 50, ('B', 'C'): 40}
+
+    acima = filtrar_dependencias(dependencias, 0.5)
+    assert sorted(zip(acima['empresa_dependente'], acima['cliente_chave'])) == [('B', 'A'), ('C', 'B'), ('C', 'D'), ('D', 'A')]
+    assert len(filtrar_dependencias(dependencias, 0.5, limite=2)) == 2
+
+
+def test_concentracao_de_clientes_e_fornecedores(risco):
+    concentracao = risco['concentracao'].set_index('id')
+
+    np.testing.assert_allclose(concentracao['receita_total'], [0, 100, 100, 20])
+    np.testing.assert_allclose(concentracao['despesa_total'], [80, 50, 40, 50])
+    np.testing.assert_array_equal(concentracao['n_clientes'], [0, 2, 2, 1])
+    np.testing.assert_array_equal(concentracao['n_fornecedores'], [2, 1, 1, 1])
+    # HHI = soma dos quadrados das fatias: B recebe 0,6 e 0,4; A paga 0,75 e 0,25
+    np.testing.assert_allclose(concentracao['hhi_clientes'], [0, 0.6 ** 2 + 0.4 ** 2, 0.5, 1])
+    np.testing.assert_allclose(concentracao['hhi_fornecedores'], [0.75 ** 2 + 0.25 ** 2, 1, 1, 1])
+    np.testing.assert_allclose(concentracao['top1_clientes_%'], [0, 60, 50, 100])
+    np.testing.assert_allclose(concentracao['top3_clientes_%'], [0, 100, 100, 100])
+    np.testing.assert_allclose(concentracao['top1_fornecedores_%'], [75, 100, 100, 100])
+    np.testing.assert_allclose(concentracao['top3_fornecedores_%'], [100, 100, 100, 100])
+
+
+def test_exposicao_em_cascata(risco):
+    concentracao = risco['concentracao'].set_index('id')
+
+    # B depende de A por C (0,4 × 0,5 × 0,6 em 3 saltos) e por C e D
+    # (0,4 × 0,5 × 1): 0,12 + 0,2 = 32%. C depende de A por B (0,5 × 0,6) e
+    # por D (0,5 × 1) em 2 saltos: 80%. A e D não têm exposição indireta.
+    assert concentracao['cliente_cascata'].tolist() == [None, 'A', 'A', None]
+    np.testing.assert_allclose(concentracao['exposicao_cascata_%'], [0, 32, 80, 0])
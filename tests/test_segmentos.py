@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from segmentos import (METRICAS_BENCHMARK, NIVEIS_BENCHMARK, PERCENTIS_BENCHMARK, adicionar_percentis_setor,
+                       indexar_benchmark, tabela_benchmark)
+
+
+@pytest.fixture(scope="module")
+def perfil():
+    rng = np.random.default_rng(11)
+    n = 120
+    return pd.DataFrame({
+        'id': [f"E{i:03d}" for i in range(n)],
+        'ds_cnae': rng.choice(['Comércio', 'Indústria', 'Serviços', 'Agro'], n, p=[0.4, 0.3, 0.25, 0.05]),
+        'momento': rng.choice(['Início', 'Declínio', 'Crescimento', 'Maturidade'], n),
+        **{metrica: rng.lognormal(8, 1, n) for metrica in METRICAS_BENCHMARK},
+    })
+
+
+def test_tabela_igual_ao_groupby_de_cada_grupo(perfil):
+    benchmark = indexar_benchmark(tabela_benchmark(perfil))
+
+    esperadas = {(nivel, grupo) for nivel in NIVEIS_BENCHMARK for grupo in perfil[nivel].unique()}
+    assert set(benchmark) == esperadas
+    for (nivel, grupo), estatisticas in benchmark.items():
+        valores = perfil.loc[perfil[nivel] == grupo, METRICAS_BENCHMARK]
+        assert list(estatisticas.index) == METRICAS_BENCHMARK
+        np.testing.assert_array_equal(estatisticas['contagem'], valores.count())
+        np.testing.assert_allclose(estatisticas['media'], valores.mean())
+        np.testing.assert_allclose(estatisticas['mediana'], valores.median())
+        for q in PERCENTIS_BENCHMARK:
+            np.testing.assert_allclose(estatisticas[f'p{round(q * 100)}'], valores.quantile(q))
+
+
+def test_percentil_da_empresa_dentro_do_setor(perfil):
+    com_percentis = adicionar_percentis_setor(perfil)
+
+    for metrica in METRICAS_BENCHMARK:
+        coluna = f'percentil_setor_{metrica}'
+        for _, setor in com_percentis.groupby('ds_cnae'):
+            # 1 = maior valor do setor; a ordem segue a da métrica
+            assert setor[coluna].max() == 1.0
+            ordem = setor.sort_values(metrica)
+            assert ordem[coluna].is_monotonic_increasing
+            np.testing.assert_allclose(ordem[coluna], np.arange(1, len(setor) + 1) / len(setor))
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from transacoes_compactas import (codigos_empresa, compactar_transacoes, ids_presentes, mapear_ids,
+                                  posicoes_em)
+
+
+def _brutas():
+    return pd.DataFrame({
+        'id_pgto': ['B', 'A', 'C', None, 'A'],
+        'id_rcbe': ['A', 'D', 'B', 'C', None],
+        'vl': [10.5, 20.25, 30.0, 40.0, 50.125],
+        'dt_refe': ['2023-01-15', '2023-02-01', '2023-12-31', '2024-01-01', '1970-01-01'],
+        'ds_tran': ['PIX', 'TED', 'PIX', 'BOLETO', 'PIX'],
+    })
+
+
+def test_compactar_partilha_um_dicionario_ordenado():
+    compactas = compactar_transacoes(_brutas())
+
+    pgto, rcbe = compactas['id_pgto'].dtype, compactas['id_rcbe'].dtype
+    assert isinstance(pgto, pd.CategoricalDtype) and pgto == rcbe
+    assert list(pgto.categories) == ['A', 'B', 'C', 'D']
+    assert compactas['vl'].dtype == np.float32
+    assert compactas['mes'].dtype == np.int32
+    assert isinstance(compactas['ds_tran'].dtype, pd.CategoricalDtype)
+
+
+def test_compactar_preserva_os_valores():
+    brutas = _brutas()
+    compactas = compactar_transacoes(_brutas())
+
+    for coluna in ('id_pgto', 'id_rcbe', 'ds_tran'):
+        assert compactas[coluna].astype(object).where(compactas[coluna].notna(), None).tolist() == brutas[coluna].tolist()
+    np.testing.assert_allclose(compactas['vl'], brutas['vl'], rtol=1e-6)
+    # O mês é o ordinal do pd.Period mensal (meses desde 1970-01)
+    assert compactas['mes'].tolist() == pd.to_datetime(brutas['dt_refe']).dt.to_period('M').map(lambda p: p.ordinal).tolist()
+    assert compactas['mes'].tolist() == [636, 637, 647, 648, 0]
+
+
+def test_codigos_empresa_categorica_e_texto():
+    compactas = compactar_transacoes(_brutas())
+
+    codigos, dicionario = codigos_empresa(compactas['id_pgto'])
+    assert codigos.tolist() == [1, 0, 2, -1, 0]
+    assert list(dicionario) == ['A', 'B', 'C', 'D']
+
+    # Fora do layout compacto a coluna é fatorada
+    codigos, dicionario = codigos_empresa(_brutas()['id_pgto'])
+    assert list(dicionario.take(codigos[codigos >= 0])) == ['B', 'A', 'C', 'A']
+    assert codigos[3] == -1
+
+
+def test_ids_presentes_ignora_o_dicionario_sem_linhas():
+    compactas = compactar_transacoes(_brutas())
+    # 'D' está no dicionário partilhado, mas nunca paga
+    assert list(ids_presentes(compactas['id_pgto'])) == ['A', 'B', 'C']
+    assert list(ids_presentes(compactas['id_rcbe'])) == ['A', 'B', 'C', 'D']
+
+
+def test_posicoes_e_mapeamento_pelos_codigos():
+    compactas = compactar_transacoes(_brutas())
+    indice = pd.Index(['C', 'A'])
+
+    assert posicoes_em(compactas['id_pgto'], indice).tolist() == [-1, 1, 0, -1, 1]
+    valores = pd.Series({'A': 1.0, 'B': 2.0})
+    mapeados = mapear_ids(compactas['id_rcbe'], valores)
+    assert mapeados.index.equals(compactas.index)
+    # id_rcbe = A, D, B, C, (em falta): só A e B têm valor
+    assert mapeados.iloc[0] == 1.0 and mapeados.iloc[2] == 2.0
+    assert mapeados.iloc[[1, 3, 4]].isna().all()
+
+
+def test_transacoes_sinteticas_no_layout_compacto(transacoes):
+    # As planilhas passam por data_loader._tipar_transacoes, que usa compactar_transacoes
+    assert transacoes['id_pgto'].dtype == transacoes['id_rcbe'].dtype
+    assert transacoes['mes'].dtype == np.int32
+    np.testing.assert_array_equal(
+        transacoes['mes'].to_numpy(),
+        transacoes['dt_refe'].to_numpy().astype('datetime64[M]').astype(np.int64),
+    )
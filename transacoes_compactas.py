@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+# --- LAYOUT COMPACTO DAS TRANSAÇÕES ---
+# Cada transação ocupa poucos bytes fixos:
+# - id_pgto / id_rcbe: categóricas com um único dicionário de empresas
+#   partilhado pelas duas colunas (códigos int32 + lista ordenada de ids);
+# - mes: mês de referência como ordinal int32 (meses desde 1970-01, o mesmo
+#   ordinal de pd.Period com freq 'M'), no lugar da string 'AAAA-MM'. A base
+#   mensal e as previsões guardam o mês no mesmo ordinal (coluna ano_mes);
+# - ds_tran: categórica; vl: float32 (as somas continuam em float64).
+# dt_refe (data do dia) fica na tabela para a carga no Neo4j.
+COLUNAS_COMPACTAS = ['id_pgto', 'id_rcbe', 'vl', 'mes', 'ds_tran']
+# -----------------------------
+
+
+def mes_ordinal(datas):
+    """Ordinal do mês (int32) de cada data: (ano - 1970) * 12 + mês - 1."""
+    datas = pd.to_datetime(datas)
+    return ((datas.dt.year - 1970) * 12 + datas.dt.month - 1).astype('int32')
+
+
+def data_de_mes(meses):
+    """
+    Ordinais de mês para o primeiro dia de cada mês (datetime), para os
+    gráficos e para contas em dias; o pipeline guarda sempre os ordinais.
+    """
+    # O ordinal é exatamente o datetime64[M] do NumPy (meses desde 1970-01)
+    return pd.DatetimeIndex(np.asarray(meses, dtype=np.int64).astype('datetime64[M]').astype('datetime64[ns]'))
+
+
+def compactar_transacoes(df):
+    """Converte um DataFrame de transações para o layout compacto (ver acima)."""
+    dicionario = pd.Index(pd.unique(np.concatenate([
+        df['id_pgto'].to_numpy(), df['id_rcbe'].to_numpy()
+    ]))).dropna().sort_values()
+    tipo_ids = pd.CategoricalDtype(dicionario)
+    df['id_pgto'] = df['id_pgto'].astype(tipo_ids)
+    df['id_rcbe'] = df['id_rcbe'].astype(tipo_ids)
+    df['dt_refe'] = pd.to_datetime(df['dt_refe'])
+    df['mes'] = mes_ordinal(df['dt_refe'])
+    df['ds_tran'] = df['ds_tran'].astype('category')
+    df['vl'] = df['vl'].astype('float32')
+    return df
+
+
+def codigos_empresa(coluna):
+    """
+    (códigos, dicionário) de uma coluna de ids: numa coluna categórica
+    reaproveita os códigos já guardados; senão faz a fatoração. Código -1 =
+    id em falta.
+    """
+    if isinstance(coluna.dtype, pd.CategoricalDtype):
+        return coluna.cat.codes.to_numpy(), coluna.cat.categories
+    codigos, dicionario = pd.factorize(coluna)
+    return codigos, pd.Index(dicionario)
+
+
+def ids_em_texto(coluna):
+    """
+    Id de cada linha como texto (para o Neo4j), normalizado pelo dicionário
+    de codigos_empresa: ids numéricos inteiros perdem o '.0' que o Excel
+    deixa quando a coluna tem vazios. Id em falta = None.
+    """
+    codigos, dicionario = codigos_empresa(coluna)
+    textos = [str(int(i)) if isinstance(i, (float, np.floating)) and float(i).is_integer() else str(i) for i in dicionario]
+    # A última posição (-1) recebe os códigos -1 (id em falta)
+    return np.array(textos + [None], dtype=object)[codigos]
+
+
+def ids_presentes(coluna):
+    """Ids que aparecem de facto na coluna (o dicionário pode ter ids sem linhas)."""
+    codigos, dicionario = codigos_empresa(coluna)
+    return dicionario.take(np.unique(codigos[codigos >= 0]))
+
+
+def posicoes_em(coluna, indice):
+    """
+    Posição em `indice` do id de cada linha (-1 se não estiver lá). O
+    dicionário é procurado uma vez só e as linhas seguem pelos códigos.
+    """
+    codigos, dicionario = codigos_empresa(coluna)
+    # A última posição (-1) recebe os códigos -1 (id em falta)
+    posicoes = np.append(indice.get_indexer(dicionario), -1)
+    return posicoes[codigos]
+
+
+def mapear_ids(coluna, valores):
+    """Valor de `valores` (Series indexada por id) para o id de cada linha, NaN se não houver."""
+    codigos, dicionario = codigos_empresa(coluna)
+    por_codigo = np.append(valores.reindex(dicionario).to_numpy(dtype=object), np.nan)
+    return pd.Series(por_codigo[codigos], index=coluna.index)
@@ -2,134 +2,219 @@ import pandas as pd
 import numpy as np
 from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
-from sklearn.linear_model import LinearRegression
+from instrumentacao import instrumentar
+from matriz_mensal import JANELA_MEDIAS, perfil_das_janelas
+from regressao import ajustar_retas, prever
+from transacoes_compactas import codigos_empresa, data_de_mes
 
-def features_cashflow(trans):
+def _somar_por_empresa_mes(vl, ids, mes):
     """
-    Cria as features de fluxo de caixa mensais a partir dos dados brutos de transações.
+    Soma vl por (empresa, mês) sobre chaves inteiras: código da empresa no
+    dicionário × número de meses + mês. Só o resultado volta a ter os ids;
+    o mês continua como ordinal (ver transacoes_compactas.py).
     """
-    df = trans.copy()
-    df['dt_refe'] = pd.to_datetime(df['dt_refe'])
-    df['ano_mes'] = df['dt_refe'].dt.to_period('M').astype(str)
-    recebimentos = df.groupby(['id_rcbe', 'ano_mes'])['vl'].sum().reset_index().rename(columns={'id_rcbe': 'id', 'vl': 'receita'})
-    pagamentos = df.groupby(['id_pgto', 'ano_mes'])['vl'].sum().reset_index().rename(columns={'id_pgto': 'id', 'vl': 'despesa'})
-    base = pd.merge(recebimentos, pagamentos, on=['id', 'ano_mes'], how='outer').fillna(0)
+    codigos, dicionario = codigos_empresa(ids)
+    validas = codigos >= 0
+    codigos, mes, vl = codigos[validas].astype(np.int64), mes[validas], vl[validas]
+    primeiro_mes = mes.min() if len(mes) else 0
+    n_meses = int(mes.max() - primeiro_mes + 1) if len(mes) else 1
+
+    soma = pd.Series(vl).groupby(codigos * n_meses + (mes - primeiro_mes)).sum()
+    chaves = soma.index.to_numpy()
+    indice = pd.MultiIndex.from_arrays(
+        [dicionario.take(chaves // n_meses), (chaves % n_meses + primeiro_mes).astype(np.int32)],
+        names=['id', 'ano_mes'],
+    )
+    return pd.Series(soma.to_numpy(), index=indice)
+
+def _agregar_mensal(trans):
+    """
+    Soma os valores recebidos e pagos por empresa e mês.
+    Devolve duas Series (receita, despesa) indexadas por (id, ano_mes), com
+    ano_mes como ordinal inteiro do mês.
+    """
+    mes = trans['mes'].to_numpy(dtype=np.int64)
+    # Os valores vêm em float32; as somas mensais são feitas em float64
+    vl = trans['vl'].to_numpy(dtype='float64')
+    receita = _somar_por_empresa_mes(vl, trans['id_rcbe'], mes).rename('receita')
+    despesa = _somar_por_empresa_mes(vl, trans['id_pgto'], mes).rename('despesa')
+    return receita, despesa
+
+def _montar_base(receita, despesa):
+    """Junta receita e despesa mensais e calcula fluxo líquido e margem."""
+    base = pd.merge(receita.reset_index(), despesa.reset_index(), on=['id', 'ano_mes'], how='outer').fillna(0)
     base['fluxo_liq'] = base['receita'] - base['despesa']
     base['margem'] = base['fluxo_liq'] / base['receita'].replace(0, np.nan)
     base['margem'] = base['margem'].fillna(0)
     return base.sort_values(['id', 'ano_mes'])
 
-def _calcular_tendencia(serie):
-    """Função auxiliar para calcular a tendência de crescimento via regressão linear."""
-    if len(serie) < 2: return 0
-    x = np.arange(len(serie)).reshape(-1, 1)
-    y = serie.values.reshape(-1, 1)
-    modelo = LinearRegression().fit(x, y)
-    return modelo.coef_[0][0]
+@instrumentar()
+def features_cashflow(trans):
+    """
+    Cria as features de fluxo de caixa mensais a partir dos dados brutos de transações.
+    """
+    receita, despesa = _agregar_mensal(trans)
+    return _montar_base(receita, despesa)
+
+@instrumentar()
+def features_cashflow_streaming(chunks):
+    """
+    Versão em streaming de features_cashflow: recebe um iterável de pedaços
+    (DataFrames) de transações e vai somando cada um aos agregados mensais.
+    Só os agregados por (id, ano_mes) ficam em memória, nunca a base inteira.
+    """
+    receita = despesa = None
+    for chunk in chunks:
+        receita_chunk, despesa_chunk = _agregar_mensal(chunk)
+        receita = receita_chunk if receita is None else receita.add(receita_chunk, fill_value=0)
+        despesa = despesa_chunk if despesa is None else despesa.add(despesa_chunk, fill_value=0)
+
+    if receita is None:
+        vazio = pd.MultiIndex.from_arrays(
+            [pd.Index([], dtype=object), np.array([], dtype=np.int32)], names=['id', 'ano_mes'])
+        receita = pd.Series([], index=vazio, name='receita', dtype=float)
+        despesa = pd.Series([], index=vazio, name='despesa', dtype=float)
+    return _montar_base(receita, despesa)
+
+def _perfil_financeiro(base):
+    """
+    Calcula, para cada empresa, as métricas financeiras dos últimos meses
+    (médias de 6 meses, tendência de 3 meses e volatilidade da receita).
+
+    Tudo é feito de forma vetorizada: uma única ordenação estável por id deixa
+    cada empresa num bloco contíguo e a posição de cada linha a partir do fim
+    do bloco diz em que coluna das janelas dos últimos meses (alinhadas à
+    direita) ela cai. As métricas saem dessas janelas com o mesmo cálculo da
+    MatrizMensal (matriz_mensal.perfil_das_janelas).
+    """
+    colunas = ['id', 'receita_media_6m', 'despesa_media_6m', 'crescimento_receita_3m', 'margem_media_6m', 'volatilidade_receita']
+    if base.empty:
+        return pd.DataFrame(columns=colunas)
+
+    base = base.sort_values('id', kind='stable')
+    codigos, ids = pd.factorize(base['id'], sort=True)
+    n_empresas = len(ids)
+
+    # Posição de cada linha contada a partir do último mês da empresa (0 = último)
+    tamanhos = np.bincount(codigos, minlength=n_empresas)
+    fim_do_bloco = np.cumsum(tamanhos) - 1
+    pos_fim = fim_do_bloco[codigos] - np.arange(len(codigos))
+
+    # Janelas (empresas × JANELA_MEDIAS) com os últimos meses de cada empresa
+    na_janela = pos_fim < JANELA_MEDIAS
+    linhas, colunas_janela = codigos[na_janela], JANELA_MEDIAS - 1 - pos_fim[na_janela]
+    mascara = np.zeros((n_empresas, JANELA_MEDIAS), dtype=bool)
+    mascara[linhas, colunas_janela] = True
+
+    def janela(coluna):
+        y = np.zeros((n_empresas, JANELA_MEDIAS))
+        y[linhas, colunas_janela] = base[coluna].to_numpy(dtype='float64')[na_janela]
+        return y
+
+    return perfil_das_janelas(ids, janela('receita'), janela('despesa'), janela('margem'), mascara)[colunas]
+
+# Setor atribuído às empresas que aparecem nas transações mas não na base de empresas
+CNAE_NAO_INFORMADO = 'NÃO INFORMADO'
 
+def _completar_perfil(perfil_financeiro, empresas):
+    """Junta ao perfil financeiro a idade e o CNAE de cada empresa."""
+    data_referencia = pd.to_datetime('2024-01-01')
+    empresas_copy = empresas.copy()
+    empresas_copy['idade'] = (data_referencia - empresas_copy['dt_abrt']).dt.days / 365.25
+    # O cache em Parquet entrega o CNAE como categoria; aqui voltamos para texto
+    # para que o fillna abaixo não falhe com uma categoria nova.
+    empresas_copy['ds_cnae'] = empresas_copy['ds_cnae'].astype(object)
+
+    perfil_completo = pd.merge(perfil_financeiro, empresas_copy[['id', 'idade', 'ds_cnae']].drop_duplicates(subset='id'), on='id', how='left')
+    # Contrapartes que não estão na base de empresas ficam sem CNAE: o setor
+    # recebe um texto fixo (a coluna continua só com texto e pode ir para o
+    # Parquet) e as métricas numéricas ficam com 0.
+    perfil_completo['ds_cnae'] = perfil_completo['ds_cnae'].fillna(CNAE_NAO_INFORMADO)
+    perfil_completo.fillna(0, inplace=True)
+    perfil_completo.replace([np.inf, -np.inf], 0, inplace=True)
+    return perfil_completo
+
+@instrumentar()
 def _criar_features_para_cluster(base, empresas):
     """
     Prepara o "DNA" de cada empresa, calculando as métricas (features)
     que serão usadas pelo modelo de Machine Learning para encontrar os grupos.
+    O tempo e as linhas de cada chamada ficam no log de métricas (instrumentacao.py).
     """
-    # Esta função mantém as suas personalizações de diagnóstico
-    print("\n--- INICIANDO DIAGNÓSTICO EM _criar_features_para_cluster ---")
-    try:
-        print("PASSO 1: Verificando colunas recebidas no DataFrame 'base':")
-        print(base.columns.tolist())
-
-        perfil_financeiro = base.groupby('id').agg(
-            receita_media_6m=('receita', lambda x: x.tail(6).mean()),
-            despesa_media_6m=('despesa', lambda x: x.tail(6).mean()),
-            crescimento_receita_3m=('receita', lambda x: _calcular_tendencia(x.tail(3))),
-            margem_media_6m=('margem', lambda x: x.tail(6).mean()),
-            volatilidade_receita=('receita', lambda x: x.tail(6).std())
-        ).reset_index()
-
-        print("\nPASSO 2: Colunas criadas em 'perfil_financeiro' (depois do .agg()):")
-        print(perfil_financeiro.columns.tolist())
-
-        data_referencia = pd.to_datetime('2024-01-01')
-        empresas_copy = empresas.copy()
-        
-        print("\nPASSO 3: Verificando colunas recebidas no DataFrame 'empresas':")
-        print(empresas_copy.columns.tolist())
-        
-        empresas_copy['idade'] = (data_referencia - empresas_copy['dt_abrt']).dt.days / 365.25
-        
-        perfil_completo = pd.merge(perfil_financeiro, empresas_copy[['id', 'idade', 'ds_cnae']].drop_duplicates(subset='id'), on='id', how='left')
-        
-        print("\nPASSO 4: Colunas em 'perfil_completo' (depois do merge):")
-        print(perfil_completo.columns.tolist())
-
-        perfil_completo.fillna(0, inplace=True)
-        perfil_completo.replace([np.inf, -np.inf], 0, inplace=True)
-        
-        print("\nPASSO 5: Processamento dentro da função concluído com sucesso.")
-        print("--- FIM DO DIAGNÓSTICO --- \n")
-        
-        return perfil_completo
-
-    except Exception as e:
-        print(f"\n\n!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-        print(f"!!!!!! OCORREU UM ERRO GRAVE DENTRO DE _criar_features_para_cluster !!!!!!")
-        import traceback
-        print("!!!!!! O traceback real do erro é:                          !!!!!!")
-        print(traceback.format_exc())
-        print(f"!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!\n\n")
-        raise e
-
-def clusterizar_empresas_kmeans(base, empresas):
+    perfil_financeiro = _perfil_financeiro(base)
+    return _completar_perfil(perfil_financeiro, empresas)
+
+# Métricas usadas pelo KMeans para agrupar as empresas
+FEATURES_CLUSTER = ['idade', 'receita_media_6m', 'despesa_media_6m', 'crescimento_receita_3m', 'margem_media_6m', 'volatilidade_receita']
+
+@instrumentar()
+def clusterizar_empresas_kmeans(base, empresas, modo='completo'):
     """
     Executa o pipeline de Machine Learning para encontrar e nomear os clusters de empresas.
+
+    modo='completo' reajusta o KMeans sobre toda a população a cada chamada;
+    modo='incremental' usa o modelo persistido de cluster_incremental.py
+    (atribuição pelo centróide mais próximo e reajuste em segundo plano).
     """
     df_features = _criar_features_para_cluster(base, empresas)
-    features_para_modelo = df_features[['idade', 'receita_media_6m', 'despesa_media_6m', 'crescimento_receita_3m', 'margem_media_6m', 'volatilidade_receita']]
-    
-    scaler = StandardScaler()
-    features_padronizadas = scaler.fit_transform(features_para_modelo)
-    
-    kmeans = KMeans(n_clusters=4, random_state=42, n_init='auto')
-    df_features['cluster'] = kmeans.fit_predict(features_padronizadas)
-    
+    if modo == 'incremental':
+        from cluster_incremental import clusterizar_perfil_incremental
+        return clusterizar_perfil_incremental(df_features)
+    return clusterizar_perfil(df_features)
+
+def _nomear_clusters(df_features):
+    """
+    Dá nome aos clusters ordenando-os pela receita média das suas empresas:
+    do menor para o maior, Início, Declínio, Crescimento e Maturidade.
+    """
     df_analise_clusters = df_features.groupby('cluster')[['idade', 'crescimento_receita_3m', 'margem_media_6m', 'receita_media_6m']].mean().sort_values('receita_media_6m').reset_index()
     
-    nomes_clusters = {
+    return {
         df_analise_clusters.loc[0, 'cluster']: 'Início',
         df_analise_clusters.loc[1, 'cluster']: 'Declínio',
         df_analise_clusters.loc[2, 'cluster']: 'Crescimento',
         df_analise_clusters.loc[3, 'cluster']: 'Maturidade'
     }
+
+def clusterizar_perfil(df_features):
+    """
+    Agrupa com KMeans um perfil de empresas já calculado e dá nome aos clusters.
+    """
+    features_para_modelo = df_features[FEATURES_CLUSTER]
+    
+    scaler = StandardScaler()
+    features_padronizadas = scaler.fit_transform(features_para_modelo)
+    
+    kmeans = KMeans(n_clusters=4, random_state=42, n_init='auto')
+    df_features['cluster'] = kmeans.fit_predict(features_padronizadas)
     
-    df_features['momento'] = df_features['cluster'].map(nomes_clusters)
+    df_features['momento'] = df_features['cluster'].map(_nomear_clusters(df_features))
     return df_features
 
 # --- FUNÇÃO RESTAURADA PARA A PÁGINA DE PREVISÃO ---
+@instrumentar()
 def prever_fluxo_caixa(serie_historica, metrica, periodos_futuros=6):
     """
     Prevê valores futuros para uma métrica financeira usando regressão linear.
     """
     df_historico = serie_historica[['ano_mes', metrica]].copy()
-    df_historico['ano_mes'] = pd.to_datetime(df_historico['ano_mes'])
+    # O índice de tempo usa os dias reais de cada mês
+    df_historico['data'] = data_de_mes(df_historico['ano_mes'])
     # Cria um índice numérico para o tempo (número de dias desde o início)
-    df_historico['time_idx'] = (df_historico['ano_mes'] - df_historico['ano_mes'].min()).dt.days
+    df_historico['time_idx'] = (df_historico['data'] - df_historico['data'].min()).dt.days
 
-    # Treina o modelo de regressão linear
-    modelo = LinearRegression()
-    X = df_historico[['time_idx']]
-    y = df_historico[metrica]
-    modelo.fit(X, y)
+    # Ajusta a reta (OLS em forma fechada) sobre o índice de tempo
+    retas = ajustar_retas(df_historico[metrica].values, x=df_historico['time_idx'].values)
 
     # Prepara os "pontos no futuro" para fazer a previsão
-    ultimo_idx = df_historico['time_idx'].max()
-    ultima_data = df_historico['ano_mes'].max()
+    ultimo_mes = df_historico['ano_mes'].max()
     
-    # Cria os índices e datas futuros
-    indices_futuros = [ultimo_idx + 30 * i for i in range(1, periodos_futuros + 1)]
-    datas_futuras = [ultima_data + pd.DateOffset(months=i) for i in range(1, periodos_futuros + 1)]
+    # Cria os meses futuros e os seus índices (dias reais de cada mês, não 30 fixos)
+    meses_futuros = np.arange(ultimo_mes + 1, ultimo_mes + periodos_futuros + 1, dtype=np.int32)
+    indices_futuros = (data_de_mes(meses_futuros) - df_historico['data'].min()).days
     
     # Faz a previsão para os pontos futuros
-    previsoes = modelo.predict(pd.DataFrame(indices_futuros, columns=['time_idx']))
+    previsoes = prever(retas, indices_futuros)[0]
 
     # Retorna um dataframe com as previsões
-    return pd.DataFrame({'ano_mes': datas_futuras, metrica: previsoes})
\ No newline at end of file
+    return pd.DataFrame({'ano_mes': meses_futuros, metrica: previsoes})